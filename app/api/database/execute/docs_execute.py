@@ -1,30 +1,268 @@
 """Docs Execute module."""
 
-from app.api.database.mongo_db import mongodb
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from llama_index.core.schema import BaseNode
+from llama_index.core.storage.docstore.utils import json_to_doc
+
+from app.api.database.mongo_db import mongodb, async_mongodb
+from app.core.config import config
+
+# fields of a node listed by default, without its text and embedding
+DOCUMENT_PROJECTION = {
+    "__data__.metadata": 1,
+    "__data__.start_char_idx": 1,
+    "__data__.end_char_idx": 1,
+}
 
 
 class DocsExecute:
-    """Docs execute for database operations."""
+    """
+    Docs execute for database operations.
+
+    `a`-prefixed methods run the same reads on the async client. Writes stay
+    blocking: they run on ingest worker threads, under the index lock.
+    """
 
     @staticmethod
     def get_existing_indexes():
         return list(mongodb["index_store/data"].find())
 
     @staticmethod
-    def get_docs_by_source(source: str):
-        return list(mongodb["docstore/data"].find({"__data__.metadata.source": source}))
+    def get_document_query(
+        source: Optional[str] = None, after: Optional[str] = None
+    ) -> dict:
+        """Match the nodes of a source, or all of them, with an id after `after`."""
+        query = {}
+        if source is not None:
+            query["__data__.metadata.source"] = source
+        if after is not None:
+            query["_id"] = {"$gt": after}
+
+        return query
+
+    @staticmethod
+    def get_document_projection(
+        include_text: bool = False, include_embedding: bool = False
+    ) -> dict:
+        projection = dict(DOCUMENT_PROJECTION)
+        if include_text:
+            projection["__data__.text"] = 1
+        if include_embedding:
+            projection["__data__.embedding"] = 1
+
+        return projection
 
     @staticmethod
-    def get_docs_ids_by_source(source: str):
+    def get_docs_page(
+        source: Optional[str] = None,
+        after: Optional[str] = None,
+        limit: int = 100,
+        include_text: bool = False,
+        include_embedding: bool = False,
+    ) -> List[dict]:
+        """Get up to `limit` nodes in id order, starting after the id `after`."""
         return list(
-            mongodb["docstore/data"].distinct(
-                "__data__.metadata.doc_id",
-                {"__data__.metadata.source": source},
+            mongodb["docstore/data"]
+            .find(
+                DocsExecute.get_document_query(source, after),
+                DocsExecute.get_document_projection(include_text, include_embedding),
             )
+            .sort("_id", 1)
+            .limit(limit)
         )
 
     @staticmethod
-    def get_existing_sources():
+    def get_node_hashes_by_source(source: str) -> Dict[str, str]:
+        """Map the id of every node of a source to the content hash stored with it."""
+        node_ids = mongodb["docstore/data"].distinct(
+            "_id", {"__data__.metadata.source": source}
+        )
+        if not node_ids:
+            return {}
+
+        return {
+            metadata["_id"]: metadata["doc_hash"]
+            for metadata in mongodb["docstore/metadata"].find(
+                {"_id": {"$in": node_ids}}, {"doc_hash": 1}
+            )
+        }
+
+    @staticmethod
+    def get_nodes_by_sources(sources: Optional[List[str]] = None) -> List[dict]:
+        """
+        Group node ids and document ids by source, in a single aggregation.
+
+        Every source is returned when `sources` is None.
+        """
+        source_filter = {"$in": sources} if sources is not None else {"$exists": True}
+
         return list(
-            mongodb["docstore/data"].distinct("__data__.metadata.source")
+            mongodb["docstore/data"].aggregate(
+                [
+                    {"$match": {"__data__.metadata.source": source_filter}},
+                    {
+                        "$group": {
+                            "_id": "$__data__.metadata.source",
+                            "node_ids": {"$push": "$_id"},
+                            "doc_ids": {"$addToSet": "$__data__.metadata.doc_id"},
+                        }
+                    },
+                ]
+            )
         )
+
+    @staticmethod
+    def get_source_stats(sources: Optional[List[str]] = None) -> List[dict]:
+        """
+        Count the documents, nodes and text bytes of sources, in a single aggregation.
+
+        Every source is counted when `sources` is None, to fill the source catalog.
+        """
+        source_filter = {"$in": sources} if sources is not None else {"$exists": True}
+
+        return list(
+            mongodb["docstore/data"].aggregate(
+                [
+                    {"$match": {"__data__.metadata.source": source_filter}},
+                    {
+                        "$group": {
+                            "_id": "$__data__.metadata.source",
+                            "doc_ids": {"$addToSet": "$__data__.metadata.doc_id"},
+                            "node_count": {"$sum": 1},
+                            "size": {
+                                "$sum": {
+                                    "$strLenBytes": {"$ifNull": ["$__data__.text", ""]}
+                                }
+                            },
+                        }
+                    },
+                ]
+            )
+        )
+
+    @staticmethod
+    def get_nodes(node_ids: List[str]) -> List[BaseNode]:
+        """Get nodes by id in one query, in the order of the ids, skipping missing ones."""
+        if not node_ids:
+            return []
+
+        docs = mongodb["docstore/data"].find({"_id": {"$in": node_ids}})
+
+        return DocsExecute.to_nodes(node_ids, docs)
+
+    @staticmethod
+    def to_nodes(node_ids: List[str], docs) -> List[BaseNode]:
+        nodes_by_id = {doc.pop("_id"): json_to_doc(doc) for doc in docs}
+
+        return [nodes_by_id[node_id] for node_id in node_ids if node_id in nodes_by_id]
+
+    @staticmethod
+    def count_nodes() -> int:
+        return mongodb["docstore/data"].count_documents({})
+
+    @staticmethod
+    def iter_node_texts(
+        batch_size: int = 1000,
+    ) -> Iterator[Tuple[str, str, Optional[str]]]:
+        """Yield the id, text and source of every node, reading only those fields."""
+        cursor = mongodb["docstore/data"].find(
+            {},
+            {"__data__.text": 1, "__data__.metadata.source": 1},
+            batch_size=batch_size,
+        )
+        for doc in cursor:
+            data = doc.get("__data__", {})
+            source = data.get("metadata", {}).get("source")
+            yield doc["_id"], data.get("text", ""), source
+
+    @staticmethod
+    def delete_nodes(node_ids: List[str], batch_size: int = None) -> int:
+        """Delete nodes from the docstore, in batches of ids."""
+        batch_size = batch_size or config.DELETE_BATCH_SIZE
+        deleted_count = 0
+
+        for start in range(0, len(node_ids), batch_size):
+            batch = node_ids[start : start + batch_size]
+            result = mongodb["docstore/data"].delete_many({"_id": {"$in": batch}})
+            mongodb["docstore/metadata"].delete_many({"_id": {"$in": batch}})
+            deleted_count += result.deleted_count
+
+        return deleted_count
+
+    @staticmethod
+    def remove_nodes_from_ref_docs(node_ids: List[str]):
+        """Drop nodes from their documents, and the documents left without nodes."""
+        if not node_ids:
+            return
+
+        mongodb["docstore/ref_doc_info"].update_many(
+            {"node_ids": {"$in": node_ids}},
+            {"$pull": {"node_ids": {"$in": node_ids}}},
+        )
+        mongodb["docstore/ref_doc_info"].delete_many({"node_ids": {"$size": 0}})
+
+    @staticmethod
+    def delete_ref_docs(doc_ids: List[str], batch_size: int = None) -> int:
+        """Delete documents from the docstore, in batches of ids."""
+        batch_size = batch_size or config.DELETE_BATCH_SIZE
+        deleted_count = 0
+
+        for start in range(0, len(doc_ids), batch_size):
+            batch = doc_ids[start : start + batch_size]
+            result = mongodb["docstore/ref_doc_info"].delete_many({"_id": {"$in": batch}})
+            deleted_count += result.deleted_count
+
+        return deleted_count
+
+    @staticmethod
+    async def aget_existing_indexes():
+        return await async_mongodb["index_store/data"].find().to_list(length=None)
+
+    @staticmethod
+    async def aget_docs_page(
+        source: Optional[str] = None,
+        after: Optional[str] = None,
+        limit: int = 100,
+        include_text: bool = False,
+        include_embedding: bool = False,
+    ) -> List[dict]:
+        return (
+            await async_mongodb["docstore/data"]
+            .find(
+                DocsExecute.get_document_query(source, after),
+                DocsExecute.get_document_projection(include_text, include_embedding),
+            )
+            .sort("_id", 1)
+            .limit(limit)
+            .to_list(length=None)
+        )
+
+    @staticmethod
+    async def aiter_docs(
+        source: Optional[str] = None,
+        include_text: bool = False,
+        include_embedding: bool = False,
+        batch_size: int = 1000,
+    ) -> AsyncIterator[dict]:
+        """Yield nodes in id order as the cursor reads them, one batch in memory."""
+        cursor = async_mongodb["docstore/data"].find(
+            DocsExecute.get_document_query(source),
+            DocsExecute.get_document_projection(include_text, include_embedding),
+            batch_size=batch_size,
+        )
+        async for doc in cursor.sort("_id", 1):
+            yield doc
+
+    @staticmethod
+    async def aget_nodes(node_ids: List[str]) -> List[BaseNode]:
+        if not node_ids:
+            return []
+
+        docs = (
+            await async_mongodb["docstore/data"]
+            .find({"_id": {"$in": node_ids}})
+            .to_list(length=None)
+        )
+
+        return DocsExecute.to_nodes(node_ids, docs)
@@ -0,0 +1,73 @@
+"""Embedding Cache Execute module."""
+
+from datetime import datetime
+from typing import Dict, List
+
+from pymongo import UpdateOne
+
+from app.api.database.mongo_db import mongodb
+
+
+EMBEDDING_CACHE_COLLECTION = "embedding_cache/data"
+
+
+class EmbeddingCacheExecute:
+    """Embedding cache execute for database operations."""
+
+    @staticmethod
+    def create_indexes(ttl_seconds: int):
+        """Expire entries that have not been used for `ttl_seconds`."""
+        mongodb[EMBEDDING_CACHE_COLLECTION].create_index(
+            "last_used_at", expireAfterSeconds=ttl_seconds
+        )
+
+    @staticmethod
+    def get_embeddings(keys: List[str]) -> Dict[str, List[float]]:
+        """Get cached embeddings by key and refresh their last use."""
+        if not keys:
+            return {}
+
+        found = {
+            entry["_id"]: entry["embedding"]
+            for entry in mongodb[EMBEDDING_CACHE_COLLECTION].find(
+                {"_id": {"$in": keys}}, {"embedding": 1}
+            )
+        }
+        if found:
+            mongodb[EMBEDDING_CACHE_COLLECTION].update_many(
+                {"_id": {"$in": list(found)}},
+                {"$set": {"last_used_at": datetime.utcnow()}},
+            )
+
+        return found
+
+    @staticmethod
+    def save_embeddings(model_name: str, embeddings: Dict[str, List[float]]):
+        """Upsert embeddings by key."""
+        if not embeddings:
+            return
+
+        now = datetime.utcnow()
+        mongodb[EMBEDDING_CACHE_COLLECTION].bulk_write(
+            [
+                UpdateOne(
+                    {"_id": key},
+                    {
+                        "$set": {
+                            "model": model_name,
+                            "embedding": embedding,
+                            "last_used_at": now,
+                        },
+                        "$setOnInsert": {"created_at": now},
+                    },
+                    upsert=True,
+                )
+                for key, embedding in embeddings.items()
+            ],
+            ordered=False,
+        )
+
+    @staticmethod
+    def delete_all() -> int:
+        """Drop every cached embedding."""
+        return mongodb[EMBEDDING_CACHE_COLLECTION].delete_many({}).deleted_count
@@ -0,0 +1,42 @@
+"""Index Version Execute module."""
+
+import os
+import socket
+from datetime import datetime
+
+from pymongo import ReturnDocument
+
+from app.api.database.mongo_db import mongodb
+
+
+class IndexVersionExecute:
+    """
+    Index version execute for database operations.
+
+    The `index_versions` collection holds one stamp per index, incremented by the
+    worker that changed the index, so the other workers know when to reload it.
+    """
+
+    @staticmethod
+    def get_version(index_id: str) -> int:
+        stamp = mongodb["index_versions"].find_one({"_id": index_id}, {"version": 1})
+
+        return stamp["version"] if stamp else 0
+
+    @staticmethod
+    def bump_version(index_id: str) -> int:
+        """Increment the version of an index, returning the new one."""
+        stamp = mongodb["index_versions"].find_one_and_update(
+            {"_id": index_id},
+            {
+                "$inc": {"version": 1},
+                "$set": {
+                    "updated_at": datetime.now(),
+                    "updated_by": f"{socket.gethostname()}:{os.getpid()}",
+                },
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+
+        return stamp["version"]
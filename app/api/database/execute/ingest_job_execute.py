@@ -0,0 +1,69 @@
+"""Ingest Job Execute module."""
+
+from datetime import datetime
+
+from bson import ObjectId
+
+from app.api.database.mongo_db import mongodb
+from app.api.database.models.ingest_job import IngestJobModel
+
+
+class IngestJobExecute:
+    """Ingest job execute for database operations."""
+
+    @staticmethod
+    def create_job(job: IngestJobModel):
+        new_job = mongodb["ingest_jobs"].insert_one(
+            job.model_dump(by_alias=True, exclude=["id"])
+        )
+        created_job = mongodb["ingest_jobs"].find_one({"_id": new_job.inserted_id})
+
+        return created_job
+
+    @staticmethod
+    def delete_job(job_id: str):
+        mongodb["ingest_jobs"].delete_one({"_id": ObjectId(job_id)})
+
+    @staticmethod
+    def get_job_by_id(job_id: str):
+        return mongodb["ingest_jobs"].find_one({"_id": ObjectId(job_id)})
+
+    @staticmethod
+    def update_job(job_id: str, **fields):
+        fields["updated_at"] = datetime.now()
+        mongodb["ingest_jobs"].update_one({"_id": ObjectId(job_id)}, {"$set": fields})
+
+    @staticmethod
+    def start_job(job_id: str):
+        """Mark a queued job as running, None if it was already taken."""
+        return mongodb["ingest_jobs"].find_one_and_update(
+            {"_id": ObjectId(job_id), "status": "queued"},
+            {
+                "$set": {"status": "running", "updated_at": datetime.now()},
+                "$inc": {"attempts": 1},
+            },
+        )
+
+    @staticmethod
+    def requeue_running_jobs() -> int:
+        """Queue again the jobs left running, by a run of the app that stopped."""
+        return (
+            mongodb["ingest_jobs"]
+            .update_many(
+                {"status": "running"},
+                {
+                    "$set": {
+                        "status": "queued",
+                        "stage": "queued",
+                        "updated_at": datetime.now(),
+                    }
+                },
+            )
+            .modified_count
+        )
+
+    @staticmethod
+    def get_queued_jobs():
+        return list(
+            mongodb["ingest_jobs"].find({"status": "queued"}).sort("created_at", 1)
+        )
@@ -1,11 +1,15 @@
 """Message Execute module."""
 
-from app.api.database.mongo_db import mongodb
+from app.api.database.mongo_db import mongodb, async_mongodb
 from app.api.database.models.message import MessageModel
 
 
 class MessageExecute:
-    """Message execute for database operations."""
+    """
+    Message execute for database operations.
+
+    `a`-prefixed methods run the same operations on the async client.
+    """
 
     @staticmethod
     def create_message(message: MessageModel):
@@ -21,10 +25,36 @@ class MessageExecute:
         return list(
             mongodb["messages"]
             .find({"session_id": session_id})
-            .sort("created_at", -1)
+            .sort([("created_at", -1), ("_id", -1)])
             .limit(4)
         )
 
     @staticmethod
     def delete_messages_by_session_id(session_id: str):
         return mongodb["messages"].delete_many({"session_id": session_id}).deleted_count
+
+    @staticmethod
+    async def acreate_message(message: MessageModel):
+        new_message = await async_mongodb["messages"].insert_one(
+            message.model_dump(by_alias=True, exclude=["id"])
+        )
+        created_message = await async_mongodb["messages"].find_one(
+            {"_id": new_message.inserted_id}
+        )
+
+        return created_message
+
+    @staticmethod
+    async def aget_messages_by_session_id(session_id: str):
+        return (
+            await async_mongodb["messages"]
+            .find({"session_id": session_id})
+            .sort([("created_at", -1), ("_id", -1)])
+            .limit(4)
+            .to_list(length=None)
+        )
+
+    @staticmethod
+    async def adelete_messages_by_session_id(session_id: str):
+        result = await async_mongodb["messages"].delete_many({"session_id": session_id})
+        return result.deleted_count
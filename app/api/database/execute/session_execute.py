@@ -1,13 +1,18 @@
 """Session Execute module."""
 
 from bson import ObjectId
+from pymongo import ReturnDocument
 
-from app.api.database.mongo_db import mongodb
+from app.api.database.mongo_db import mongodb, async_mongodb
 from app.api.database.models.session import SessionModel
 
 
 class SessionExecute:
-    """Session execute for database operations."""
+    """
+    Session execute for database operations.
+
+    `a`-prefixed methods run the same operations on the async client.
+    """
 
     @staticmethod
     def create_session(session: SessionModel):
@@ -28,7 +33,49 @@ class SessionExecute:
     def get_sessions_by_user_id(user_id: str):
         return list(mongodb["sessions"].find({"user_id": user_id}))
 
+    @staticmethod
+    def update_session_sources(session_id: str, sources):
+        return mongodb["sessions"].find_one_and_update(
+            {"_id": ObjectId(session_id)},
+            {"$set": {"sources": sources}},
+            return_document=ReturnDocument.AFTER,
+        )
+
     @staticmethod
     def delete_session_by_id(session_id: str):
         mongodb["sessions"].delete_one({"_id": ObjectId(session_id)})
         return session_id
+
+    @staticmethod
+    async def acreate_session(session: SessionModel):
+        new_session = await async_mongodb["sessions"].insert_one(
+            session.model_dump(by_alias=True, exclude=["id"])
+        )
+        created_session = await async_mongodb["sessions"].find_one(
+            {"_id": new_session.inserted_id}
+        )
+
+        return created_session
+
+    @staticmethod
+    async def aget_session_by_id(session_id: str):
+        return await async_mongodb["sessions"].find_one({"_id": ObjectId(session_id)})
+
+    @staticmethod
+    async def aget_sessions_by_user_id(user_id: str):
+        return await async_mongodb["sessions"].find({"user_id": user_id}).to_list(
+            length=None
+        )
+
+    @staticmethod
+    async def aupdate_session_sources(session_id: str, sources):
+        return await async_mongodb["sessions"].find_one_and_update(
+            {"_id": ObjectId(session_id)},
+            {"$set": {"sources": sources}},
+            return_document=ReturnDocument.AFTER,
+        )
+
+    @staticmethod
+    async def adelete_session_by_id(session_id: str):
+        await async_mongodb["sessions"].delete_one({"_id": ObjectId(session_id)})
+        return session_id
@@ -0,0 +1,101 @@
+"""Source Execute module."""
+
+from typing import List, Optional
+
+from app.api.database.mongo_db import mongodb, async_mongodb
+from app.api.database.models.source import SourceModel
+
+
+class SourceExecute:
+    """
+    Source catalog execute for database operations.
+
+    The `sources` collection holds one entry per source, keyed by its name, written
+    on every ingest and delete so sources are listed without scanning the nodes.
+    `a`-prefixed methods run the same reads on the async client.
+    """
+
+    @staticmethod
+    def get_source_query(sources: Optional[List[str]] = None) -> dict:
+        return {"_id": {"$in": sources}} if sources is not None else {}
+
+    @staticmethod
+    def upsert_source(source: SourceModel):
+        mongodb["sources"].replace_one(
+            {"_id": source.source},
+            source.model_dump(by_alias=True),
+            upsert=True,
+        )
+
+    @staticmethod
+    def get_source(source: str):
+        return mongodb["sources"].find_one({"_id": source})
+
+    @staticmethod
+    def get_source_names(sources: Optional[List[str]] = None) -> List[str]:
+        """Get the names of the cataloged sources, of `sources` when given."""
+        return [
+            doc["_id"]
+            for doc in mongodb["sources"]
+            .find(SourceExecute.get_source_query(sources), {"_id": 1})
+            .sort("_id", 1)
+        ]
+
+    @staticmethod
+    def get_sources_by_content_hash(content_hash: str):
+        return list(mongodb["sources"].find({"content_hash": content_hash}))
+
+    @staticmethod
+    def count_sources() -> int:
+        return mongodb["sources"].count_documents({})
+
+    @staticmethod
+    def delete_sources(sources: Optional[List[str]] = None) -> int:
+        """Delete catalog entries, all of them when `sources` is None."""
+        return (
+            mongodb["sources"]
+            .delete_many(SourceExecute.get_source_query(sources))
+            .deleted_count
+        )
+
+    @staticmethod
+    async def aget_source(source: str):
+        return await async_mongodb["sources"].find_one({"_id": source})
+
+    @staticmethod
+    async def aget_source_names(sources: Optional[List[str]] = None) -> List[str]:
+        docs = (
+            await async_mongodb["sources"]
+            .find(SourceExecute.get_source_query(sources), {"_id": 1})
+            .sort("_id", 1)
+            .to_list(length=None)
+        )
+
+        return [doc["_id"] for doc in docs]
+
+    @staticmethod
+    async def aget_sources() -> List[dict]:
+        return await async_mongodb["sources"].find().sort("_id", 1).to_list(length=None)
+
+    @staticmethod
+    async def aget_totals() -> dict:
+        """Sum the node counts and sizes of every source, for quota checks."""
+        totals = (
+            await async_mongodb["sources"]
+            .aggregate(
+                [
+                    {
+                        "$group": {
+                            "_id": None,
+                            "sources": {"$sum": 1},
+                            "node_count": {"$sum": "$node_count"},
+                            "size": {"$sum": "$size"},
+                        }
+                    },
+                    {"$project": {"_id": 0}},
+                ]
+            )
+            .to_list(length=None)
+        )
+
+        return totals[0] if totals else {"sources": 0, "node_count": 0, "size": 0}
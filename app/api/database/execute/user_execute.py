@@ -2,12 +2,16 @@
 
 from bson import ObjectId
 
-from app.api.database.mongo_db import mongodb
+from app.api.database.mongo_db import mongodb, async_mongodb
 from app.api.database.models.user import UserModel
 
 
 class UserExecute:
-    """User execute for database operations."""
+    """
+    User execute for database operations.
+
+    `a`-prefixed methods run the same operations on the async client.
+    """
 
     @staticmethod
     def create_user(user: UserModel):
@@ -31,3 +35,26 @@ class UserExecute:
     def delete_user_by_id(user_id: str):
         mongodb["users"].delete_one({"_id": ObjectId(user_id)})
         return user_id
+
+    @staticmethod
+    async def acreate_user(user: UserModel):
+        return await async_mongodb["users"].insert_one(
+            user.model_dump(by_alias=True, exclude=["id"])
+        )
+
+    @staticmethod
+    async def aget_users():
+        return await async_mongodb["users"].find().to_list(length=None)
+
+    @staticmethod
+    async def aget_user_by_id(user_id: str | ObjectId):
+        return await async_mongodb["users"].find_one({"_id": ObjectId(user_id)})
+
+    @staticmethod
+    async def aget_user_by_username(username: str):
+        return await async_mongodb["users"].find_one({"username": username})
+
+    @staticmethod
+    async def adelete_user_by_id(user_id: str):
+        await async_mongodb["users"].delete_one({"_id": ObjectId(user_id)})
+        return user_id
@@ -0,0 +1,210 @@
+"""
+Mongo index registry.
+
+Every index the app's queries rely on is declared in `INDEXES` and created at
+startup by `ensure_indexes`, which does nothing for indexes that already exist.
+`HOT_QUERIES` lists the queries run on every request or ingest; check their plans
+against a database with:
+
+    python -m app.api.database.indexes
+
+It prints the plan of every hot query and exits with status 1 when one of them
+scans a whole collection.
+"""
+
+import argparse
+import sys
+from typing import Dict, List, Optional, Tuple
+
+from pymongo.database import Database
+from pymongo.errors import OperationFailure
+
+from app.logger.logger import custom_logger
+
+
+class IndexSpec:
+    """An index of a collection: its keys, as given to `create_index`, and options."""
+
+    def __init__(self, collection: str, keys: List[Tuple[str, int]], **options):
+        self.collection = collection
+        self.keys = keys
+        self.options = options
+
+    def __repr__(self) -> str:
+        keys = ", ".join(f"{field}: {direction}" for field, direction in self.keys)
+        return f"{self.collection} {{{keys}}}"
+
+
+class HotQuery:
+    """A query to explain: a `find` with a sort, or a `distinct` of `key`."""
+
+    def __init__(
+        self,
+        name: str,
+        collection: str,
+        query: dict,
+        sort: Optional[Dict[str, int]] = None,
+        distinct: Optional[str] = None,
+    ):
+        self.name = name
+        self.collection = collection
+        self.query = query
+        self.sort = sort
+        self.distinct = distinct
+
+    def to_command(self) -> dict:
+        if self.distinct is not None:
+            return {
+                "distinct": self.collection,
+                "key": self.distinct,
+                "query": self.query,
+            }
+
+        command = {"find": self.collection, "filter": self.query}
+        if self.sort:
+            command["sort"] = self.sort
+
+        return command
+
+
+INDEXES = [
+    # MessageExecute.get_messages_by_session_id: newest messages of a session
+    IndexSpec("messages", [("session_id", 1), ("created_at", -1), ("_id", -1)]),
+    # SessionExecute.get_sessions_by_user_id
+    IndexSpec("sessions", [("user_id", 1)]),
+    # UserExecute.get_user_by_username, on every login
+    IndexSpec("users", [("username", 1)]),
+    # nodes of a source, in id order for the listing pages
+    IndexSpec("docstore/data", [("__data__.metadata.source", 1), ("_id", 1)]),
+    # documents holding deleted nodes
+    IndexSpec("docstore/ref_doc_info", [("node_ids", 1)]),
+    # queued jobs, resumed at startup, and running ones, requeued
+    IndexSpec("ingest_jobs", [("status", 1)]),
+    # IngestJobService.submit: sources claimed by queued or running jobs
+    IndexSpec(
+        "ingest_jobs",
+        [("claim", 1)],
+        unique=True,
+        partialFilterExpression={"claim": {"$type": "string"}},
+    ),
+    # SourceExecute.get_sources_by_content_hash: the same content under other names
+    IndexSpec("sources", [("content_hash", 1)]),
+]
+
+HOT_QUERIES = [
+    HotQuery(
+        "message history",
+        "messages",
+        {"session_id": "000000000000000000000000"},
+        sort={"created_at": -1, "_id": -1},
+    ),
+    HotQuery("sessions of a user", "sessions", {"user_id": "000000000000000000000000"}),
+    HotQuery("user by username", "users", {"username": "-"}),
+    HotQuery(
+        "nodes of a source",
+        "docstore/data",
+        {"__data__.metadata.source": "-"},
+        sort={"_id": 1},
+    ),
+    HotQuery(
+        "node ids of a source",
+        "docstore/data",
+        {"__data__.metadata.source": "-"},
+        distinct="_id",
+    ),
+    HotQuery(
+        "documents of nodes",
+        "docstore/ref_doc_info",
+        {"node_ids": {"$in": ["-"]}},
+    ),
+    HotQuery(
+        "queued jobs",
+        "ingest_jobs",
+        {"status": "queued"},
+        sort={"created_at": 1},
+    ),
+    HotQuery("source catalog", "sources", {}, sort={"_id": 1}),
+    HotQuery("sources by content hash", "sources", {"content_hash": "-"}),
+]
+
+
+def ensure_indexes(database: Database = None) -> List[str]:
+    """
+    Create the registered indexes, returning their names.
+
+    Creating an existing index is a no-op. An index conflicting with one created by
+    hand, same keys with other options or name, is reported and left as it is.
+    """
+    if database is None:
+        from app.api.database.mongo_db import mongodb as database
+
+    names = []
+    for spec in INDEXES:
+        try:
+            names.append(
+                database[spec.collection].create_index(spec.keys, **spec.options)
+            )
+        except OperationFailure as e:
+            custom_logger.warning(f"Could not create index {spec}: {e}")
+
+    return names
+
+
+def get_plan_stages(plan: dict) -> List[dict]:
+    """Flatten a query plan into its stages, from the root to the leaves."""
+    stages = [plan]
+    for child in plan.get("inputStages", []) + [
+        plan[key] for key in ("inputStage", "queryPlan") if key in plan
+    ]:
+        stages.extend(get_plan_stages(child))
+
+    return stages
+
+
+def explain_query(database: Database, query: HotQuery) -> dict:
+    """Get the stages and indexes of the winning plan of a query."""
+    explanation = database.command(
+        "explain", query.to_command(), verbosity="queryPlanner"
+    )
+    stages = get_plan_stages(explanation["queryPlanner"]["winningPlan"])
+
+    return {
+        "name": query.name,
+        "collection": query.collection,
+        "stages": [stage["stage"] for stage in stages if "stage" in stage],
+        "indexes": [stage["indexName"] for stage in stages if "indexName" in stage],
+        "collscan": any(stage.get("stage") == "COLLSCAN" for stage in stages),
+    }
+
+
+def check_query_plans(database: Database = None) -> List[dict]:
+    """Explain every hot query, flagging the ones scanning a whole collection."""
+    if database is None:
+        from app.api.database.mongo_db import mongodb as database
+
+    return [explain_query(database, query) for query in HOT_QUERIES]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--apply", action="store_true", help="create the indexes before checking"
+    )
+    args = parser.parse_args()
+
+    if args.apply:
+        print(f"indexes: {', '.join(ensure_indexes())}")
+
+    plans = check_query_plans()
+    for plan in plans:
+        flag = "COLLSCAN" if plan["collscan"] else "ok"
+        print(
+            f"{flag:8} {plan['name']:26} {plan['collection']:22} "
+            f"{' <- '.join(plan['stages'])}  {', '.join(plan['indexes'])}"
+        )
+
+    sys.exit(1 if any(plan["collscan"] for plan in plans) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,500 @@
+"""In-process vector store on memory-mapped NumPy arrays."""
+
+import asyncio
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from llama_index.core.schema import BaseNode
+from llama_index.core.vector_stores.types import (
+    FilterCondition,
+    FilterOperator,
+    MetadataFilters,
+    VectorStore,
+    VectorStoreQuery,
+    VectorStoreQueryResult,
+)
+
+from app.core.config import config
+from app.logger.logger import custom_logger
+
+DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+# rows scored per matrix product, bounds the temporaries of a brute-force search
+BLOCK_SIZE = 65536
+IVF_ARRAYS = ("centroids", "order", "offsets")
+
+
+class IVFIndex:
+    """Inverted file index: rows grouped by their nearest centroid."""
+
+    def __init__(
+        self, centroids: np.ndarray, order: np.ndarray, offsets: np.ndarray, rows: int
+    ) -> None:
+        self.centroids = centroids
+        # row numbers sorted by list, list i is order[offsets[i]:offsets[i + 1]]
+        self.order = order
+        self.offsets = offsets
+        # rows added after the build are not in any list and are scanned every time
+        self.rows = rows
+
+    @classmethod
+    def build(
+        cls,
+        vectors: np.ndarray,
+        scales: Optional[np.ndarray],
+        rows: int,
+        iterations: int = 10,
+    ) -> "IVFIndex":
+        """Cluster the first `rows` vectors with spherical k-means."""
+        lists = max(int(np.sqrt(rows)), 1)
+        rng = np.random.default_rng(0)
+        sample = np.sort(rng.choice(rows, size=min(rows, lists * 64), replace=False))
+        points = to_float(vectors[sample], None if scales is None else scales[sample])
+
+        centroids = points[rng.choice(len(points), size=lists, replace=False)]
+        for _ in range(iterations):
+            assignment = np.argmax(points @ centroids.T, axis=1)
+            for position in range(lists):
+                members = points[assignment == position]
+                if len(members):
+                    centroids[position] = members.sum(axis=0)
+            centroids /= np.maximum(
+                np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12
+            )
+
+        assignment = np.empty(rows, dtype=np.int32)
+        for start in range(0, rows, BLOCK_SIZE):
+            stop = min(start + BLOCK_SIZE, rows)
+            block = to_float(
+                vectors[start:stop], None if scales is None else scales[start:stop]
+            )
+            assignment[start:stop] = np.argmax(block @ centroids.T, axis=1)
+
+        order = np.argsort(assignment, kind="stable").astype(np.int64)
+        offsets = np.searchsorted(assignment[order], np.arange(lists + 1))
+
+        return cls(centroids.astype(np.float32), order, offsets, rows)
+
+    def candidates(self, query: np.ndarray, nprobe: int, count: int) -> np.ndarray:
+        """Rows of the `nprobe` lists closest to the query, and the rows not indexed."""
+        probed = np.argsort(-(self.centroids @ query))[:nprobe]
+        return np.concatenate(
+            [self.order[self.offsets[i] : self.offsets[i + 1]] for i in probed]
+            + [np.arange(self.rows, count)]
+        )
+
+
+def to_float(vectors: np.ndarray, scales: Optional[np.ndarray]) -> np.ndarray:
+    """Decode stored vectors to float32."""
+    vectors = vectors.astype(np.float32)
+    if scales is not None:
+        vectors *= scales[:, None]
+
+    return vectors
+
+
+class LocalVectorStore(VectorStore):
+    """
+    Vector store kept in memory-mapped NumPy files under `path`.
+
+    Vectors are normalized and stored as float32, float16 or int8 with a scale per
+    row, so a dot product is their cosine similarity. Searches are exact until
+    `ivf_min_rows` rows are stored, then go through an IVF index of sqrt(rows) lists
+    of which `nprobe` are scanned. Deleted rows are only flagged, and compacted away
+    when they are the majority. Nodes themselves stay in the docstore.
+
+    Files: `vectors.npy` (rows x dim), `scales.npy` (int8 only), `alive.npy`,
+    `rows.json` (node id, ref doc id and source of each row) and `ivf_*.npy`.
+    """
+
+    stores_text: bool = False
+    is_embedding_query: bool = True
+
+    def __init__(
+        self,
+        path: str,
+        dtype: str = None,
+        ivf_min_rows: int = None,
+        nprobe: int = None,
+    ) -> None:
+        self.path = path
+        self.dtype_name = dtype or config.LOCAL_VECTOR_DTYPE
+        self.dtype = DTYPES[self.dtype_name]
+        self.ivf_min_rows = ivf_min_rows or config.LOCAL_VECTOR_IVF_MIN_ROWS
+        self.nprobe = nprobe or config.LOCAL_VECTOR_IVF_NPROBE
+        self._lock = threading.RLock()
+
+        self.count = 0
+        self.dim: Optional[int] = None
+        self._vectors: Optional[np.ndarray] = None
+        self._scales: Optional[np.ndarray] = None
+        self._alive: Optional[np.ndarray] = None
+        self._ids: List[str] = []
+        self._ref_doc_ids: List[str] = []
+        self._sources: List[Optional[str]] = []
+        self._row_by_id: Dict[str, int] = {}
+        self._source_codes = np.empty(0, dtype=np.int32)
+        self._code_by_source: Dict[Optional[str], int] = {}
+        self._ivf: Optional[IVFIndex] = None
+        # whether the IVF index was rebuilt since it was last saved
+        self._ivf_changed = False
+
+        os.makedirs(path, exist_ok=True)
+        if os.path.exists(self.file("rows.json")):
+            self.load()
+
+    def file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    @property
+    def client(self) -> None:
+        return None
+
+    def load(self) -> None:
+        """Map the saved arrays, without reading the vectors into memory."""
+        with open(self.file("rows.json")) as file:
+            rows = json.load(file)
+
+        if rows["dtype"] != self.dtype_name:
+            custom_logger.warning(
+                f"Local vector store at {self.path} holds {rows['dtype']} vectors, "
+                f"ignoring LOCAL_VECTOR_DTYPE={self.dtype_name}"
+            )
+            self.dtype_name, self.dtype = rows["dtype"], DTYPES[rows["dtype"]]
+
+        self.count = rows["count"]
+        self.dim = rows["dim"]
+        if self.dim is None:
+            return
+
+        self._ids = rows["ids"]
+        self._ref_doc_ids = rows["ref_doc_ids"]
+        self._sources = rows["sources"]
+        self._vectors = np.load(self.file("vectors.npy"), mmap_mode="r+")
+        self._alive = np.load(self.file("alive.npy"), mmap_mode="r+")
+        if self.dtype == np.int8:
+            self._scales = np.load(self.file("scales.npy"), mmap_mode="r+")
+
+        alive = np.asarray(self._alive[: self.count])
+        self._row_by_id = {
+            node_id: row for row, node_id in enumerate(self._ids) if alive[row]
+        }
+        self._source_codes = np.zeros(len(self._vectors), dtype=np.int32)
+        self._source_codes[: self.count] = [self.source_code(s) for s in self._sources]
+
+        if rows.get("ivf_rows"):
+            self._ivf = IVFIndex(
+                *(
+                    np.load(self.file(f"ivf_{name}.npy"), mmap_mode="r")
+                    for name in IVF_ARRAYS
+                ),
+                rows=rows["ivf_rows"],
+            )
+
+    def reload(self) -> None:
+        """Map the saved arrays again, after another process changed them."""
+        with self._lock:
+            if not os.path.exists(self.file("rows.json")):
+                return
+            self._code_by_source = {}
+            self._ivf = None
+            self._ivf_changed = False
+            self.load()
+
+    def source_code(self, source: Optional[str]) -> int:
+        return self._code_by_source.setdefault(source, len(self._code_by_source))
+
+    def encode(self, vectors: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """Normalize float32 vectors and convert them to the stored type."""
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        if self.dtype != np.int8:
+            return vectors.astype(self.dtype), None
+
+        scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127
+        return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(
+            np.float32
+        )
+
+    def reserve(self, rows: int) -> None:
+        """Make room for `rows` rows, moving the arrays to larger files if needed."""
+        capacity = 0 if self._vectors is None else len(self._vectors)
+        if self._vectors is not None and rows <= capacity:
+            return
+
+        capacity = max(rows, 2 * capacity, 1024)
+        self._vectors = self.grow(
+            "vectors.npy", self._vectors, (capacity, self.dim), self.dtype
+        )
+        self._alive = self.grow("alive.npy", self._alive, (capacity,), np.bool_)
+        if self.dtype == np.int8:
+            self._scales = self.grow(
+                "scales.npy", self._scales, (capacity,), np.float32
+            )
+        source_codes = np.zeros(capacity, dtype=np.int32)
+        source_codes[: self.count] = self._source_codes[: self.count]
+        self._source_codes = source_codes
+
+    def grow(self, name: str, array: Optional[np.ndarray], shape, dtype) -> np.ndarray:
+        # searches running meanwhile keep the mapping of the replaced file
+        grown = np.lib.format.open_memmap(
+            self.file(name + ".tmp"), mode="w+", dtype=dtype, shape=shape
+        )
+        if array is not None:
+            grown[: self.count] = array[: self.count]
+        grown.flush()
+        os.replace(self.file(name + ".tmp"), self.file(name))
+
+        return np.load(self.file(name), mmap_mode="r+")
+
+    def add(self, nodes: List[BaseNode], **add_kwargs: Any) -> List[str]:
+        """Append the vectors of nodes."""
+        if not nodes:
+            return []
+
+        vectors = np.asarray([node.get_embedding() for node in nodes], dtype=np.float32)
+        encoded, scales = self.encode(vectors)
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+            # a node added again replaces its previous vector
+            self.delete_rows(
+                [
+                    self._row_by_id[node.node_id]
+                    for node in nodes
+                    if node.node_id in self._row_by_id
+                ]
+            )
+
+            start, stop = self.count, self.count + len(nodes)
+            self.reserve(stop)
+            self._vectors[start:stop] = encoded
+            if scales is not None:
+                self._scales[start:stop] = scales
+            self._alive[start:stop] = True
+            for row, node in enumerate(nodes, start):
+                source = node.metadata.get("source")
+                self._ids.append(node.node_id)
+                self._ref_doc_ids.append(node.ref_doc_id or "None")
+                self._sources.append(source)
+                self._row_by_id[node.node_id] = row
+                self._source_codes[row] = self.source_code(source)
+            self.count = stop
+
+            if self.ivf_is_stale():
+                self.build_ivf()
+            self.persist()
+
+        return [node.node_id for node in nodes]
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        """Delete the vectors of the nodes of a document."""
+        with self._lock:
+            self.delete_nodes(
+                [
+                    node_id
+                    for node_id, row in self._row_by_id.items()
+                    if self._ref_doc_ids[row] == ref_doc_id
+                ]
+            )
+
+    def delete_nodes(self, node_ids: List[str], batch_size: int = None) -> None:
+        """Delete the vectors of nodes."""
+        with self._lock:
+            self.delete_rows(
+                [
+                    self._row_by_id[node_id]
+                    for node_id in node_ids
+                    if node_id in self._row_by_id
+                ]
+            )
+            if self.count and len(self._row_by_id) < self.count / 2:
+                self.compact()
+            self.persist()
+
+    def delete_rows(self, rows: List[int]) -> None:
+        for row in rows:
+            self._alive[row] = False
+            del self._row_by_id[self._ids[row]]
+
+    def compact(self) -> None:
+        """Rewrite the arrays without the deleted rows."""
+        kept = np.flatnonzero(self._alive[: self.count])
+        custom_logger.info(
+            f"Compacting local vector store: {self.count} rows, {len(kept)} alive"
+        )
+
+        vectors = self._vectors[kept]
+        scales = None if self._scales is None else self._scales[kept]
+        self._ids = [self._ids[row] for row in kept]
+        self._ref_doc_ids = [self._ref_doc_ids[row] for row in kept]
+        self._sources = [self._sources[row] for row in kept]
+        source_codes = self._source_codes[kept]
+        self._row_by_id = {node_id: row for row, node_id in enumerate(self._ids)}
+        self.count = 0
+        self._vectors = self._scales = self._alive = None
+
+        self.reserve(len(kept))
+        self._vectors[: len(kept)] = vectors
+        if scales is not None:
+            self._scales[: len(kept)] = scales
+        self._alive[: len(kept)] = True
+        self._source_codes[: len(kept)] = source_codes
+        self.count = len(kept)
+        self._ivf = None
+        if self.ivf_is_stale():
+            self.build_ivf()
+
+    def ivf_is_stale(self) -> bool:
+        """Whether the IVF index is missing or misses over a fifth of the rows."""
+        if len(self._row_by_id) < self.ivf_min_rows:
+            return False
+
+        return self._ivf is None or self.count - self._ivf.rows > self._ivf.rows / 5
+
+    def build_ivf(self) -> None:
+        self._ivf = IVFIndex.build(self._vectors, self._scales, self.count)
+        self._ivf_changed = True
+        custom_logger.info(
+            f"Built IVF index of {len(self._ivf.centroids)} lists over {self.count} rows"
+        )
+
+    def persist(self, persist_path: str = None, **kwargs: Any) -> None:
+        """Flush the arrays and save the rows, replacing files once written."""
+        with self._lock:
+            for array in (self._vectors, self._scales, self._alive):
+                if array is not None:
+                    array.flush()
+
+            if self._ivf is not None and self._ivf_changed:
+                for name in IVF_ARRAYS:
+                    with open(self.file(f"ivf_{name}.npy.tmp"), "wb") as file:
+                        np.save(file, getattr(self._ivf, name))
+                    os.replace(
+                        self.file(f"ivf_{name}.npy.tmp"), self.file(f"ivf_{name}.npy")
+                    )
+                self._ivf_changed = False
+
+            rows = {
+                "dtype": self.dtype_name,
+                "dim": self.dim,
+                "count": self.count,
+                "ids": self._ids,
+                "ref_doc_ids": self._ref_doc_ids,
+                "sources": self._sources,
+                "ivf_rows": self._ivf.rows if self._ivf is not None else 0,
+            }
+            with open(self.file("rows.json.tmp"), "w") as file:
+                json.dump(rows, file)
+            os.replace(self.file("rows.json.tmp"), self.file("rows.json"))
+
+    def get_source_codes(
+        self, filters: Optional[MetadataFilters]
+    ) -> Optional[Set[int]]:
+        """Get the codes of the sources a query is restricted to, None for all."""
+        if filters is None or not filters.filters:
+            return None
+
+        allowed: Optional[Set[int]] = None
+        for metadata_filter in filters.filters:
+            if (
+                isinstance(metadata_filter, MetadataFilters)
+                or metadata_filter.key != "source"
+            ):
+                raise ValueError("The local vector store only filters on source")
+            if metadata_filter.operator == FilterOperator.EQ:
+                sources = {metadata_filter.value}
+            elif metadata_filter.operator == FilterOperator.IN:
+                sources = set(metadata_filter.value)
+            else:
+                raise ValueError(
+                    f"Unsupported operator {metadata_filter.operator} for source"
+                )
+
+            codes = {
+                self._code_by_source[s] for s in sources if s in self._code_by_source
+            }
+            if allowed is None:
+                allowed = codes
+            elif filters.condition == FilterCondition.OR:
+                allowed |= codes
+            else:
+                allowed &= codes
+
+        return allowed
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        """
+        Get the top k most similar nodes.
+
+        The store only holds nodes of the index, so the node ids the retriever
+        restricts queries to are not checked.
+        """
+        with self._lock:
+            # rows are only appended and flags only cleared, a snapshot stays valid
+            count, vectors, scales = self.count, self._vectors, self._scales
+            alive, source_codes, ivf = self._alive, self._source_codes, self._ivf
+            ids = self._ids
+            allowed_codes = self.get_source_codes(query.filters)
+
+        if count == 0 or (allowed_codes is not None and not allowed_codes):
+            return VectorStoreQueryResult(nodes=None, similarities=[], ids=[])
+
+        vector = np.asarray(query.query_embedding, dtype=np.float32)
+        vector /= max(float(np.linalg.norm(vector)), 1e-12)
+        if ivf is not None:
+            candidate_rows = ivf.candidates(vector, self.nprobe, count)
+            blocks = [candidate_rows]
+        else:
+            blocks = [
+                np.arange(start, min(start + BLOCK_SIZE, count))
+                for start in range(0, count, BLOCK_SIZE)
+            ]
+
+        top_k = query.similarity_top_k
+        best_rows = np.empty(0, dtype=np.int64)
+        best_scores = np.empty(0, dtype=np.float32)
+        for rows in blocks:
+            mask = alive[rows]
+            if allowed_codes is not None:
+                mask &= np.isin(source_codes[rows], list(allowed_codes))
+            rows = rows[mask]
+            if not len(rows):
+                continue
+
+            if ivf is None:
+                # contiguous blocks are sliced from the mapping without a gather
+                start, stop = rows[0], rows[-1] + 1
+                block_scores = (
+                    to_float(
+                        vectors[start:stop],
+                        None if scales is None else scales[start:stop],
+                    )
+                    @ vector
+                )
+                scores = block_scores[rows - start]
+            else:
+                scores = (
+                    to_float(vectors[rows], None if scales is None else scales[rows])
+                    @ vector
+                )
+
+            best_rows = np.concatenate([best_rows, rows])
+            best_scores = np.concatenate([best_scores, scores])
+            if len(best_rows) > top_k:
+                kept = np.argpartition(-best_scores, top_k)[:top_k]
+                best_rows, best_scores = best_rows[kept], best_scores[kept]
+
+        order = np.argsort(-best_scores)
+        return VectorStoreQueryResult(
+            nodes=None,
+            similarities=[float(best_scores[i]) for i in order],
+            ids=[ids[best_rows[i]] for i in order],
+        )
+
+    async def aquery(
+        self, query: VectorStoreQuery, **kwargs: Any
+    ) -> VectorStoreQueryResult:
+        """Search on a worker thread, as the base class would block the event loop."""
+        return await asyncio.to_thread(self.query, query, **kwargs)
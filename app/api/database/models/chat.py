@@ -1,5 +1,7 @@
 """Chat model"""
 
+from typing import List, Literal, Optional
+
 from pydantic import BaseModel
 
 
@@ -7,6 +9,10 @@ class ChatBodyBaseModel(BaseModel):
     """Chat base"""
 
     query: str
+    # vector, keyword or hybrid retrieval, RETRIEVAL_MODE when not set
+    retrieval_mode: Optional[Literal["vector", "keyword", "hybrid"]] = None
+    # answer only from these sources, the whole corpus when not set
+    sources: Optional[List[str]] = None
 
 
 class ChatBodyModel(ChatBodyBaseModel):
@@ -5,4 +5,4 @@ from pydantic import BaseModel, Field
 
 
 class HealthResponse(BaseModel):
-    status: Literal["ok"] = Field(default="ok")
\ No newline at end of file
+    status: Literal["ok", "starting"] = Field(default="ok")
\ No newline at end of file
@@ -0,0 +1,61 @@
+"""Ingest job model"""
+
+from datetime import datetime
+from pydantic import BaseModel, Field, ConfigDict
+from typing import List, Literal, Optional
+from pydantic.functional_validators import BeforeValidator
+from typing_extensions import Annotated
+
+PyObjectId = Annotated[str, BeforeValidator(str)]
+
+IngestJobStatus = Literal["queued", "running", "completed", "failed"]
+
+
+class IngestJobBaseModel(BaseModel):
+    """Ingest job base"""
+
+    kind: Literal["file", "url"]
+    source: str
+    file_path: Optional[str] = None
+    content_hash: Optional[str] = None
+    # replace what is indexed under the source instead of adding to it
+    upsert: bool = False
+
+
+class IngestJobCreateModel(IngestJobBaseModel):
+    """Ingest job create"""
+
+
+class IngestJobModel(IngestJobBaseModel):
+    """Ingest job schema"""
+
+    id: Optional[PyObjectId] = Field(alias="_id", default=None)
+    status: IngestJobStatus = "queued"
+    stage: str = "queued"
+    progress: float = 0.0
+    error: Optional[str] = None
+    documents_count: Optional[int] = None
+    attempts: int = 0
+    # the source, while the job is queued or running: one job per source at a time
+    claim: Optional[str] = None
+    # nodes inserted by the last attempt, deleted if it fails
+    node_ids: List[str] = Field(default_factory=list, exclude=True)
+    created_at: Optional[datetime] = Field(default_factory=datetime.now)
+    updated_at: Optional[datetime] = Field(default_factory=datetime.now)
+    model_config = ConfigDict(
+        populate_by_name=True,
+        arbitrary_types_allowed=True,
+        json_schema_extra={
+            "example": {
+                "id": "65d1f0c2a1b2c3d4e5f6a7b8",
+                "kind": "file",
+                "source": "Scrum-Guide-1.pdf",
+                "status": "running",
+                "stage": "embedding",
+                "progress": 0.45,
+                "error": None,
+                "created_at": "2024-02-18T10:00:00",
+                "updated_at": "2024-02-18T10:00:05",
+            }
+        },
+    )
@@ -26,7 +26,9 @@ class MessageModel(MessageBaseModel):
     """Message model"""
 
     id: Optional[PyObjectId] = Field(alias="_id", default=None)
-    created_at: Optional[datetime] = datetime.now()
+    # tokens of the message, counted once when it is created
+    token_count: Optional[int] = None
+    created_at: Optional[datetime] = Field(default_factory=datetime.now)
     model_config = ConfigDict(
         populate_by_name=True,
         arbitrary_types_allowed=True,
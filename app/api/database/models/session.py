@@ -13,17 +13,25 @@ class SessionBaseModel(BaseModel):
     """Chat session base"""
 
     user_id: PyObjectId
+    # sources the conversation is pinned to, the whole corpus when not set
+    sources: Optional[List[str]] = None
 
 
 class SessionCreateModel(SessionBaseModel):
     """Chat session create"""
 
 
+class SessionSourcesModel(BaseModel):
+    """Chat session sources update"""
+
+    sources: Optional[List[str]] = None
+
+
 class SessionModel(SessionBaseModel):
     """Chat session schema"""
 
     id: Optional[PyObjectId] = Field(alias="_id", default=None)
-    created_at: Optional[datetime] = datetime.now()
+    created_at: Optional[datetime] = Field(default_factory=datetime.now)
     model_config = ConfigDict(
         populate_by_name=True,
         arbitrary_types_allowed=True,
@@ -31,6 +39,7 @@ class SessionModel(SessionBaseModel):
             "example": {
                 "id": "1234567890",
                 "user_id": "1234567890",
+                "sources": ["Scrum-Guide-1.pdf"],
                 "created_at": "2021-09-01T00:00:00",
             }
         },
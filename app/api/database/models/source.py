@@ -0,0 +1,33 @@
+"""Source model"""
+
+from datetime import datetime
+from pydantic import BaseModel, Field, ConfigDict
+from typing import List, Optional
+
+
+class SourceModel(BaseModel):
+    """Source catalog entry, one per ingested file or URL"""
+
+    source: str = Field(alias="_id")
+    doc_ids: List[str] = []
+    node_count: int = 0
+    # bytes of the text of its nodes
+    size: int = 0
+    # sha256 of the uploaded file, or of the text of the documents of a URL
+    content_hash: Optional[str] = None
+    embedding_model: Optional[str] = None
+    ingested_at: Optional[datetime] = Field(default_factory=datetime.now)
+    model_config = ConfigDict(
+        populate_by_name=True,
+        json_schema_extra={
+            "example": {
+                "source": "Scrum-Guide-1.pdf",
+                "doc_ids": ["0f5c9a3e-5d3b-5b1e-9c4a-2f1d7e8a6b3c"],
+                "node_count": 1,
+                "size": 3456,
+                "content_hash": "9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08",
+                "embedding_model": "text-embedding-3-small",
+                "ingested_at": "2024-02-18T10:00:05",
+            }
+        },
+    )
@@ -24,7 +24,7 @@ class UserModel(UserBaseModel):
     """User Schema"""
 
     id: Optional[PyObjectId] = Field(alias="_id", default=None)
-    created_at: Optional[datetime] = datetime.now()
+    created_at: Optional[datetime] = Field(default_factory=datetime.now)
     model_config = ConfigDict(
         populate_by_name=True,
         arbitrary_types_allowed=True,
@@ -1,27 +1,124 @@
-"""MongoDB database client."""
+"""
+MongoDB database clients.
 
-import pymongo
-from llama_index.vector_stores.mongodb import MongoDBAtlasVectorSearch
-from llama_index.storage.docstore.mongodb import MongoDocumentStore
-from llama_index.storage.index_store.mongodb import MongoIndexStore
+Clients and stores are built by the service container on first use, so importing
+this module connects to nothing. `mongodb` and `async_mongodb` are the app's
+database on the blocking and on the async client, resolved on first access.
+"""
+
+from typing import Any
 
 from app.core.config import config
+from app.core.container import container
 from app.logger.logger import custom_logger
 
-mongodb_client = pymongo.MongoClient(config.MONGO_URI)
-mongodb = mongodb_client.get_database(config.MONGO_DB_NAME)
-custom_logger.info("Connected to MongoDB Atlas")
+pool_options = dict(
+    maxPoolSize=config.MONGO_MAX_POOL_SIZE,
+    minPoolSize=config.MONGO_MIN_POOL_SIZE,
+    maxIdleTimeMS=config.MONGO_MAX_IDLE_TIME_MS,
+    waitQueueTimeoutMS=config.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+)
+
+
+def create_mongodb_client():
+    """Blocking client, for worker threads and scripts."""
+    import pymongo
+
+    client = pymongo.MongoClient(config.MONGO_URI, **pool_options)
+    custom_logger.info("Connected to MongoDB Atlas")
+
+    return client
+
+
+def create_async_mongodb_client():
+    """One non-blocking client shared by every request handler."""
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    return AsyncIOMotorClient(config.MONGO_URI, **pool_options)
+
+
+def create_vector_store():
+    from app.api.database.mongo_vector_store import MongoVectorStore
+
+    vector_store = MongoVectorStore(
+        mongodb_client=container.get("mongodb_client"),
+        async_mongodb_client=container.get("async_mongodb_client"),
+        db_name=config.MONGO_DB_NAME,
+        collection_name="vector_store",
+        index_name="vector_index",
+    )
+    custom_logger.info("Connected to MongoDB Atlas Vector Store")
+
+    return vector_store
+
+
+def create_kv_store():
+    """Key-value store of the document and index stores, on the shared clients."""
+    from llama_index.storage.kvstore.mongodb import MongoDBKVStore
+
+    return MongoDBKVStore(
+        mongo_client=container.get("mongodb_client"),
+        mongo_aclient=container.get("async_mongodb_client"),
+        db_name=config.MONGO_DB_NAME,
+    )
+
+
+def create_index_store():
+    from llama_index.storage.index_store.mongodb import MongoIndexStore
+
+    index_store = MongoIndexStore(container.get("kv_store"))
+    custom_logger.info("Connected to MongoDB Atlas Index Store")
 
-vector_store = MongoDBAtlasVectorSearch(
-    mongodb_client=mongodb_client,
-    db_name=config.MONGO_DB_NAME,
-    collection_name="vector_store",
-    index_name="vector_index",
+    return index_store
+
+
+def create_doc_store():
+    from llama_index.storage.docstore.mongodb import MongoDocumentStore
+
+    doc_store = MongoDocumentStore(container.get("kv_store"))
+    custom_logger.info("Connected to MongoDB Atlas Document Store")
+
+    return doc_store
+
+
+container.provide("mongodb_client", create_mongodb_client, close=lambda c: c.close())
+container.provide(
+    "async_mongodb_client", create_async_mongodb_client, close=lambda c: c.close()
 )
-custom_logger.info("Connected to MongoDB Atlas Vector Store")
+container.provide("vector_store", create_vector_store)
+container.provide("kv_store", create_kv_store)
+container.provide("index_store", create_index_store)
+container.provide("doc_store", create_doc_store)
+
+
+def get_mongo_vector_store():
+    return container.get("vector_store")
+
+
+def get_index_store():
+    return container.get("index_store")
+
+
+def get_doc_store():
+    return container.get("doc_store")
+
+
+class LazyDatabase:
+    """The app's database on a container client, resolved on first access."""
+
+    def __init__(self, client_name: str) -> None:
+        self.client_name = client_name
+
+    @property
+    def database(self) -> Any:
+        return container.get(self.client_name).get_database(config.MONGO_DB_NAME)
+
+    def __getitem__(self, collection_name: str) -> Any:
+        return self.database[collection_name]
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.database, name)
 
-index_store = MongoIndexStore.from_uri(config.MONGO_URI, db_name=config.MONGO_DB_NAME)
-custom_logger.info("Connected to MongoDB Atlas Index Store")
 
-doc_store = MongoDocumentStore.from_uri(config.MONGO_URI, db_name=config.MONGO_DB_NAME)
-custom_logger.info("Connected to MongoDB Atlas Document Store")
+mongodb = LazyDatabase("mongodb_client")
+async_mongodb = LazyDatabase("async_mongodb_client")
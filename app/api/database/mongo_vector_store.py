@@ -0,0 +1,167 @@
+"""MongoDB Atlas vector store with a non-blocking query path."""
+
+from typing import Any, Dict, List
+
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.schema import TextNode
+from llama_index.core.vector_stores.types import (
+    FilterCondition,
+    FilterOperator,
+    MetadataFilters,
+    VectorStoreQuery,
+    VectorStoreQueryResult,
+)
+from llama_index.core.vector_stores.utils import (
+    legacy_metadata_dict_to_node,
+    metadata_dict_to_node,
+)
+from llama_index.vector_stores.mongodb import MongoDBAtlasVectorSearch
+
+from app.core.config import config
+
+MONGO_OPERATORS = {
+    FilterOperator.EQ: "$eq",
+    FilterOperator.NE: "$ne",
+    FilterOperator.GT: "$gt",
+    FilterOperator.GTE: "$gte",
+    FilterOperator.LT: "$lt",
+    FilterOperator.LTE: "$lte",
+}
+
+
+class MongoVectorStore(MongoDBAtlasVectorSearch):
+    """
+    `MongoDBAtlasVectorSearch` whose `aquery` runs on the async Motor client.
+
+    The base class answers `aquery` with its blocking `query`, which stalls the
+    event loop of the request serving it. Both paths share the same pipeline.
+    Metadata filters are applied by `$vectorSearch` before ranking, so the fields
+    filtered on must be "filter" fields of the vector search index.
+    """
+
+    _async_collection: Any = PrivateAttr()
+
+    def __init__(
+        self,
+        mongodb_client: Any,
+        async_mongodb_client: Any,
+        db_name: str,
+        collection_name: str,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(
+            mongodb_client=mongodb_client,
+            db_name=db_name,
+            collection_name=collection_name,
+            **kwargs,
+        )
+        self._async_collection = async_mongodb_client[db_name][collection_name]
+
+    def build_pipeline(self, query: VectorStoreQuery) -> List[Dict[str, Any]]:
+        """Build the $vectorSearch aggregation of a query."""
+        params: Dict[str, Any] = {
+            "queryVector": query.query_embedding,
+            "path": self._embedding_key,
+            "numCandidates": query.similarity_top_k * 10,
+            "limit": query.similarity_top_k,
+            "index": self._index_name,
+        }
+        if query.filters:
+            params["filter"] = self.build_filter(query.filters)
+
+        return [
+            {"$vectorSearch": params},
+            {
+                "$project": {
+                    "score": {"$meta": "vectorSearchScore"},
+                    self._embedding_key: 0,
+                }
+            },
+        ]
+
+    def build_filter(self, filters: MetadataFilters) -> Dict[str, Any]:
+        """Convert metadata filters to a `$vectorSearch` pre-filter."""
+        conditions = []
+        # an "or" of equalities on one field becomes a single $in
+        values_by_path: Dict[str, List[Any]] = {}
+        for metadata_filter in filters.filters:
+            if isinstance(metadata_filter, MetadataFilters):
+                conditions.append(self.build_filter(metadata_filter))
+                continue
+            if metadata_filter.operator not in MONGO_OPERATORS:
+                raise ValueError(
+                    f"Unsupported operator {metadata_filter.operator} in a vector search"
+                )
+
+            path = f"{self._metadata_key}.{metadata_filter.key}"
+            if (
+                filters.condition == FilterCondition.OR
+                and metadata_filter.operator == FilterOperator.EQ
+            ):
+                values_by_path.setdefault(path, []).append(metadata_filter.value)
+            else:
+                operator = MONGO_OPERATORS[metadata_filter.operator]
+                conditions.append({path: {operator: metadata_filter.value}})
+
+        for path, values in values_by_path.items():
+            conditions.append({path: {"$in": values}})
+
+        if len(conditions) == 1:
+            return conditions[0]
+        if filters.condition == FilterCondition.OR:
+            return {"$or": conditions}
+        return {"$and": conditions}
+
+    def parse_results(self, results: List[dict]) -> VectorStoreQueryResult:
+        """Turn the documents returned by the pipeline into nodes."""
+        top_k_nodes = []
+        top_k_ids = []
+        top_k_scores = []
+        for res in results:
+            text = res.pop(self._text_key)
+            score = res.pop("score")
+            id = res.pop(self._id_key)
+            metadata_dict = res.pop(self._metadata_key)
+
+            try:
+                node = metadata_dict_to_node(metadata_dict)
+                node.set_content(text)
+            except Exception:
+                # documents written by older llama-index versions
+                metadata, node_info, relationships = legacy_metadata_dict_to_node(
+                    metadata_dict
+                )
+                node = TextNode(
+                    text=text,
+                    id_=id,
+                    metadata=metadata,
+                    start_char_idx=node_info.get("start", None),
+                    end_char_idx=node_info.get("end", None),
+                    relationships=relationships,
+                )
+
+            top_k_ids.append(id)
+            top_k_nodes.append(node)
+            top_k_scores.append(score)
+
+        return VectorStoreQueryResult(
+            nodes=top_k_nodes, similarities=top_k_scores, ids=top_k_ids
+        )
+
+    def delete_nodes(self, node_ids: List[str], batch_size: int = None) -> None:
+        """Delete the vectors of nodes, in batches of ids."""
+        batch_size = batch_size or config.DELETE_BATCH_SIZE
+        for start in range(0, len(node_ids), batch_size):
+            batch = node_ids[start : start + batch_size]
+            self._collection.delete_many({self._id_key: {"$in": batch}})
+
+    def _query(self, query: VectorStoreQuery) -> VectorStoreQueryResult:
+        results = self._collection.aggregate(self.build_pipeline(query))
+        return self.parse_results(list(results))
+
+    async def aquery(
+        self, query: VectorStoreQuery, **kwargs: Any
+    ) -> VectorStoreQueryResult:
+        """Query the index for the top k most similar nodes without blocking."""
+        cursor = self._async_collection.aggregate(self.build_pipeline(query))
+        return self.parse_results(await cursor.to_list(length=None))
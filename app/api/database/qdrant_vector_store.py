@@ -0,0 +1,139 @@
+"""Qdrant vector store tuned for the index."""
+
+from typing import Any, Dict, List, Optional
+
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.vector_stores.types import (
+    FilterCondition,
+    FilterOperator,
+    MetadataFilters,
+    VectorStoreQuery,
+    VectorStoreQueryResult,
+)
+from llama_index.vector_stores.qdrant import QdrantVectorStore
+from qdrant_client.http import models
+
+from app.core.config import config
+from app.logger.logger import custom_logger
+
+# payload fields filtered on, see `DocsExecute` for their Mongo counterparts
+PAYLOAD_INDEXES = ("source", "doc_id")
+
+
+class QdrantStore(QdrantVectorStore):
+    """
+    `QdrantVectorStore` that creates its collection with HNSW, quantization and
+    payload index settings, and deletes vectors by node id.
+
+    The collection only holds nodes of the index, so queries are not restricted to
+    the node ids of the index struct, which would send every id with every search.
+    """
+
+    _hnsw_config: Optional[models.HnswConfigDiff] = PrivateAttr()
+    _quantization_config: Optional[Any] = PrivateAttr()
+
+    def __init__(
+        self,
+        collection_name: str,
+        hnsw_config: Optional[models.HnswConfigDiff] = None,
+        quantization_config: Optional[Any] = None,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(collection_name=collection_name, **kwargs)
+        self._hnsw_config = hnsw_config
+        self._quantization_config = quantization_config
+
+    def _create_collection(self, collection_name: str, vector_size: int) -> None:
+        """Create the collection and the payload indexes of filtered fields."""
+        if not self._collection_exists(collection_name):
+            custom_logger.info(f"Creating collection {collection_name} in Qdrant DB")
+            self._client.create_collection(
+                collection_name=collection_name,
+                vectors_config=models.VectorParams(
+                    size=vector_size,
+                    distance=models.Distance.COSINE,
+                    on_disk=config.QDRANT_ON_DISK,
+                ),
+                hnsw_config=self._hnsw_config,
+                quantization_config=self._quantization_config,
+            )
+
+        for field_name in PAYLOAD_INDEXES:
+            self._client.create_payload_index(
+                collection_name=collection_name,
+                field_name=field_name,
+                field_schema=models.PayloadSchemaType.KEYWORD,
+            )
+        self._collection_initialized = True
+
+    def delete_nodes(self, node_ids: List[str], batch_size: int = None) -> None:
+        """Delete the vectors of nodes, in batches of ids."""
+        if not self._collection_initialized:
+            return
+
+        batch_size = batch_size or config.DELETE_BATCH_SIZE
+        for start in range(0, len(node_ids), batch_size):
+            self._client.delete(
+                collection_name=self.collection_name,
+                points_selector=models.PointIdsList(
+                    points=node_ids[start : start + batch_size]
+                ),
+            )
+
+    def _build_query_filter(self, query: VectorStoreQuery) -> Optional[models.Filter]:
+        """
+        Convert metadata filters to a payload filter, applied during the search.
+
+        The base class only handles "and" of filters, and drops them for queries
+        without a query string.
+        """
+        if query.filters is None:
+            return None
+
+        return self.build_filter(query.filters)
+
+    def build_filter(self, filters: MetadataFilters) -> models.Filter:
+        conditions = []
+        # an "or" of equalities on one field becomes a single MatchAny
+        values_by_key: Dict[str, List[Any]] = {}
+        for metadata_filter in filters.filters:
+            if isinstance(metadata_filter, MetadataFilters):
+                conditions.append(self.build_filter(metadata_filter))
+            elif metadata_filter.operator != FilterOperator.EQ:
+                raise ValueError(
+                    f"Unsupported operator {metadata_filter.operator} in a Qdrant query"
+                )
+            elif filters.condition == FilterCondition.OR:
+                values_by_key.setdefault(metadata_filter.key, []).append(
+                    metadata_filter.value
+                )
+            else:
+                conditions.append(
+                    models.FieldCondition(
+                        key=metadata_filter.key,
+                        match=models.MatchValue(value=metadata_filter.value),
+                    )
+                )
+
+        for key, values in values_by_key.items():
+            conditions.append(
+                models.FieldCondition(key=key, match=models.MatchAny(any=values))
+            )
+
+        if filters.condition == FilterCondition.OR:
+            return models.Filter(should=conditions)
+        return models.Filter(must=conditions)
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        query.node_ids = None
+        return super().query(query, **kwargs)
+
+    async def aquery(
+        self, query: VectorStoreQuery, **kwargs: Any
+    ) -> VectorStoreQueryResult:
+        if self._aclient is None:
+            # local mode has no async client
+            return self.query(query, **kwargs)
+
+        query.node_ids = None
+        return await super().aquery(query, **kwargs)
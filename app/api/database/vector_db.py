@@ -1,45 +1,116 @@
-"""Vector database client."""
+"""
+Vector database backends.
 
-from qdrant_client import QdrantClient
-from qdrant_client.http import models
-from qdrant_client.http.models import CollectionDescription
+Backend clients are imported and created when the vector store is, so the
+backends that are not used are never imported.
+"""
 
+from typing import TYPE_CHECKING, List, Optional
+
+from llama_index.core.vector_stores.types import (
+    FilterCondition,
+    MetadataFilter,
+    MetadataFilters,
+    VectorStore,
+)
+
+from app.api.errors.error_message import UnsupportedVectorStoreError
 from app.core.config import config
 from app.logger.logger import custom_logger
 
-custom_logger.info("Initializing vector database client")
-vector_db_client = QdrantClient(
-    url=config.QDRANT_URL,
-    api_key=config.QDRANT_API_KEY,
-)
+if TYPE_CHECKING:
+    from qdrant_client import AsyncQdrantClient, QdrantClient
+
+    from app.api.database.qdrant_vector_store import QdrantStore
+
+VECTOR_STORE_BACKENDS = ("mongo", "qdrant", "local")
 
 
-def get_or_create_collection(collection_name: str):
+def get_source_filters(sources: Optional[List[str]]) -> Optional[MetadataFilters]:
     """
-    The function `get_or_create_collection` checks if a collection with a given name exists in a Qdrant
-    DB, and if not, creates it.
-
-    :param collection_name: The `collection_name` parameter is a string that represents the name of the
-    collection you want to get or create in the Qdrant DB
-    :type collection_name: str
-    :return: The function `get_or_create_collection` returns the name of the collection, which is
-    `collection_name`.
+    Build the filters restricting a vector query to some sources, None for all.
+
+    Filter values cannot be lists, so several sources are an "or" of equalities,
+    which the vector stores turn into a single "in" condition.
     """
-    collection_description = CollectionDescription(name=collection_name)
-    list_of_collections = vector_db_client.get_collections().collections
+    if not sources:
+        return None
+
+    return MetadataFilters(
+        filters=[MetadataFilter(key="source", value=source) for source in sources],
+        condition=FilterCondition.OR,
+    )
 
-    if collection_description in list_of_collections:
-        custom_logger.info(
-            f"Found collection {collection_name} in Qdrant DB, skipping creation and using it."
+
+def get_qdrant_quantization_config():
+    """Get the quantization of the Qdrant collection, None to keep full vectors."""
+    from qdrant_client.http import models
+
+    if config.QDRANT_QUANTIZATION == "scalar":
+        return models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(
+                type=models.ScalarType.INT8, quantile=0.99, always_ram=True
+            )
+        )
+    if config.QDRANT_QUANTIZATION == "binary":
+        return models.BinaryQuantization(
+            binary=models.BinaryQuantizationConfig(always_ram=True)
         )
-        return collection_name
 
-    custom_logger.info(f"Creating collection {collection_name} in Qdrant DB")
-    vector_db_client.create_collection(
-        collection_name=collection_name,
-        vectors_config=models.VectorParams(size=1536, distance=models.Distance.COSINE),
+    return None
+
+
+def create_qdrant_vector_store(
+    client: "QdrantClient" = None, aclient: "AsyncQdrantClient" = None
+) -> "QdrantStore":
+    """
+    Create the Qdrant vector store.
+
+    Without clients, connects to QDRANT_URL, or runs Qdrant in local mode at
+    QDRANT_PATH (":memory:" keeps it in memory).
+    """
+    from qdrant_client import AsyncQdrantClient, QdrantClient
+    from qdrant_client.http import models
+
+    from app.api.database.qdrant_vector_store import QdrantStore
+
+    if client is None:
+        if config.QDRANT_URL:
+            client = QdrantClient(url=config.QDRANT_URL, api_key=config.QDRANT_API_KEY)
+            aclient = AsyncQdrantClient(
+                url=config.QDRANT_URL, api_key=config.QDRANT_API_KEY
+            )
+        else:
+            # local mode has no async client sharing the same data
+            client = QdrantClient(location=config.QDRANT_PATH)
+
+    return QdrantStore(
+        collection_name=config.COLLECTION_NAME,
+        client=client,
+        aclient=aclient,
+        batch_size=config.QDRANT_BATCH_SIZE,
+        hnsw_config=models.HnswConfigDiff(
+            m=config.QDRANT_HNSW_M, ef_construct=config.QDRANT_HNSW_EF_CONSTRUCT
+        ),
+        quantization_config=get_qdrant_quantization_config(),
     )
-    return collection_name
 
 
-get_or_create_collection(config.COLLECTION_NAME)
+def get_vector_store(backend: str = None) -> VectorStore:
+    """Get the vector store of a backend, VECTOR_STORE_BACKEND by default."""
+    backend = backend or config.VECTOR_STORE_BACKEND
+    custom_logger.info(f"Using the {backend} vector store")
+
+    if backend == "mongo":
+        # imported here, so the other backends run without a database
+        from app.api.database.mongo_db import get_mongo_vector_store
+
+        return get_mongo_vector_store()
+    if backend == "qdrant":
+        return create_qdrant_vector_store()
+    if backend == "local":
+        from app.api.database.local_vector_store import LocalVectorStore
+
+        return LocalVectorStore(config.LOCAL_VECTOR_STORE_PATH)
+
+    raise ValueError(UnsupportedVectorStoreError(backend))
@@ -26,6 +26,26 @@ class FileExistsError(BaseErrorMessage):
     message = "File already exists"
 
 
+class SourceExistsError(BaseErrorMessage):
+    status_code = 400
+    message = "Source already ingested: {}, pass upsert=true to replace it"
+
+
+class SourceBusyError(BaseErrorMessage):
+    status_code = 409
+    message = "Source is being ingested by another job: {}"
+
+
+class UnsupportedVectorStoreError(BaseErrorMessage):
+    status_code = 500
+    message = "Vector store backend {} is not supported, use mongo, qdrant or local."
+
+
+class SourceNotFoundError(BaseErrorMessage):
+    status_code = 404
+    message = "Source not found: {}"
+
+
 class SessionNotFoundError(BaseErrorMessage):
     status_code = 404
     message = "Chat session not found"
@@ -0,0 +1,235 @@
+"""Answer cache module."""
+
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+from app.core.config import config
+
+
+class CachedAnswer:
+    """
+    An answer, the query it was given for, the retrieval mode of its context and
+    the sources it was built from.
+    """
+
+    def __init__(
+        self,
+        query: str,
+        answer: str,
+        sources: Iterable[str],
+        seconds: float,
+        ttl_seconds: Optional[float],
+        retrieval_mode: str,
+    ) -> None:
+        self.id = uuid.uuid4().hex
+        self.query = query
+        self.answer = answer
+        self.retrieval_mode = retrieval_mode
+        self.sources = set(sources)
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + ttl_seconds if ttl_seconds else None
+
+
+class AnswerCache:
+    """
+    Semantic cache of chat answers.
+
+    A query is answered from the cache when the embedding of an earlier query with
+    the same retrieval mode is at least `similarity_threshold` cosine-similar to
+    its own. Entries are dropped when one of the sources they were built from is
+    ingested again or deleted, and the least recently used ones are evicted past
+    `max_size`.
+    """
+
+    def __init__(
+        self,
+        max_size: int = None,
+        ttl_seconds: int = None,
+        similarity_threshold: float = None,
+        enabled: bool = None,
+    ) -> None:
+        self.enabled = config.ANSWER_CACHE_ENABLED if enabled is None else enabled
+        self.max_size = max_size or config.ANSWER_CACHE_MAX_SIZE
+        self.ttl_seconds = ttl_seconds or config.ANSWER_CACHE_TTL
+        self.similarity_threshold = (
+            similarity_threshold or config.ANSWER_CACHE_SIMILARITY_THRESHOLD
+        )
+        self._entries: "OrderedDict[str, CachedAnswer]" = OrderedDict()
+        self._embeddings: Dict[str, np.ndarray] = {}
+        # stacked embeddings of `_entries`, rebuilt on the first lookup after a write
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_ids: List[str] = []
+        self._matrix_modes: Optional[np.ndarray] = None
+        # bumped by every invalidation, see `is_stale`
+        self.version = 0
+        self._source_versions: Dict[str, int] = {}
+        # version of the last `invalidate_all`
+        self._all_version = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidated = 0
+        self.seconds_saved = 0.0
+
+    @staticmethod
+    def normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _drop(self, entry_id: str) -> None:
+        self._entries.pop(entry_id, None)
+        self._embeddings.pop(entry_id, None)
+        self._matrix = None
+
+    def lookup(
+        self, query_embedding: List[float], retrieval_mode: str
+    ) -> Optional[CachedAnswer]:
+        """
+        Get the cached answer of the most similar earlier query retrieved the same
+        way, if close enough.
+        """
+        vector = self.normalize(query_embedding)
+        with self._lock:
+            now = time.monotonic()
+            for entry_id in [
+                entry.id
+                for entry in self._entries.values()
+                if entry.expires_at is not None and entry.expires_at < now
+            ]:
+                self._drop(entry_id)
+
+            entry = None
+            if self._entries:
+                if self._matrix is None:
+                    self._matrix_ids = list(self._embeddings)
+                    self._matrix = np.stack(list(self._embeddings.values()))
+                    self._matrix_modes = np.array(
+                        [
+                            self._entries[entry_id].retrieval_mode
+                            for entry_id in self._matrix_ids
+                        ]
+                    )
+                similarities = self._matrix @ vector
+                # answers built from another retrieval never match
+                similarities[self._matrix_modes != retrieval_mode] = -np.inf
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.similarity_threshold:
+                    entry = self._entries[self._matrix_ids[best]]
+                    self._entries.move_to_end(entry.id)
+
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+            return entry
+
+    def add(
+        self,
+        query: str,
+        query_embedding: List[float],
+        answer: str,
+        sources: Iterable[str],
+        seconds: float,
+        version: int,
+        retrieval_mode: str,
+    ) -> Optional[CachedAnswer]:
+        """
+        Cache an answer that took `seconds` to produce.
+
+        `version` is the cache version read before the answer was retrieved; the
+        answer is not cached if one of its sources was invalidated since then.
+        """
+        entry = CachedAnswer(
+            query, answer, sources, seconds, self.ttl_seconds, retrieval_mode
+        )
+        if not entry.sources:
+            # nothing was retrieved, a later ingest could give a better answer
+            return None
+
+        with self._lock:
+            if self.is_stale(entry, version):
+                return None
+
+            self._entries[entry.id] = entry
+            self._embeddings[entry.id] = self.normalize(query_embedding)
+            self._matrix = None
+            while len(self._entries) > self.max_size:
+                self._drop(next(iter(self._entries)))
+
+        return entry
+
+    def is_stale(self, entry: CachedAnswer, version: int) -> bool:
+        return self._all_version > version or any(
+            self._source_versions.get(source, 0) > version for source in entry.sources
+        )
+
+    def record_saved(self, entry: CachedAnswer, seconds: float) -> None:
+        """Record that a hit was served in `seconds` instead of `entry.seconds`."""
+        with self._lock:
+            self.seconds_saved += max(entry.seconds - seconds, 0.0)
+
+    def invalidate_sources(self, sources: Iterable[str]) -> int:
+        """Drop every answer built from one of the sources."""
+        sources = set(sources)
+        if not sources:
+            return 0
+
+        with self._lock:
+            self.version += 1
+            for source in sources:
+                self._source_versions[source] = self.version
+
+            entry_ids = [
+                entry.id for entry in self._entries.values() if entry.sources & sources
+            ]
+            for entry_id in entry_ids:
+                self._drop(entry_id)
+            self.invalidated += len(entry_ids)
+
+        return len(entry_ids)
+
+    def invalidate_all(self) -> int:
+        """Drop every answer, when the changed sources are not known."""
+        with self._lock:
+            self.version += 1
+            self._all_version = self.version
+            invalidated = len(self._entries)
+            self._entries.clear()
+            self._embeddings.clear()
+            self._matrix = None
+            self.invalidated += invalidated
+
+        return invalidated
+
+    def clear(self) -> None:
+        """Drop every cached answer."""
+        with self._lock:
+            self._entries.clear()
+            self._embeddings.clear()
+            self._matrix = None
+
+    @staticmethod
+    def replay(answer: str) -> Iterator[str]:
+        """Split a cached answer into tokens, to stream it like a generated one."""
+        yield from re.findall(r"\s*\S+\s*", answer) or [answer]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters and the generation time saved by hits."""
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "seconds_saved": self.seconds_saved,
+            "invalidated": self.invalidated,
+            "size": len(self._entries),
+        }
@@ -0,0 +1,248 @@
+"""Context assembler module."""
+
+import re
+import threading
+from typing import Callable, Dict, List, Optional
+
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+from llama_index.core.postprocessor.types import BaseNodePostprocessor
+from llama_index.core.schema import MetadataMode, NodeWithScore, QueryBundle, TextNode
+
+from app.api.helpers.keyword_index import tokenize
+from app.api.helpers.tokenizer import TOKEN_COUNT_KEY, tokenizer
+from app.core.config import config
+
+SENTENCE_PATTERN = re.compile(r"(?<=[.!?])\s+")
+# chunks of a document this many characters apart are merged as neighbours
+NEIGHBOUR_GAP = 2
+# a passage is not cut to fewer tokens than this, it is dropped instead
+MIN_PASSAGE_TOKENS = 32
+
+
+class ContextAssembler(BaseNodePostprocessor):
+    """
+    Pack retrieved chunks into a context of at most `token_budget` tokens.
+
+    Chunks of the same document are sorted by position; overlapping and adjacent
+    ones are merged into one passage, so the 200-token overlaps of the splitter are
+    sent once. Passages are then added by relevance (the best score of their
+    chunks) while they fit, the first one that does not fit being cut at a
+    sentence boundary. With `compress`, sentences sharing no word with the query
+    and not next to one that does are dropped from every passage first.
+
+    Chunks are counted from the token count stored with them when they have one.
+    """
+
+    token_budget: int = Field(default_factory=lambda: config.CONTEXT_TOKEN_BUDGET)
+    compress: bool = Field(default_factory=lambda: config.CONTEXT_COMPRESSION)
+
+    _count: Callable[[str], int] = PrivateAttr()
+    _lock: threading.Lock = PrivateAttr()
+    _stats: Dict[str, int] = PrivateAttr()
+
+    def __init__(self, count: Optional[Callable[[str], int]] = None, **kwargs):
+        super().__init__(**kwargs)
+        self._count = count or tokenizer.count
+        self._lock = threading.Lock()
+        self._stats = {
+            "requests": 0,
+            "chunks": 0,
+            "passages": 0,
+            "tokens_in": 0,
+            "tokens_out": 0,
+        }
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "ContextAssembler"
+
+    def count_tokens(self, node: NodeWithScore) -> int:
+        text_tokens = node.node.metadata.get(TOKEN_COUNT_KEY)
+        if text_tokens is None:
+            return self._count(node.node.get_content(metadata_mode=MetadataMode.LLM))
+
+        header = node.node.get_metadata_str(mode=MetadataMode.LLM)
+        # the header is separated from the text by a blank line, one token
+        return text_tokens + (self._count(header) + 1 if header else 0)
+
+    @staticmethod
+    def with_text(passage: NodeWithScore, text: str) -> NodeWithScore:
+        """Copy a passage with another text, dropping the token count of the old one."""
+        metadata = {
+            key: value
+            for key, value in passage.node.metadata.items()
+            if key != TOKEN_COUNT_KEY
+        }
+        return NodeWithScore(
+            node=passage.node.copy(update={"text": text, "metadata": metadata}),
+            score=passage.score,
+        )
+
+    def _postprocess_nodes(
+        self,
+        nodes: List[NodeWithScore],
+        query_bundle: Optional[QueryBundle] = None,
+    ) -> List[NodeWithScore]:
+        if not nodes:
+            return nodes
+
+        passages = self.merge_neighbours(nodes)
+        if self.compress and query_bundle is not None:
+            passages = [
+                self.drop_sentences(p, query_bundle.query_str) for p in passages
+            ]
+        packed = self.pack(passages)
+
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["chunks"] += len(nodes)
+            self._stats["passages"] += len(packed)
+            self._stats["tokens_in"] += sum(map(self.count_tokens, nodes))
+            self._stats["tokens_out"] += sum(map(self.count_tokens, packed))
+
+        return packed
+
+    def merge_neighbours(self, nodes: List[NodeWithScore]) -> List[NodeWithScore]:
+        """Merge overlapping and adjacent chunks of the same document."""
+        groups: Dict[str, List[NodeWithScore]] = {}
+        passages = []
+        for node in nodes:
+            if node.node.start_char_idx is None or node.node.end_char_idx is None:
+                passages.append(node)
+                continue
+            key = node.node.ref_doc_id or node.node.metadata.get("doc_id")
+            groups.setdefault(key, []).append(node)
+
+        for group in groups.values():
+            group.sort(key=lambda node: node.node.start_char_idx)
+            current = [group[0]]
+            for node in group[1:]:
+                if node.node.start_char_idx <= (
+                    max(n.node.end_char_idx for n in current) + NEIGHBOUR_GAP
+                ):
+                    current.append(node)
+                else:
+                    passages.append(self.join(current))
+                    current = [node]
+            passages.append(self.join(current))
+
+        return passages
+
+    @staticmethod
+    def join(chunks: List[NodeWithScore]) -> NodeWithScore:
+        """Join chunks sorted by position, keeping each character once."""
+        if len(chunks) == 1:
+            return chunks[0]
+
+        first = chunks[0].node
+        text = first.get_content(metadata_mode=MetadataMode.NONE)
+        end = first.end_char_idx
+        for chunk in chunks[1:]:
+            node = chunk.node
+            if node.end_char_idx <= end:
+                continue
+            chunk_text = node.get_content(metadata_mode=MetadataMode.NONE)
+            if node.start_char_idx >= end:
+                text += " " + chunk_text
+            else:
+                text += chunk_text[end - node.start_char_idx :]
+            end = node.end_char_idx
+
+        passage = TextNode(
+            id_=first.node_id,
+            text=text,
+            metadata={
+                key: value
+                for key, value in first.metadata.items()
+                if key != TOKEN_COUNT_KEY
+            },
+            excluded_embed_metadata_keys=first.excluded_embed_metadata_keys,
+            excluded_llm_metadata_keys=first.excluded_llm_metadata_keys,
+            relationships=first.relationships,
+            start_char_idx=first.start_char_idx,
+            end_char_idx=end,
+        )
+        return NodeWithScore(
+            node=passage, score=max(chunk.score or 0.0 for chunk in chunks)
+        )
+
+    @staticmethod
+    def drop_sentences(passage: NodeWithScore, query: str) -> NodeWithScore:
+        """
+        Keep the sentences sharing a word with the query and their neighbours.
+
+        Passages with no such sentence matched the query by meaning and are kept.
+        """
+        terms = set(tokenize(query))
+        sentences = SENTENCE_PATTERN.split(
+            passage.node.get_content(metadata_mode=MetadataMode.NONE)
+        )
+        matching = [i for i, s in enumerate(sentences) if terms & set(tokenize(s))]
+        if not matching:
+            return passage
+
+        kept = sorted(
+            {
+                position
+                for i in matching
+                for position in (i - 1, i, i + 1)
+                if 0 <= position < len(sentences)
+            }
+        )
+        if len(kept) == len(sentences):
+            return passage
+
+        text = " ".join(
+            ("... " if i > 0 and i - 1 not in kept else "") + sentences[i] for i in kept
+        )
+        return ContextAssembler.with_text(passage, text)
+
+    def pack(self, passages: List[NodeWithScore]) -> List[NodeWithScore]:
+        """Add passages by relevance while they fit in the token budget."""
+        remaining = self.token_budget
+        packed = []
+        for passage in sorted(passages, key=lambda p: -(p.score or 0.0)):
+            tokens = self.count_tokens(passage)
+            if tokens <= remaining:
+                packed.append(passage)
+                remaining -= tokens
+            elif remaining >= MIN_PASSAGE_TOKENS:
+                cut = self.cut(passage, remaining, tokens)
+                if cut is not None:
+                    packed.append(cut)
+                    remaining -= self.count_tokens(cut)
+
+        return packed
+
+    def cut(
+        self, passage: NodeWithScore, budget: int, tokens: int
+    ) -> Optional[NodeWithScore]:
+        """Cut a passage to its first sentences fitting in `budget` tokens."""
+        text = passage.node.get_content(metadata_mode=MetadataMode.NONE)
+        # tokens of the metadata header
+        budget -= tokens - self._count(text)
+        kept = []
+        for sentence in SENTENCE_PATTERN.split(text):
+            # +1 for the joining space
+            sentence_tokens = self._count(sentence) + 1
+            if sentence_tokens > budget:
+                break
+            kept.append(sentence)
+            budget -= sentence_tokens
+
+        if not kept:
+            return None
+
+        return self.with_text(passage, " ".join(kept))
+
+    def get_stats(self) -> dict:
+        """Get tokens of the retrieved chunks and of the packed contexts."""
+        with self._lock:
+            stats = dict(self._stats)
+
+        stats["token_budget"] = self.token_budget
+        stats["compress"] = self.compress
+        stats["saved_ratio"] = (
+            1 - stats["tokens_out"] / stats["tokens_in"] if stats["tokens_in"] else 0.0
+        )
+        return stats
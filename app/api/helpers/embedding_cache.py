@@ -0,0 +1,257 @@
+"""Embedding cache module."""
+
+import asyncio
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional
+
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding, Embedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+
+from app.api.database.execute.embedding_cache_execute import EmbeddingCacheExecute
+from app.core.config import config
+from app.logger.logger import custom_logger
+
+embedding_cache_execute = EmbeddingCacheExecute()
+
+
+class TTLLRUCache:
+    """Thread-safe in-memory LRU cache whose entries also expire after a TTL."""
+
+    def __init__(self, max_size: int, ttl_seconds: Optional[float] = None) -> None:
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Any:
+        """Get a value, or None if it is missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Set a value, evicting the least recently used entries when full."""
+        expires_at = (
+            time.monotonic() + self.ttl_seconds if self.ttl_seconds else None
+        )
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def pop(self, key: Hashable) -> Any:
+        """Remove a value and return it."""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            return entry[0] if entry else None
+
+    def clear(self) -> None:
+        """Remove every entry."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding cache.
+
+    Entries are keyed by model name plus a hash of the embedded text, kept in an
+    in-memory LRU tier and, optionally, in the `embedding_cache/data` Mongo collection.
+    The memory tier holds float32 arrays, a quarter of the size of lists of floats.
+    """
+
+    def __init__(
+        self,
+        max_size: int = None,
+        ttl_seconds: int = None,
+        persistent: bool = None,
+        memory_ttl_seconds: int = None,
+    ) -> None:
+        self.ttl_seconds = ttl_seconds or config.EMBEDDING_CACHE_TTL
+        self.persistent = (
+            config.EMBEDDING_CACHE_PERSISTENT if persistent is None else persistent
+        )
+        self.memory = TTLLRUCache(
+            max_size=max_size or config.EMBEDDING_CACHE_MAX_SIZE,
+            ttl_seconds=memory_ttl_seconds or self.ttl_seconds,
+        )
+        self.hits = 0
+        self.misses = 0
+        self.persistent_hits = 0
+        self._lock = threading.Lock()
+
+        if self.persistent:
+            embedding_cache_execute.create_indexes(self.ttl_seconds)
+
+    @staticmethod
+    def make_key(model_name: str, text: str) -> str:
+        """Build the cache key for a text embedded by a model."""
+        text_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{model_name}:{text_hash}"
+
+    def get_many(self, model_name: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """Get cached embeddings, None for every text that is not cached."""
+        keys = [self.make_key(model_name, text) for text in texts]
+        embeddings = []
+        for key in keys:
+            vector = self.memory.get(key)
+            embeddings.append(vector.tolist() if vector is not None else None)
+
+        missing_keys = [key for key, embedding in zip(keys, embeddings) if embedding is None]
+        persistent_found: Dict[str, List[float]] = {}
+        if self.persistent and missing_keys:
+            try:
+                persistent_found = embedding_cache_execute.get_embeddings(missing_keys)
+            except Exception as e:
+                # the cache must never fail a chat or an ingest, every key misses
+                custom_logger.warning(f"Could not read persisted embeddings: {e}")
+            for key, embedding in persistent_found.items():
+                self.memory.set(key, np.asarray(embedding, dtype=np.float32))
+
+        for position, key in enumerate(keys):
+            if embeddings[position] is None:
+                embeddings[position] = persistent_found.get(key)
+
+        hits = sum(embedding is not None for embedding in embeddings)
+        with self._lock:
+            self.hits += hits
+            self.misses += len(texts) - hits
+            self.persistent_hits += len(persistent_found)
+
+        return embeddings
+
+    def set_many(
+        self, model_name: str, texts: List[str], embeddings: List[List[float]]
+    ) -> None:
+        """Store embeddings for texts in every tier."""
+        entries = {
+            self.make_key(model_name, text): embedding
+            for text, embedding in zip(texts, embeddings)
+        }
+        for key, embedding in entries.items():
+            self.memory.set(key, np.asarray(embedding, dtype=np.float32))
+
+        if self.persistent:
+            try:
+                embedding_cache_execute.save_embeddings(model_name, entries)
+            except Exception as e:
+                # the cache must never fail an ingest
+                custom_logger.warning(f"Could not persist embeddings: {e}")
+
+    def clear(self) -> int:
+        """Drop every cached embedding."""
+        self.memory.clear()
+        if self.persistent:
+            return embedding_cache_execute.delete_all()
+        return 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "persistent_hits": self.persistent_hits,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "memory_size": len(self.memory),
+        }
+
+
+class CachedQueryEmbedding(BaseEmbedding):
+    """
+    Embedding model that caches the query embeddings of another one.
+
+    Queries are keyed by model name plus their text with whitespace collapsed, so
+    repeated questions and conversation follow-ups are embedded once. Text
+    embeddings are passed through uncached.
+    """
+
+    _embed_model: BaseEmbedding = PrivateAttr()
+    _cache: EmbeddingCache = PrivateAttr()
+
+    def __init__(
+        self, embed_model: BaseEmbedding, cache: Optional[EmbeddingCache] = None
+    ) -> None:
+        super().__init__(
+            model_name=embed_model.model_name,
+            embed_batch_size=embed_model.embed_batch_size,
+            callback_manager=embed_model.callback_manager,
+        )
+        self._embed_model = embed_model
+        self._cache = cache or EmbeddingCache(
+            max_size=config.QUERY_EMBEDDING_CACHE_MAX_SIZE,
+            memory_ttl_seconds=config.QUERY_EMBEDDING_CACHE_TTL,
+            persistent=config.QUERY_EMBEDDING_CACHE_PERSISTENT,
+        )
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedQueryEmbedding"
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        return re.sub(r"\s+", " ", query).strip()
+
+    def _get_query_embedding(self, query: str) -> Embedding:
+        query = self.normalize(query)
+        (embedding,) = self._cache.get_many(self.model_name, [query])
+        if embedding is None:
+            embedding = self._embed_model._get_query_embedding(query)
+            self._cache.set_many(self.model_name, [query], [embedding])
+
+        return embedding
+
+    async def _aget_query_embedding(self, query: str) -> Embedding:
+        query = self.normalize(query)
+        if self._cache.persistent:
+            # the shared tier is read with the blocking client
+            (embedding,) = await asyncio.to_thread(
+                self._cache.get_many, self.model_name, [query]
+            )
+        else:
+            (embedding,) = self._cache.get_many(self.model_name, [query])
+
+        if embedding is None:
+            embedding = await self._embed_model._aget_query_embedding(query)
+            if self._cache.persistent:
+                await asyncio.to_thread(
+                    self._cache.set_many, self.model_name, [query], [embedding]
+                )
+            else:
+                self._cache.set_many(self.model_name, [query], [embedding])
+
+        return embedding
+
+    def _get_text_embedding(self, text: str) -> Embedding:
+        return self._embed_model._get_text_embedding(text)
+
+    async def _aget_text_embedding(self, text: str) -> Embedding:
+        return await self._embed_model._aget_text_embedding(text)
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        return self._embed_model._get_text_embeddings(texts)
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        return await self._embed_model._aget_text_embeddings(texts)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters of the query embedding cache."""
+        return self._cache.get_stats()
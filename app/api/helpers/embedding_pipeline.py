@@ -0,0 +1,300 @@
+"""Embedding pipeline module."""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+import openai
+from llama_index.core.schema import BaseNode
+
+from app.api.helpers.embedding_cache import EmbeddingCache
+from app.core.config import config
+from app.core.key_pool import KeyPool, key_pool as default_key_pool
+from app.logger.logger import custom_logger
+
+# errors worth sending the same batch again for, after a pause
+TRANSIENT_ERRORS = (openai.APIConnectionError, openai.InternalServerError)
+
+
+class EmbeddingPipeline:
+    """
+    Embed nodes in size-bounded batches, spread over several api keys.
+
+    Each batch is sent with the least-loaded key of the key pool. A batch that gets
+    throttled is retried on another key while the throttled one cools down; one
+    that times out or meets a connection or 5xx error is retried after a backoff.
+    """
+
+    def __init__(
+        self,
+        key_pool: KeyPool = None,
+        model_name: str = None,
+        batch_size: int = None,
+        batch_max_tokens: int = None,
+        max_concurrency: int = None,
+        api_base: str = None,
+        cache: Optional[EmbeddingCache] = None,
+    ) -> None:
+        self.key_pool = key_pool or default_key_pool
+        self.model_name = model_name or config.EMBEDDING_MODEL_NAME
+        self.batch_size = batch_size or config.EMBEDDING_BATCH_SIZE
+        self.batch_max_tokens = batch_max_tokens or config.EMBEDDING_BATCH_MAX_TOKENS
+        self.max_concurrency = max_concurrency or config.EMBEDDING_CONCURRENCY
+        self.max_attempts = config.EMBEDDING_MAX_ATTEMPTS
+        self.retry_backoff = config.EMBEDDING_RETRY_BACKOFF
+        self.cache = cache
+
+        # one client per key, built once and reused for every batch. Retries are
+        # made by `embed_batch` so a throttled batch moves to another key.
+        self.clients: Dict[str, openai.OpenAI] = {
+            key: openai.OpenAI(
+                api_key=key,
+                base_url=api_base,
+                max_retries=0,
+                http_client=self.key_pool.http_client,
+            )
+            for key in self.key_pool.keys
+        }
+        self.aclients: Dict[str, openai.AsyncOpenAI] = {
+            key: openai.AsyncOpenAI(
+                api_key=key,
+                base_url=api_base,
+                max_retries=0,
+                http_client=self.key_pool.async_http_client,
+            )
+            for key in self.key_pool.keys
+        }
+
+    @staticmethod
+    def estimate_tokens(text: str) -> int:
+        """Cheap token estimate (~4 characters per token) used for batch sizing."""
+        return len(text) // 4 + 1
+
+    def make_batches(self, texts: List[str]) -> List[List[int]]:
+        """Group text positions into batches bounded by count and estimated tokens."""
+        batches = []
+        current_batch = []
+        current_tokens = 0
+
+        for position, text in enumerate(texts):
+            tokens = self.estimate_tokens(text)
+            if current_batch and (
+                len(current_batch) >= self.batch_size
+                or current_tokens + tokens > self.batch_max_tokens
+            ):
+                batches.append(current_batch)
+                current_batch = []
+                current_tokens = 0
+
+            current_batch.append(position)
+            current_tokens += tokens
+
+        if current_batch:
+            batches.append(current_batch)
+
+        return batches
+
+    @staticmethod
+    def get_node_texts(nodes: List[BaseNode]) -> List[str]:
+        """Get the text that is embedded for each node."""
+        return [node.get_content(metadata_mode="all") for node in nodes]
+
+    def split_cached(
+        self, texts: List[str]
+    ) -> Tuple[List[Optional[List[float]]], List[str]]:
+        """Get cached embeddings and the unique texts that still need embedding."""
+        if self.cache is None:
+            embeddings = [None] * len(texts)
+        else:
+            embeddings = self.cache.get_many(self.model_name, texts)
+
+        missing_texts = list(
+            dict.fromkeys(
+                text for text, embedding in zip(texts, embeddings) if embedding is None
+            )
+        )
+
+        return embeddings, missing_texts
+
+    def merge_embedded(
+        self,
+        texts: List[str],
+        embeddings: List[Optional[List[float]]],
+        missing_texts: List[str],
+        missing_embeddings: List[List[float]],
+    ) -> List[List[float]]:
+        """Fill the cache misses and store the new embeddings in the cache."""
+        embedded: Dict[str, List[float]] = dict(zip(missing_texts, missing_embeddings))
+        if self.cache is not None and missing_texts:
+            self.cache.set_many(self.model_name, missing_texts, missing_embeddings)
+
+        return [
+            embedding if embedding is not None else embedded[text]
+            for text, embedding in zip(texts, embeddings)
+        ]
+
+    def embed_texts(
+        self,
+        texts: List[str],
+        progress_callback: Optional[Callable[[float], None]] = None,
+    ) -> List[List[float]]:
+        """Embed texts, serving what it can from the cache."""
+        embeddings, missing_texts = self.split_cached(texts)
+        if missing_texts:
+            custom_logger.debug(
+                f"Embedding cache: {len(texts) - len(missing_texts)}/{len(texts)} texts cached"
+            )
+        missing_embeddings = self.embed_uncached(missing_texts, progress_callback)
+
+        return self.merge_embedded(texts, embeddings, missing_texts, missing_embeddings)
+
+    async def aembed_texts(self, texts: List[str]) -> List[List[float]]:
+        """Asynchronously embed texts, serving what it can from the cache."""
+        embeddings, missing_texts = await asyncio.to_thread(self.split_cached, texts)
+        missing_embeddings = await self.aembed_uncached(missing_texts)
+
+        return await asyncio.to_thread(
+            self.merge_embedded, texts, embeddings, missing_texts, missing_embeddings
+        )
+
+    @staticmethod
+    def prepare_inputs(texts: List[str]) -> List[str]:
+        # same normalization as llama-index's OpenAIEmbedding
+        return [text.replace("\n", " ") for text in texts]
+
+    def get_backoff(self, attempt: int) -> float:
+        """Seconds to wait before the attempt after `attempt` failed transiently."""
+        return self.retry_backoff * 2 ** (attempt - 1)
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """Embed one batch with the least-loaded key, moving on when throttled."""
+        tokens = sum(self.estimate_tokens(text) for text in texts)
+        for attempt in range(1, self.max_attempts + 1):
+            key = self.key_pool.acquire(tokens)
+            try:
+                response = self.clients[key].embeddings.create(
+                    input=self.prepare_inputs(texts), model=self.model_name
+                )
+                return [item.embedding for item in response.data]
+
+            except openai.RateLimitError:
+                # the pool already put the key in cooldown from the 429 response
+                if attempt == self.max_attempts:
+                    raise
+                continue
+
+            except TRANSIENT_ERRORS as e:
+                if attempt == self.max_attempts:
+                    raise
+                custom_logger.warning(
+                    f"Embedding batch failed with {e.__class__.__name__}, "
+                    f"retrying (attempt {attempt} of {self.max_attempts})"
+                )
+
+            finally:
+                self.key_pool.release(key)
+
+            time.sleep(self.get_backoff(attempt))
+
+    async def aembed_batch(self, texts: List[str]) -> List[List[float]]:
+        """Asynchronously embed one batch, moving on when throttled."""
+        tokens = sum(self.estimate_tokens(text) for text in texts)
+        for attempt in range(1, self.max_attempts + 1):
+            key = await self.key_pool.aacquire(tokens)
+            try:
+                response = await self.aclients[key].embeddings.create(
+                    input=self.prepare_inputs(texts), model=self.model_name
+                )
+                return [item.embedding for item in response.data]
+
+            except openai.RateLimitError:
+                if attempt == self.max_attempts:
+                    raise
+                continue
+
+            except TRANSIENT_ERRORS as e:
+                if attempt == self.max_attempts:
+                    raise
+                custom_logger.warning(
+                    f"Embedding batch failed with {e.__class__.__name__}, "
+                    f"retrying (attempt {attempt} of {self.max_attempts})"
+                )
+
+            finally:
+                self.key_pool.release(key)
+
+            await asyncio.sleep(self.get_backoff(attempt))
+
+    def embed_uncached(
+        self,
+        texts: List[str],
+        progress_callback: Optional[Callable[[float], None]] = None,
+    ) -> List[List[float]]:
+        """Embed texts with a bounded thread pool, preserving input order."""
+        if not texts:
+            return []
+
+        batches = self.make_batches(texts)
+        embeddings: List[List[float]] = [None] * len(texts)
+        done_batches = []
+
+        def embed_batch(batch: List[int]) -> None:
+            vectors = self.embed_batch([texts[position] for position in batch])
+            for position, vector in zip(batch, vectors):
+                embeddings[position] = vector
+
+            if progress_callback is not None:
+                done_batches.append(batch)
+                progress_callback(len(done_batches) / len(batches))
+
+        custom_logger.debug(
+            f"Embedding {len(texts)} texts in {len(batches)} batches "
+            f"with {len(self.clients)} api keys"
+        )
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            # list() re-raises the first batch error, if any
+            list(executor.map(embed_batch, batches))
+
+        return embeddings
+
+    async def aembed_uncached(self, texts: List[str]) -> List[List[float]]:
+        """Asynchronously embed texts, at most `max_concurrency` batches in flight."""
+        if not texts:
+            return []
+
+        batches = self.make_batches(texts)
+        embeddings: List[List[float]] = [None] * len(texts)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def aembed_batch(batch: List[int]) -> None:
+            async with semaphore:
+                vectors = await self.aembed_batch(
+                    [texts[position] for position in batch]
+                )
+            for position, vector in zip(batch, vectors):
+                embeddings[position] = vector
+
+        await asyncio.gather(*(aembed_batch(batch) for batch in batches))
+
+        return embeddings
+
+    def embed_nodes(
+        self,
+        nodes: List[BaseNode],
+        progress_callback: Optional[Callable[[float], None]] = None,
+    ) -> List[BaseNode]:
+        """Set the embedding of every node."""
+        embeddings = self.embed_texts(self.get_node_texts(nodes), progress_callback)
+        for node, embedding in zip(nodes, embeddings):
+            node.embedding = embedding
+
+        return nodes
+
+    async def aembed_nodes(self, nodes: List[BaseNode]) -> List[BaseNode]:
+        """Asynchronously set the embedding of every node."""
+        embeddings = await self.aembed_texts(self.get_node_texts(nodes))
+        for node, embedding in zip(nodes, embeddings):
+            node.embedding = embedding
+
+        return nodes
@@ -0,0 +1,51 @@
+"""Hybrid retrieval module."""
+
+from typing import List, Tuple
+
+from llama_index.core.schema import BaseNode, NodeWithScore
+
+from app.api.helpers.keyword_index import reciprocal_rank_fusion
+
+
+def fuse_results(
+    vector_nodes: List[NodeWithScore],
+    keyword_hits: List[Tuple[str, float]],
+    keyword_nodes: List[BaseNode],
+    similarity_top_k: int,
+    retrieval_mode: str,
+) -> List[NodeWithScore]:
+    """
+    Merge dense and keyword results into the top k nodes.
+
+    Keyword results keep their BM25 score; hybrid results are ranked by reciprocal
+    rank fusion and scored with it. Keyword hits missing from the docstore, deleted
+    since they were found, are skipped.
+    """
+    nodes_by_id = {node.node.node_id: node.node for node in vector_nodes}
+    nodes_by_id.update({node.node_id: node for node in keyword_nodes})
+
+    if retrieval_mode == "keyword":
+        ranked = keyword_hits
+    else:
+        ranked = reciprocal_rank_fusion(
+            [
+                [node.node.node_id for node in vector_nodes],
+                [node_id for node_id, _ in keyword_hits],
+            ]
+        )
+
+    return [
+        NodeWithScore(node=nodes_by_id[node_id], score=score)
+        for node_id, score in ranked
+        if node_id in nodes_by_id
+    ][:similarity_top_k]
+
+
+def get_missing_node_ids(
+    vector_nodes: List[NodeWithScore], keyword_hits: List[Tuple[str, float]]
+) -> List[str]:
+    """Get the ids of keyword hits the dense results did not bring."""
+    found = {node.node.node_id for node in vector_nodes}
+
+    return [node_id for node_id, _ in keyword_hits if node_id not in found]
+
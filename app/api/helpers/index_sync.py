@@ -0,0 +1,151 @@
+"""Index sync module."""
+
+import os
+import threading
+from typing import Callable, Optional
+
+try:
+    import fcntl
+except ImportError:
+    # no lock file on Windows, where the app runs in one process
+    fcntl = None
+
+from app.api.database.execute.index_version_execute import IndexVersionExecute
+from app.core.config import config
+from app.logger.logger import custom_logger
+
+index_version_execute = IndexVersionExecute()
+
+
+class IndexSync:
+    """
+    Keep the index of a worker process at the version stamped in MongoDB.
+
+    Every worker holds the index struct, and the local vector store and keyword
+    index, in memory. Changes are made inside `with index_sync:`, which is
+    reentrant: the outermost block takes a lock file shared by the workers of the
+    host, loads the changes of other workers first when the stamp moved, and
+    stamps a new version on leaving if `mark_changed` was called. A thread checks
+    the stamp every `interval` seconds and loads what other workers changed.
+    """
+
+    def __init__(
+        self,
+        index_id: str,
+        reload: Callable[[], None],
+        lock_path: str = None,
+        interval: Optional[float] = None,
+    ) -> None:
+        self.index_id = index_id
+        self.reload = reload
+        self.lock_path = lock_path or config.INDEX_LOCK_PATH
+        self.interval = config.INDEX_SYNC_INTERVAL if interval is None else interval
+        # None until the index is loaded
+        self.version: Optional[int] = None
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._changed = False
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.reloads = 0
+        self.published = 0
+
+        os.makedirs(os.path.dirname(self.lock_path) or ".", exist_ok=True)
+        self._lock_file = open(self.lock_path, "a")
+
+    def __enter__(self) -> "IndexSync":
+        self._lock.acquire()
+        self._depth += 1
+        if self._depth == 1:
+            try:
+                if fcntl is not None:
+                    fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+                self.catch_up()
+            except BaseException:
+                self.release()
+                raise
+
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        try:
+            # changes written before an error are published too
+            if self._depth == 1 and self._changed:
+                self.publish()
+        finally:
+            self.release()
+
+    def release(self) -> None:
+        self._depth -= 1
+        if self._depth == 0:
+            self._changed = False
+            if fcntl is not None:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+        self._lock.release()
+
+    def load(self, load: Callable[[], None]) -> None:
+        """Load the index with `load`, noting the version it is at."""
+        with self:
+            self.version = index_version_execute.get_version(self.index_id)
+            load()
+
+    def catch_up(self) -> bool:
+        """Reload the index if another worker changed it, with the lock held."""
+        if self.version is None:
+            return False
+
+        version = index_version_execute.get_version(self.index_id)
+        if version == self.version:
+            return False
+
+        custom_logger.info(
+            f"Loading version {version} of the index, changed by another worker"
+        )
+        self.reload()
+        self.version = version
+        self.reloads += 1
+
+        return True
+
+    def mark_changed(self) -> None:
+        """Stamp a new version when the outermost block is left."""
+        self._changed = True
+
+    def publish(self) -> None:
+        self.version = index_version_execute.bump_version(self.index_id)
+        self.published += 1
+
+    def start(self) -> None:
+        """Check the stamp in the background, unless `interval` is 0."""
+        if self.interval <= 0 or self._thread is not None:
+            return
+
+        self._thread = threading.Thread(target=self.run, name="index-sync", daemon=True)
+        self._thread.start()
+
+    def run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                if index_version_execute.get_version(self.index_id) != self.version:
+                    # entering loads the changes, once the writer holding the lock
+                    # is done
+                    with self:
+                        pass
+            except Exception as e:
+                custom_logger.warning(f"Could not sync the index: {e}")
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
+        self._lock_file.close()
+
+    def get_stats(self) -> dict:
+        """Get the version of the index and how often it was reloaded or stamped."""
+        return {
+            "version": self.version,
+            "reloads": self.reloads,
+            "published": self.published,
+            "interval": self.interval,
+            "pid": os.getpid(),
+        }
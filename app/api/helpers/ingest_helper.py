@@ -1,11 +1,20 @@
 """Ingest helper module."""
 
+import errno
+import hashlib
 import os
 import re
+import shutil
+import uuid
+from typing import BinaryIO, Iterable, Tuple
 from urllib.parse import urlparse
 
+from app.api.errors.error_message import FileExistsError, FileTooLargeError
 from app.core.config import config
 
+# folder of LOCAL_DATA_FOLDER holding the uploads that replace a file once ingested
+STAGING_FOLDER = ".staging"
+
 
 class IngestHelper:
     """Ingest helper class."""
@@ -18,21 +27,102 @@ class IngestHelper:
             and filename.rsplit(".", 1)[1].lower() in config.ALLOWED_EXTENSIONS
         )
 
-    @staticmethod
-    def check_file_size(file_content: bytes):
-        """Check if a file exceeds the maximum allowed size."""
-        return len(file_content) > config.MAX_FILE_SIZE
-
     @staticmethod
     def check_file_exists(file_path: str):
         """Check if a file exists."""
         return os.path.exists(file_path)
 
     @staticmethod
-    def save_to_folder(file_content: bytes, file_path: str):
-        """Save a file to a folder."""
-        with open(file_path, "wb") as f:
-            f.write(file_content)
+    def stream_to_folder(
+        file_obj: BinaryIO, file_path: str, overwrite: bool = True
+    ) -> Tuple[int, str]:
+        """
+        Copy a file object to a folder chunk by chunk.
+
+        The size limit is checked as data is copied and the sha256 of the content is
+        computed on the way, so the file is never held in memory. Without
+        `overwrite`, the file is only created if no other one took its path
+        meanwhile. Returns the size and the hex digest.
+        """
+        partial_path = f"{file_path}.{uuid.uuid4().hex}.part"
+        content_hash = hashlib.sha256()
+        size = 0
+
+        try:
+            with open(partial_path, "wb") as f:
+                while chunk := file_obj.read(config.UPLOAD_CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > config.MAX_FILE_SIZE:
+                        raise ValueError(FileTooLargeError)
+
+                    content_hash.update(chunk)
+                    f.write(chunk)
+
+            if overwrite:
+                os.replace(partial_path, file_path)
+            else:
+                try:
+                    # a link is never made over an existing file
+                    os.link(partial_path, file_path)
+                except OSError as e:
+                    if e.errno != errno.EEXIST:
+                        raise
+                    raise ValueError(FileExistsError)
+
+        finally:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+
+        return size, content_hash.hexdigest()
+
+    @staticmethod
+    def make_staging_path(file_name: str) -> str:
+        """Get a path of its own for an upload that will replace a file."""
+        return os.path.join(
+            config.LOCAL_DATA_FOLDER, STAGING_FOLDER, uuid.uuid4().hex, file_name
+        )
+
+    @staticmethod
+    def is_staged(file_path: str) -> bool:
+        """Check if a file is an upload waiting to replace a file."""
+        staging_folder = os.path.join(config.LOCAL_DATA_FOLDER, STAGING_FOLDER)
+        return os.path.commonpath([staging_folder, file_path]) == staging_folder
+
+    @staticmethod
+    def publish_staged_file(file_path: str) -> str:
+        """Move a staged upload over the file of the same name, returning its path."""
+        published_path = os.path.join(
+            config.LOCAL_DATA_FOLDER, os.path.basename(file_path)
+        )
+        os.replace(file_path, published_path)
+        shutil.rmtree(os.path.dirname(file_path), ignore_errors=True)
+
+        return published_path
+
+    @staticmethod
+    def discard_staged_file(file_path: str) -> None:
+        """Delete a staged upload."""
+        shutil.rmtree(os.path.dirname(file_path), ignore_errors=True)
+
+    @staticmethod
+    def hash_file(file_path: str) -> str:
+        """Get the sha256 of a file, read chunk by chunk."""
+        content_hash = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            while chunk := f.read(config.UPLOAD_CHUNK_SIZE):
+                content_hash.update(chunk)
+
+        return content_hash.hexdigest()
+
+    @staticmethod
+    def hash_texts(texts: Iterable[str]) -> str:
+        """Get the sha256 of texts, in order."""
+        content_hash = hashlib.sha256()
+        for text in texts:
+            content_hash.update(text.encode("utf-8", "surrogatepass"))
+            content_hash.update(b"\0")
+
+        return content_hash.hexdigest()
 
     @staticmethod
     def get_all_files() -> list[str]:
@@ -49,6 +139,11 @@ class IngestHelper:
 
         return False
 
+    @staticmethod
+    def make_doc_id(source: str, position: int) -> str:
+        """Build a stable document id from its source and position in the source."""
+        return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{source}#{position}"))
+
     @staticmethod
     def strip_consecutive_newlines(text: str) -> str:
         """Strip consecutive newlines from a text."""
@@ -0,0 +1,386 @@
+"""Keyword index module."""
+
+import json
+import math
+import os
+import re
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import config
+from app.logger.logger import custom_logger
+
+# words, and identifiers joined by "-", ".", "/" or ":" such as ERR-404 or v1.2.3
+TOKEN_PATTERN = re.compile(r"\w+(?:[-./:]\w+)*")
+SPLIT_PATTERN = re.compile(r"[-./:_]")
+STOP_WORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the "
+    "this to was were will with".split()
+)
+MAX_TOKEN_LENGTH = 64
+POSTING_ARRAYS = (
+    "offsets",
+    "rows",
+    "term_frequencies",
+    "lengths",
+    "alive",
+    "source_codes",
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercase words of a text.
+
+    Compound identifiers are kept whole and also split in parts, so "ERR-404"
+    matches a search for "err-404" as well as one for "404".
+    """
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        if len(token) > MAX_TOKEN_LENGTH:
+            continue
+        parts = SPLIT_PATTERN.split(token)
+        if len(parts) > 1:
+            tokens.append(token)
+            tokens.extend(part for part in parts if part and part not in STOP_WORDS)
+        elif token not in STOP_WORDS:
+            tokens.append(token)
+
+    return tokens
+
+
+class KeywordIndex:
+    """
+    BM25 inverted index over the text of nodes, saved under `path`.
+
+    Postings are stored term by term in flat arrays, like a CSR matrix: the rows
+    and term frequencies of term i are `rows[offsets[i]:offsets[i + 1]]`. Added
+    nodes are merged into the arrays in one pass per batch. Deleted nodes are only
+    flagged, and compacted away when they are the majority; until then they still
+    count in document frequencies. The source of every node is kept as a code, so
+    searches can be restricted to some sources.
+
+    Files: `postings.npz` (the arrays) and `terms.json` (terms, node ids, sources).
+    """
+
+    def __init__(self, path: str = None, k1: float = 1.2, b: float = 0.75) -> None:
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+
+        self._terms: Dict[str, int] = {}
+        self._node_ids: List[str] = []
+        self._row_by_id: Dict[str, int] = {}
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._rows = np.empty(0, dtype=np.int32)
+        self._term_frequencies = np.empty(0, dtype=np.uint16)
+        self._lengths = np.empty(0, dtype=np.int32)
+        self._alive = np.empty(0, dtype=np.bool_)
+        self._source_codes = np.empty(0, dtype=np.int32)
+        self._code_by_source: Dict[Optional[str], int] = {}
+        # BM25 length normalization of every row, recomputed after each change
+        self._norms = np.empty(0, dtype=np.float32)
+
+        if path is not None and os.path.exists(self.file("terms.json")):
+            self.load()
+
+    def file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def __len__(self) -> int:
+        return len(self._row_by_id)
+
+    def __contains__(self, node_id: str) -> bool:
+        return node_id in self._row_by_id
+
+    def load(self) -> None:
+        """Load the saved index, or start empty when its files do not match."""
+        with open(self.file("terms.json")) as file:
+            saved = json.load(file)
+        arrays = np.load(self.file("postings.npz"))
+
+        if (
+            "sources" not in saved
+            or set(POSTING_ARRAYS) - set(arrays.files)
+            or len(arrays["offsets"]) != len(saved["terms"]) + 1
+            or len(arrays["lengths"]) != len(saved["node_ids"])
+        ):
+            custom_logger.warning(
+                f"Keyword index at {self.path} is outdated or corrupt, ignoring it"
+            )
+            return
+
+        self._terms = {term: position for position, term in enumerate(saved["terms"])}
+        self._node_ids = saved["node_ids"]
+        self._code_by_source = {
+            source: code for code, source in enumerate(saved["sources"])
+        }
+        for name in POSTING_ARRAYS:
+            setattr(self, f"_{name}", arrays[name])
+        self._row_by_id = {
+            node_id: row
+            for row, node_id in enumerate(self._node_ids)
+            if self._alive[row]
+        }
+        self.update_norms()
+
+    def reload(self) -> None:
+        """Load the saved index again, after another process changed it."""
+        with self._lock:
+            if self.path is not None and os.path.exists(self.file("terms.json")):
+                self.load()
+
+    def source_code(self, source: Optional[str]) -> int:
+        return self._code_by_source.setdefault(source, len(self._code_by_source))
+
+    def add(self, nodes: Iterable[Tuple[str, str, Optional[str]]]) -> int:
+        """Index `(node_id, text, source)` triples, replacing nodes indexed before."""
+        nodes = list(nodes)
+        if not nodes:
+            return 0
+
+        with self._lock:
+            self.delete_rows(
+                [
+                    self._row_by_id[node_id]
+                    for node_id, _, _ in nodes
+                    if node_id in self._row_by_id
+                ]
+            )
+
+            terms = dict(self._terms)
+            new_terms, new_rows, new_frequencies, lengths = [], [], [], []
+            for row, (_, text, _) in enumerate(nodes, len(self._node_ids)):
+                tokens = tokenize(text)
+                lengths.append(len(tokens))
+                counts: Dict[int, int] = {}
+                for token in tokens:
+                    term = terms.setdefault(token, len(terms))
+                    counts[term] = counts.get(term, 0) + 1
+                new_terms.extend(counts)
+                new_rows.extend([row] * len(counts))
+                new_frequencies.extend(counts.values())
+
+            # the postings of every term, old then new, sorted by term
+            old_terms = np.repeat(
+                np.arange(len(self._terms), dtype=np.int64), np.diff(self._offsets)
+            )
+            all_terms = np.concatenate([old_terms, np.asarray(new_terms, np.int64)])
+            order = np.argsort(all_terms, kind="stable")
+
+            self._rows = np.concatenate(
+                [self._rows, np.asarray(new_rows, dtype=np.int32)]
+            )[order]
+            self._term_frequencies = np.concatenate(
+                [
+                    self._term_frequencies,
+                    np.minimum(new_frequencies, np.iinfo(np.uint16).max).astype(
+                        np.uint16
+                    ),
+                ]
+            )[order]
+            self._offsets = np.searchsorted(
+                all_terms[order], np.arange(len(terms) + 1)
+            ).astype(np.int64)
+            self._terms = terms
+
+            for row, (node_id, _, _) in enumerate(nodes, len(self._node_ids)):
+                self._row_by_id[node_id] = row
+            self._node_ids = self._node_ids + [node_id for node_id, _, _ in nodes]
+            self._source_codes = np.concatenate(
+                [
+                    self._source_codes,
+                    np.asarray(
+                        [self.source_code(source) for _, _, source in nodes],
+                        dtype=np.int32,
+                    ),
+                ]
+            )
+            self._lengths = np.concatenate(
+                [self._lengths, np.asarray(lengths, dtype=np.int32)]
+            )
+            self._alive = np.concatenate([self._alive, np.ones(len(nodes), np.bool_)])
+            self.update_norms()
+            self.persist()
+
+        return len(nodes)
+
+    def delete(self, node_ids: Iterable[str]) -> int:
+        """Remove nodes from the index."""
+        with self._lock:
+            rows = [
+                self._row_by_id[node_id]
+                for node_id in node_ids
+                if node_id in self._row_by_id
+            ]
+            if not rows:
+                return 0
+
+            self.delete_rows(rows)
+            if len(self._row_by_id) < len(self._node_ids) / 2:
+                self.compact()
+            self.update_norms()
+            self.persist()
+
+        return len(rows)
+
+    def delete_rows(self, rows: List[int]) -> None:
+        if not rows:
+            return
+
+        # searches running meanwhile keep their snapshot of the flags
+        self._alive = self._alive.copy()
+        self._alive[rows] = False
+        for row in rows:
+            del self._row_by_id[self._node_ids[row]]
+
+    def compact(self) -> None:
+        """Rewrite the postings without the deleted rows and the terms left unused."""
+        kept_rows = np.flatnonzero(self._alive)
+        new_row = np.full(len(self._node_ids), -1, dtype=np.int64)
+        new_row[kept_rows] = np.arange(len(kept_rows))
+
+        posting_terms = np.repeat(
+            np.arange(len(self._terms), dtype=np.int64), np.diff(self._offsets)
+        )
+        kept = self._alive[self._rows]
+        posting_terms = posting_terms[kept]
+        used_terms = np.unique(posting_terms)
+        new_term = np.full(len(self._terms), -1, dtype=np.int64)
+        new_term[used_terms] = np.arange(len(used_terms))
+
+        self._rows = new_row[self._rows[kept]].astype(np.int32)
+        self._term_frequencies = self._term_frequencies[kept]
+        self._offsets = np.searchsorted(
+            new_term[posting_terms], np.arange(len(used_terms) + 1)
+        ).astype(np.int64)
+        self._terms = {
+            term: int(new_term[position])
+            for term, position in self._terms.items()
+            if new_term[position] >= 0
+        }
+        self._node_ids = [self._node_ids[row] for row in kept_rows]
+        self._row_by_id = {node_id: row for row, node_id in enumerate(self._node_ids)}
+        self._lengths = self._lengths[kept_rows]
+        self._source_codes = self._source_codes[kept_rows]
+        self._alive = np.ones(len(kept_rows), dtype=np.bool_)
+
+    def update_norms(self) -> None:
+        alive_lengths = self._lengths[self._alive]
+        average_length = float(alive_lengths.mean()) if len(alive_lengths) else 1.0
+        self._norms = (
+            self.k1 * (1 - self.b + self.b * self._lengths / max(average_length, 1.0))
+        ).astype(np.float32)
+
+    def clear(self) -> None:
+        """Remove every node."""
+        with self._lock:
+            self.delete(list(self._row_by_id))
+
+    def persist(self) -> None:
+        """Save the index, replacing its files once written."""
+        if self.path is None:
+            return
+
+        with self._lock:
+            os.makedirs(self.path, exist_ok=True)
+            with open(self.file("postings.npz.tmp"), "wb") as file:
+                np.savez(
+                    file, **{name: getattr(self, f"_{name}") for name in POSTING_ARRAYS}
+                )
+            with open(self.file("terms.json.tmp"), "w") as file:
+                json.dump(
+                    {
+                        "terms": list(self._terms),
+                        "node_ids": self._node_ids,
+                        "sources": list(self._code_by_source),
+                    },
+                    file,
+                )
+            os.replace(self.file("postings.npz.tmp"), self.file("postings.npz"))
+            os.replace(self.file("terms.json.tmp"), self.file("terms.json"))
+
+    def search(
+        self, query: str, top_k: int = 5, sources: Optional[List[str]] = None
+    ) -> List[Tuple[str, float]]:
+        """
+        Get the `top_k` nodes with the highest BM25 score, with their scores,
+        among the nodes of `sources` when given.
+        """
+        with self._lock:
+            # every change replaces the arrays, a snapshot stays consistent
+            terms, node_ids = self._terms, self._node_ids
+            offsets, rows = self._offsets, self._rows
+            term_frequencies, norms, alive = (
+                self._term_frequencies,
+                self._norms,
+                self._alive,
+            )
+            source_codes = self._source_codes
+            count = len(self._row_by_id)
+            allowed_codes = None
+            if sources:
+                allowed_codes = [
+                    self._code_by_source[source]
+                    for source in sources
+                    if source in self._code_by_source
+                ]
+
+        if allowed_codes is not None and not allowed_codes:
+            return []
+        term_ids = {terms[token] for token in tokenize(query) if token in terms}
+        if not term_ids or count == 0:
+            return []
+
+        scores = np.zeros(len(node_ids), dtype=np.float32)
+        for term_id in term_ids:
+            start, stop = offsets[term_id], offsets[term_id + 1]
+            # Lucene's BM25 idf, never negative
+            idf = math.log(
+                1 + (len(node_ids) - (stop - start) + 0.5) / (stop - start + 0.5)
+            )
+            term_rows = rows[start:stop]
+            frequencies = term_frequencies[start:stop].astype(np.float32)
+            scores[term_rows] += (
+                idf * frequencies * (self.k1 + 1) / (frequencies + norms[term_rows])
+            )
+        scores[~alive] = 0
+
+        matched = np.flatnonzero(scores)
+        if allowed_codes is not None:
+            matched = matched[np.isin(source_codes[matched], allowed_codes)]
+        if len(matched) > top_k:
+            matched = matched[np.argpartition(-scores[matched], top_k)[:top_k]]
+        matched = matched[np.argsort(-scores[matched], kind="stable")]
+
+        return [(node_ids[row], float(scores[row])) for row in matched]
+
+    def get_stats(self) -> dict:
+        """Get the size of the index."""
+        return {
+            "nodes": len(self._row_by_id),
+            "rows": len(self._node_ids),
+            "terms": len(self._terms),
+            "postings": len(self._rows),
+        }
+
+
+def reciprocal_rank_fusion(
+    rankings: List[List[str]], k: int = None
+) -> List[Tuple[str, float]]:
+    """
+    Merge rankings of node ids by reciprocal rank fusion.
+
+    A node scores the sum of 1 / (k + rank) over the rankings it appears in, so
+    nodes found by several retrievers come first whatever their raw scores.
+    """
+    k = k or config.HYBRID_RRF_K
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, node_id in enumerate(ranking, 1):
+            scores[node_id] = scores.get(node_id, 0.0) + 1 / (k + rank)
+
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,180 @@
+"""
+Document parsing executor.
+
+CPU-bound readers run in a pool of worker processes so parsing does not hold the
+GIL of the API process. Multi-page formats (PDF pages, PPTX slides, EPUB chapters)
+are split into page ranges parsed in parallel and merged back in order.
+
+Everything submitted to the pool must stay importable without the database clients,
+since worker processes are spawned fresh.
+"""
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Type
+
+from llama_index.core.readers.base import BaseReader
+from llama_index.core.schema import Document
+
+from app.core.config import config
+from app.logger.logger import custom_logger
+
+# readers built once per worker process (some load models in __init__)
+_readers: Dict[Type[BaseReader], BaseReader] = {}
+
+
+def _get_reader(reader_cls: Type[BaseReader]) -> BaseReader:
+    if reader_cls not in _readers:
+        _readers[reader_cls] = reader_cls()
+    return _readers[reader_cls]
+
+
+def parse_whole_file(reader_cls: Type[BaseReader], file_path: str) -> List[Document]:
+    """Parse a file with its reader."""
+    return _get_reader(reader_cls).load_data(Path(file_path))
+
+
+def parse_pdf_pages(file_path: str, start: int, end: int) -> List[Document]:
+    """Parse pages [start, end) of a PDF, one document per page like `PDFReader`."""
+    import pypdf
+
+    pdf = pypdf.PdfReader(file_path)
+    file_name = Path(file_path).name
+    page_labels = pdf.page_labels
+
+    return [
+        Document(
+            text=pdf.pages[page].extract_text(),
+            metadata={"page_label": page_labels[page], "file_name": file_name},
+        )
+        for page in range(start, end)
+    ]
+
+
+def parse_pptx_slides(
+    reader_cls: Type[BaseReader], file_path: str, start: int, end: int
+) -> str:
+    """Text of slides [start, end), formatted like `PptxReader`."""
+    from pptx import Presentation
+
+    reader = _get_reader(reader_cls)
+    slides = list(Presentation(file_path).slides)
+    result = ""
+    for i in range(start, end):
+        result += f"\n\nSlide #{i}: \n"
+        for shape in slides[i].shapes:
+            if hasattr(shape, "image"):
+                image = shape.image
+                image_filename = f"tmp_image_{os.getpid()}_{i}.{image.ext}"
+                with open(image_filename, "wb") as f:
+                    f.write(image.blob)
+                result += f"\n Image: {reader.caption_image(image_filename)}\n\n"
+                os.remove(image_filename)
+            if hasattr(shape, "text"):
+                result += f"{shape.text}\n"
+
+    return result
+
+
+def _epub_chapters(file_path: str) -> list:
+    import ebooklib
+    from ebooklib import epub
+
+    book = epub.read_epub(file_path, options={"ignore_ncx": True})
+    return [
+        item for item in book.get_items() if item.get_type() == ebooklib.ITEM_DOCUMENT
+    ]
+
+
+def parse_epub_chapters(file_path: str, start: int, end: int) -> List[str]:
+    """Text of chapters [start, end), converted like `EpubReader`."""
+    import html2text
+
+    chapters = _epub_chapters(file_path)[start:end]
+    return [html2text.html2text(item.get_content().decode("utf-8")) for item in chapters]
+
+
+def count_units(extension: str, file_path: str) -> int:
+    """Number of pages, slides or chapters of a splittable file, 0 otherwise."""
+    if extension == ".pdf":
+        import pypdf
+
+        return len(pypdf.PdfReader(file_path).pages)
+
+    if extension in (".pptx", ".pptm"):
+        from pptx import Presentation
+
+        return len(Presentation(file_path).slides)
+
+    if extension == ".epub":
+        return len(_epub_chapters(file_path))
+
+    return 0
+
+
+class ParseExecutor:
+    """Parse files in a process pool, splitting multi-page formats by page range."""
+
+    def __init__(self, max_workers: int = None, pages_per_task: int = None) -> None:
+        self.max_workers = max_workers or config.PARSE_WORKERS
+        self.pages_per_task = pages_per_task or config.PARSE_PAGES_PER_TASK
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        """Worker processes, started on first use."""
+        if self._executor is None:
+            # spawn: forking a process that holds threads and database clients is unsafe
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    def page_ranges(self, units: int) -> List[Tuple[int, int]]:
+        return [
+            (start, min(start + self.pages_per_task, units))
+            for start in range(0, units, self.pages_per_task)
+        ]
+
+    def parse(self, file_path: str, reader_cls: Type[BaseReader]) -> List[Document]:
+        """Parse a file with `reader_cls`, in parallel page ranges when possible."""
+        extension = Path(file_path).suffix
+        units = self.executor.submit(count_units, extension, file_path).result()
+
+        if units <= self.pages_per_task:
+            return self.executor.submit(parse_whole_file, reader_cls, file_path).result()
+
+        ranges = self.page_ranges(units)
+        custom_logger.debug(
+            f"Parsing {units} pages of {Path(file_path).name} in {len(ranges)} ranges"
+        )
+
+        if extension == ".pdf":
+            futures = [
+                self.executor.submit(parse_pdf_pages, file_path, start, end)
+                for start, end in ranges
+            ]
+            return [document for future in futures for document in future.result()]
+
+        if extension == ".epub":
+            futures = [
+                self.executor.submit(parse_epub_chapters, file_path, start, end)
+                for start, end in ranges
+            ]
+            chapters = [chapter for future in futures for chapter in future.result()]
+            return [Document(text="\n".join(chapters), metadata={})]
+
+        futures = [
+            self.executor.submit(parse_pptx_slides, reader_cls, file_path, start, end)
+            for start, end in ranges
+        ]
+        return [Document(text="".join(future.result() for future in futures), metadata={})]
+
+    def shutdown(self):
+        """Stop the worker processes."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
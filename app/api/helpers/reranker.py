@@ -0,0 +1,283 @@
+"""Reranker module."""
+
+import asyncio
+import math
+import threading
+import time
+from typing import List
+
+from llama_index.core.schema import MetadataMode, NodeWithScore
+
+from app.api.helpers.keyword_index import tokenize
+from app.core.config import config
+from app.logger.logger import custom_logger
+
+RERANKERS = ("none", "lexical", "cross-encoder")
+
+
+class LexicalReranker:
+    """
+    Rerank candidates by BM25 over the candidates themselves, fused with their
+    first-stage order by reciprocal rank so that dense matches without shared
+    words are not pushed out. Needs no model and takes a few milliseconds.
+    """
+
+    name = "lexical"
+    # cheap enough to run on the event loop
+    blocking = False
+    ready = True
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, rrf_k: int = 60) -> None:
+        self.k1 = k1
+        self.b = b
+        self.rrf_k = rrf_k
+
+    def score(self, query: str, texts: List[str]) -> List[float]:
+        documents = [tokenize(text) for text in texts]
+        average_length = max(sum(map(len, documents)) / max(len(documents), 1), 1.0)
+        frequencies = [{} for _ in documents]
+        document_frequency = {}
+        for counts, tokens in zip(frequencies, documents):
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token in counts:
+                document_frequency[token] = document_frequency.get(token, 0) + 1
+
+        lexical_scores = []
+        for counts, tokens in zip(frequencies, documents):
+            norm = self.k1 * (1 - self.b + self.b * len(tokens) / average_length)
+            lexical_scores.append(
+                sum(
+                    math.log(
+                        1
+                        + (len(documents) - document_frequency[term] + 0.5)
+                        / (document_frequency[term] + 0.5)
+                    )
+                    * counts[term]
+                    * (self.k1 + 1)
+                    / (counts[term] + norm)
+                    for term in set(tokenize(query))
+                    if term in counts
+                )
+            )
+
+        lexical_ranks = {
+            position: rank
+            for rank, position in enumerate(
+                sorted(range(len(texts)), key=lambda i: -lexical_scores[i]), 1
+            )
+        }
+        return [
+            1 / (self.rrf_k + position + 1) + 1 / (self.rrf_k + lexical_ranks[position])
+            for position in range(len(texts))
+        ]
+
+
+class CrossEncoderReranker:
+    """
+    Rerank candidates with a local sentence-transformers cross-encoder on CPU.
+
+    The model is loaded on a background thread when the reranker is created;
+    until it is `ready`, the pipeline falls back to the lexical reranker.
+    """
+
+    name = "cross-encoder"
+    # model inference holds the CPU, it runs on a worker thread for async callers
+    blocking = True
+
+    def __init__(self, model_name: str = None, batch_size: int = 32) -> None:
+        self.model_name = model_name or config.RERANK_MODEL
+        self.batch_size = batch_size
+        self.model = None
+        threading.Thread(target=self.load, daemon=True).start()
+
+    @property
+    def ready(self) -> bool:
+        return self.model is not None
+
+    def load(self) -> None:
+        try:
+            from sentence_transformers import CrossEncoder
+        except ImportError:
+            custom_logger.warning(
+                "`sentence-transformers` package not found, reranking lexically"
+            )
+            return
+
+        started_at = time.perf_counter()
+        try:
+            model = CrossEncoder(self.model_name, device="cpu")
+        except Exception as e:
+            # a bad RERANK_MODEL or a failed download: the thread would die silently
+            custom_logger.exception(e)
+            custom_logger.warning(
+                f"Could not load reranker {self.model_name}, reranking lexically"
+            )
+            return
+
+        self.model = model
+        custom_logger.info(
+            f"Loaded reranker {self.model_name} "
+            f"in {time.perf_counter() - started_at:.1f}s"
+        )
+
+    def score(self, query: str, texts: List[str]) -> List[float]:
+        scores = self.model.predict(
+            [(query, text) for text in texts],
+            batch_size=self.batch_size,
+            show_progress_bar=False,
+        )
+        return [float(score) for score in scores]
+
+
+def get_reranker(name: str = None):
+    """Get the reranker named by RERANKER, None to keep the first-stage order."""
+    name = name or config.RERANKER
+    if name == "cross-encoder":
+        return CrossEncoderReranker()
+    if name == "lexical":
+        return LexicalReranker()
+
+    return None
+
+
+class RetrievalPipeline:
+    """
+    Second stage of retrieval: rerank over-fetched candidates and keep the top k.
+
+    The first stage fetches `candidate_top_k` nodes cheaply. They are reranked,
+    unless retrieval already took most of the latency budget: the cost of the
+    reranker per candidate is tracked, and reranking is skipped when retrieval time
+    plus the expected rerank time exceeds `budget_seconds`; the first-stage order
+    is kept instead. Time spent in each stage is counted for `get_stats`.
+    """
+
+    def __init__(
+        self,
+        reranker=None,
+        candidate_top_k: int = None,
+        budget_seconds: float = None,
+    ) -> None:
+        self.reranker = reranker
+        self.fallback = LexicalReranker()
+        self.candidate_top_k = candidate_top_k or config.RERANK_CANDIDATES
+        self.budget_seconds = (
+            budget_seconds
+            if budget_seconds is not None
+            else config.RERANK_BUDGET_MS / 1000
+        )
+        self._lock = threading.Lock()
+        # moving average of the rerank time per candidate, by reranker
+        self.seconds_per_candidate = {}
+        self.requests = 0
+        self.reranked = 0
+        self.skipped = 0
+        self.retrieve_seconds = 0.0
+        self.rerank_seconds = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.reranker is not None
+
+    def get_candidate_top_k(self, similarity_top_k: int) -> int:
+        """Number of nodes the first stage fetches for a final top k."""
+        if not self.enabled:
+            return similarity_top_k
+
+        return max(self.candidate_top_k, similarity_top_k)
+
+    def select_reranker(self, nodes: List[NodeWithScore], retrieve_seconds: float):
+        """Get the reranker to use, None when reranking would exceed the budget."""
+        reranker = self.reranker if self.reranker.ready else self.fallback
+        expected = self.seconds_per_candidate.get(reranker.name, 0.0) * len(nodes)
+        if retrieve_seconds + expected > self.budget_seconds:
+            return None
+
+        return reranker
+
+    async def arerank(
+        self,
+        query: str,
+        nodes: List[NodeWithScore],
+        similarity_top_k: int,
+        started_at: float,
+    ) -> List[NodeWithScore]:
+        """
+        Rerank the candidates retrieved since `started_at` and keep the top k,
+        running model inference on a worker thread.
+        """
+        retrieve_seconds = time.perf_counter() - started_at
+        reranker = self.prepare(nodes, similarity_top_k, retrieve_seconds)
+        if reranker is None:
+            return nodes[:similarity_top_k]
+        if reranker.blocking:
+            return await asyncio.to_thread(
+                self.run, reranker, query, nodes, similarity_top_k
+            )
+
+        return self.run(reranker, query, nodes, similarity_top_k)
+
+    def prepare(
+        self,
+        nodes: List[NodeWithScore],
+        similarity_top_k: int,
+        retrieve_seconds: float,
+    ):
+        with self._lock:
+            self.requests += 1
+            self.retrieve_seconds += retrieve_seconds
+            if len(nodes) <= similarity_top_k:
+                # every candidate is kept, their order does not matter to the LLM
+                return None
+
+            reranker = self.select_reranker(nodes, retrieve_seconds)
+            if reranker is None:
+                self.skipped += 1
+                custom_logger.debug(
+                    f"Skipped reranking, retrieval took {retrieve_seconds * 1000:.0f}ms"
+                )
+
+            return reranker
+
+    def run(
+        self,
+        reranker,
+        query: str,
+        nodes: List[NodeWithScore],
+        similarity_top_k: int,
+    ) -> List[NodeWithScore]:
+        started_at = time.perf_counter()
+        scores = reranker.score(
+            query,
+            [node.node.get_content(metadata_mode=MetadataMode.EMBED) for node in nodes],
+        )
+        seconds = time.perf_counter() - started_at
+
+        with self._lock:
+            self.reranked += 1
+            self.rerank_seconds += seconds
+            previous = self.seconds_per_candidate.get(reranker.name)
+            per_candidate = seconds / len(nodes)
+            self.seconds_per_candidate[reranker.name] = (
+                per_candidate
+                if previous is None
+                else 0.8 * previous + 0.2 * per_candidate
+            )
+
+        order = sorted(range(len(nodes)), key=lambda i: -scores[i])[:similarity_top_k]
+        return [NodeWithScore(node=nodes[i].node, score=scores[i]) for i in order]
+
+    def get_stats(self) -> dict:
+        """Get per-stage timings and how often reranking ran or was skipped."""
+        return {
+            "reranker": self.reranker.name if self.reranker is not None else "none",
+            "ready": self.reranker.ready if self.reranker is not None else False,
+            "candidate_top_k": self.candidate_top_k,
+            "budget_ms": self.budget_seconds * 1000,
+            "requests": self.requests,
+            "reranked": self.reranked,
+            "skipped": self.skipped,
+            "avg_retrieve_ms": self.retrieve_seconds / max(self.requests, 1) * 1000,
+            "avg_rerank_ms": self.rerank_seconds / max(self.reranked, 1) * 1000,
+        }
+
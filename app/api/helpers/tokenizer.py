@@ -0,0 +1,184 @@
+"""Tokenizer module."""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Iterable, List, Optional
+
+import llama_index.core
+import tiktoken
+from llama_index.core.base.llms.types import MessageRole
+from llama_index.core.memory import ChatMemoryBuffer
+from llama_index.core.node_parser import SentenceSplitter
+
+from app.core.config import config
+
+# metadata key of the token count stored with every chunk
+TOKEN_COUNT_KEY = "token_count"
+
+
+def load_encoder(model_name: str) -> tiktoken.Encoding:
+    """Load a tiktoken encoding, from the files shipped with llama-index if unset."""
+    if "TIKTOKEN_CACHE_DIR" in os.environ:
+        return tiktoken.encoding_for_model(model_name)
+
+    os.environ["TIKTOKEN_CACHE_DIR"] = os.path.join(
+        os.path.dirname(llama_index.core.__file__), "_static", "tiktoken_cache"
+    )
+    try:
+        return tiktoken.encoding_for_model(model_name)
+    finally:
+        del os.environ["TIKTOKEN_CACHE_DIR"]
+
+
+class Tokenizer:
+    """
+    Shared tiktoken tokenizer with memoized token counts.
+
+    The encoder is loaded once, on first use. Counts are kept in an LRU cache keyed
+    by a digest of the text, so a paragraph, chunk or message is tokenized once;
+    counts stored with chunks and messages are added with `remember` and never
+    computed again.
+    """
+
+    def __init__(self, model_name: str = None, cache_size: int = None) -> None:
+        self.model_name = model_name or config.TOKENIZER_MODEL
+        self.cache_size = (
+            cache_size if cache_size is not None else config.TOKEN_COUNT_CACHE_SIZE
+        )
+        self._counts: OrderedDict = OrderedDict()
+        self._encoder: Optional[tiktoken.Encoding] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def encoder(self) -> tiktoken.Encoding:
+        if self._encoder is None:
+            with self._lock:
+                if self._encoder is None:
+                    self._encoder = load_encoder(self.model_name)
+
+        return self._encoder
+
+    def get_count(self, key: bytes) -> Optional[int]:
+        with self._lock:
+            count = self._counts.get(key)
+            if count is not None:
+                self._counts.move_to_end(key)
+
+            return count
+
+    def set_count(self, key: bytes, count: int) -> None:
+        with self._lock:
+            self._counts[key] = count
+            self._counts.move_to_end(key)
+            while len(self._counts) > self.cache_size:
+                self._counts.popitem(last=False)
+
+    @staticmethod
+    def make_key(text: str) -> bytes:
+        return hashlib.blake2b(
+            text.encode("utf-8", "surrogatepass"), digest_size=16
+        ).digest()
+
+    def encode(self, text: str) -> List[int]:
+        """Tokenize a text, same tokens as `llama_index.core.utils.get_tokenizer`."""
+        return self.encoder.encode(text, allowed_special="all")
+
+    def count(self, text: str) -> int:
+        """Get the number of tokens of a text."""
+        key = self.make_key(text)
+        count = self.get_count(key)
+        if count is None:
+            self.misses += 1
+            count = len(self.encode(text))
+            self.set_count(key, count)
+        else:
+            self.hits += 1
+
+        return count
+
+    def count_batch(self, texts: List[str]) -> List[int]:
+        """Get the number of tokens of many texts, tokenizing the unknown ones at once."""
+        keys = [self.make_key(text) for text in texts]
+        counts = [self.get_count(key) for key in keys]
+        missing = {
+            key: text for key, text, count in zip(keys, texts, counts) if count is None
+        }
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+        if missing:
+            # tiktoken releases the GIL, the batch is encoded on its threads
+            encoded = self.encoder.encode_batch(
+                list(missing.values()), allowed_special="all"
+            )
+            for key, tokens in zip(missing, encoded):
+                self.set_count(key, len(tokens))
+            found = dict(zip(missing, map(len, encoded)))
+            counts = [
+                found[key] if count is None else count
+                for key, count in zip(keys, counts)
+            ]
+
+        return counts
+
+    def remember(self, texts: Iterable[str], counts: Iterable[Optional[int]]) -> None:
+        """Add known token counts, read along with their texts from the database."""
+        for text, count in zip(texts, counts):
+            if count is not None:
+                self.set_count(self.make_key(text), count)
+
+    def get_stats(self) -> dict:
+        """Get token count cache hit/miss counters."""
+        lookups = self.hits + self.misses
+        return {
+            "model": self.model_name,
+            "size": len(self._counts),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class CachedSentenceSplitter(SentenceSplitter):
+    """
+    Sentence splitter counting tokens with the shared tokenizer, so a text is not
+    tokenized twice per split level nor again when the same document is re-ingested.
+    """
+
+    def _token_size(self, text: str) -> int:
+        return tokenizer.count(text)
+
+
+class CachedChatMemoryBuffer(ChatMemoryBuffer):
+    """
+    Chat memory buffer summing the memoized token counts of its messages instead of
+    tokenizing the joined history again every time a message is dropped.
+    """
+
+    def get(self, initial_token_count: int = 0, **kwargs) -> List:
+        chat_history = self.get_all()
+        if initial_token_count > self.token_limit:
+            raise ValueError("Initial token count exceeds token limit")
+
+        counts = tokenizer.count_batch([str(m.content) for m in chat_history])
+        message_count = len(chat_history)
+        # the space joining two messages is usually merged into the next token
+        token_count = sum(counts) + initial_token_count
+        while token_count > self.token_limit and message_count > 1:
+            token_count -= counts[-message_count]
+            message_count -= 1
+            if chat_history[-message_count].role == MessageRole.ASSISTANT:
+                # the history cannot start with an assistant message
+                token_count -= counts[-message_count]
+                message_count -= 1
+
+        if token_count > self.token_limit or message_count <= 0:
+            return []
+
+        return chat_history[-message_count:]
+
+
+tokenizer = Tokenizer()
@@ -22,7 +22,7 @@ router = APIRouter()
 @router.post("/token", response_model=TokenSchema)
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
     """Login token."""
-    user = auth_service.authenticate_user(
+    user = await auth_service.aauthenticate_user(
         form_data.username, form_data.password
     )
     if not user:
@@ -48,7 +48,7 @@ async def login_basic(auth: BasicAuth = Depends(basic_auth)):
     try:
         decoded = base64.b64decode(auth).decode("ascii")
         username, _, password = decoded.partition(":")
-        user = auth_service.authenticate_user(username, password)
+        user = await auth_service.aauthenticate_user(username, password)
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -6,6 +6,7 @@ from fastapi.responses import StreamingResponse
 from app.api.database.models.chat import ChatBodyModel, ConversationBodyModel
 from app.api.services.session_service import SessionService
 from app.api.services.chat_service import ChatService
+from app.api.services.ingest_service import aget_ingest_service
 from app.api.responses.base import BaseResponse
 from app.logger.logger import custom_logger
 
@@ -16,11 +17,13 @@ chat_service = ChatService()
 
 
 @router.post("")
-def chat(chat_body: ChatBodyModel):
+async def chat(chat_body: ChatBodyModel):
     """Chat with the document"""
     try:
         return StreamingResponse(
-            chat_service.chat(chat_body.query),
+            chat_service.achat(
+                chat_body.query, chat_body.retrieval_mode, chat_body.sources
+            ),
             media_type="text/event-stream",
         )
 
@@ -29,18 +32,84 @@ def chat(chat_body: ChatBodyModel):
         return BaseResponse.error_response(message="Internal Server Error")
 
 
+@router.get("/cache")
+async def get_answer_cache_stats():
+    """Get answer cache statistics."""
+    try:
+        stats = (await aget_ingest_service()).get_answer_cache_stats()
+
+        return BaseResponse.success_response(
+            status_code=200, message="Successfully retrieved cache stats", data=stats
+        )
+
+    except Exception as e:
+        custom_logger.exception(e)
+        return BaseResponse.error_response(message="Internal Server Error")
+
+
+@router.get("/retrieval")
+async def get_retrieval_stats():
+    """Get retrieval pipeline statistics."""
+    try:
+        stats = await chat_service.aget_retrieval_stats()
+
+        return BaseResponse.success_response(
+            status_code=200, message="Successfully retrieved retrieval stats", data=stats
+        )
+
+    except Exception as e:
+        custom_logger.exception(e)
+        return BaseResponse.error_response(message="Internal Server Error")
+
+
+@router.get("/context")
+async def get_context_stats():
+    """Get context packing statistics."""
+    try:
+        stats = await chat_service.aget_context_stats()
+
+        return BaseResponse.success_response(
+            status_code=200, message="Successfully retrieved context stats", data=stats
+        )
+
+    except Exception as e:
+        custom_logger.exception(e)
+        return BaseResponse.error_response(message="Internal Server Error")
+
+
+@router.get("/embedding-cache")
+async def get_query_embedding_cache_stats():
+    """Get query embedding cache statistics."""
+    try:
+        stats = await chat_service.aget_query_embedding_cache_stats()
+
+        return BaseResponse.success_response(
+            status_code=200, message="Successfully retrieved cache stats", data=stats
+        )
+
+    except Exception as e:
+        custom_logger.exception(e)
+        return BaseResponse.error_response(message="Internal Server Error")
+
+
 @router.post("/conversation")
 async def chat(chat_body: ConversationBodyModel):
     """Conversation chat with the document."""
     try:
-        session = session_service.get_session_by_id(chat_body.session_id)
+        session = await session_service.aget_session_by_id(chat_body.session_id)
         if not session:
             return BaseResponse.error_response(
                 status_code=404, message="Session not found"
             )
 
         return StreamingResponse(
-            chat_service.conversation(chat_body.query, chat_body.session_id),
+            chat_service.aconversation(
+                chat_body.query,
+                chat_body.session_id,
+                chat_body.retrieval_mode,
+                # sources of the request, else those the session is pinned to
+                chat_body.sources or session.sources,
+            ),
             media_type="text/event-stream",
         )
 
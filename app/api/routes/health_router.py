@@ -1,8 +1,9 @@
 """Health router for the API."""
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Response
 
 from app.api.database.models.health import HealthResponse
+from app.core.container import container
 
 # Not authentication or authorization required to get the health status.
 router = APIRouter()
@@ -10,5 +11,15 @@ router = APIRouter()
 
 @router.get("")
 def health() -> HealthResponse:
-    """Return ok if the system is up."""
+    """Return ok if the system is up, even while the index is still loading."""
+    return HealthResponse(status="ok")
+
+
+@router.get("/ready")
+def ready(response: Response) -> HealthResponse:
+    """Return ok once the index is loaded, 503 while the app is starting."""
+    if not container.is_built("ingest_service"):
+        response.status_code = 503
+        return HealthResponse(status="starting")
+
     return HealthResponse(status="ok")
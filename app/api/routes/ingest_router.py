@@ -1,10 +1,15 @@
 """Ingest router for the API"""
 
-from fastapi import APIRouter, File, UploadFile
+from typing import Literal, Optional
+
+from fastapi import APIRouter, File, Query, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 
 from app.api.responses.base import BaseResponse
 from app.api.errors.error_message import BaseErrorMessage
-from app.api.services.ingest_service import ingest_service
+from app.api.services.ingest_service import IngestService, aget_ingest_service
+from app.api.services.ingest_job_service import ingest_job_service
 from app.logger.logger import custom_logger
 
 
@@ -12,28 +17,40 @@ router = APIRouter()
 
 
 @router.post("/file")
-async def ingest_file(file: UploadFile = File(...)):
+async def ingest_file(file: UploadFile = File(...), upsert: bool = False):
     """
     ## Description
-    The `ingest` function takes an uploaded file, reads its content, and passes it to an ingest service
-    for further processing, returning the resulting documents.
+    The `ingest` function takes an uploaded file, streams it to the local data folder in chunks, and
+    queues an ingest job that parses, chunks, embeds and inserts it in the background. Uploads larger
+    than `MAX_FILE_SIZE` are rejected while they arrive.
 
     ## Parameters
     - **file**: The `file` parameter is of type `UploadFile`, which is a class provided by the FastAPI
     framework. It represents a file uploaded by the client as part of a multipart form data request. It
     contains information about the uploaded file, such as its filename and content.
+    - **upsert**: Replace a file that was already ingested under the same name. Only the chunks that
+    changed are embedded again; chunks that no longer exist are deleted.
 
     ## Returns
-    The function `ingest` returns a list of documents (`docs`) if successful.
+    The queued ingest job. Poll `GET /ingest/jobs/{job_id}` for its progress.
     """
     try:
         await file.seek(0)
         file_name = file.filename
-        file_content = await file.read()
 
-        docs = ingest_service.ingest_file(file_content, file_name)
+        ingest_service = await aget_ingest_service()
+        file_path, content_hash = await run_in_threadpool(
+            ingest_service.save_upload, file.file, file_name, upsert
+        )
+        job = await run_in_threadpool(
+            ingest_job_service.submit_file, file_path, content_hash, upsert
+        )
 
-        return docs
+        return BaseResponse.success_response(
+            status_code=202,
+            message="Ingest job queued",
+            data=job.model_dump(mode="json"),
+        )
 
     except ValueError as e:
         custom_logger.debug(str(e))
@@ -46,22 +63,54 @@ async def ingest_file(file: UploadFile = File(...)):
 
 
 @router.post("/url")
-async def ingest_url(url: str):
+async def ingest_url(url: str, upsert: bool = False):
     """
     ## Description
-    The `ingest_url` function takes a URL, fetches the content at that URL, and passes it to an ingest
-    service for further processing, returning the resulting documents.
+    The `ingest_url` function takes a URL and queues an ingest job that fetches the content at that URL
+    and indexes it in the background.
 
     ## Parameters
     - **url**: The `url` parameter is of type `str` and represents the URL of the content to be ingested.
+    - **upsert**: Replace the content already ingested from this URL, re-embedding only changed chunks.
+    Without it, a URL that was already ingested is refused.
 
     ## Returns
-    The function `ingest_url` returns a list of documents (`docs`) if successful.
+    The queued ingest job. Poll `GET /ingest/jobs/{job_id}` for its progress.
     """
     try:
-        docs = ingest_service.ingest_url(url)
+        job = await run_in_threadpool(ingest_job_service.submit_url, url, upsert)
 
-        return docs
+        return BaseResponse.success_response(
+            status_code=202,
+            message="Ingest job queued",
+            data=job.model_dump(mode="json"),
+        )
+
+    except ValueError as e:
+        custom_logger.debug(str(e))
+        error_message: BaseErrorMessage = e.args[0]
+        return BaseResponse.error_response(message=error_message.message)
+
+    except Exception as e:
+        custom_logger.exception(e)
+        return BaseResponse.error_response(message="Internal Server Error")
+
+
+@router.get("/jobs/{job_id}")
+async def get_ingest_job(job_id: str):
+    """Get the stage, progress and error of an ingest job."""
+    try:
+        job = await run_in_threadpool(ingest_job_service.get_job_by_id, job_id)
+        if not job:
+            return BaseResponse.error_response(
+                status_code=404, message="Ingest job not found"
+            )
+
+        return BaseResponse.success_response(
+            status_code=200,
+            message="Successfully retrieved ingest job",
+            data=job.model_dump(mode="json"),
+        )
 
     except Exception as e:
         custom_logger.exception(e)
@@ -72,7 +121,7 @@ async def ingest_url(url: str):
 async def get_sources():
     """Get all sources."""
     try:
-        sources = ingest_service.get_sources()
+        sources = await IngestService.aget_sources()
 
         return BaseResponse.success_response(
             status_code=200, message="Sucessfully retrieved files", data=sources
@@ -83,26 +132,133 @@ async def get_sources():
         return BaseResponse.error_response(message="Internal Server Error")
 
 
-@router.get("/documents")
-async def get_docs():
-    """Get all documents."""
+@router.get("/catalog")
+async def get_source_catalog():
+    """
+    Get the catalog entry of every source: its document ids, node count, text size,
+    content hash, ingest time and embedding model, with totals over all sources.
+    """
     try:
-        docs = ingest_service.get_docs()
+        catalog = await IngestService.aget_catalog()
 
-        return docs
+        return BaseResponse.success_response(
+            status_code=200, message="Successfully retrieved catalog", data=catalog
+        )
 
     except Exception as e:
         custom_logger.exception(e)
         return BaseResponse.error_response(message="Internal Server Error")
 
 
-@router.get("/documents/{source}")
-async def get_docs_by_source(source: str):
-    """Get documents by file name."""
+@router.get("/embedding-cache")
+async def get_embedding_cache_stats():
+    """Get embedding cache statistics."""
+    try:
+        stats = (await aget_ingest_service()).get_embedding_cache_stats()
+
+        return BaseResponse.success_response(
+            status_code=200, message="Successfully retrieved cache stats", data=stats
+        )
+
+    except Exception as e:
+        custom_logger.exception(e)
+        return BaseResponse.error_response(message="Internal Server Error")
+
+
+@router.get("/keyword-index")
+async def get_keyword_index_stats():
+    """Get keyword index statistics."""
     try:
-        docs = ingest_service.get_docs_by_source(source)
+        stats = (await aget_ingest_service()).get_keyword_index_stats()
 
-        return docs
+        return BaseResponse.success_response(
+            status_code=200,
+            message="Successfully retrieved keyword index stats",
+            data=stats,
+        )
+
+    except Exception as e:
+        custom_logger.exception(e)
+        return BaseResponse.error_response(message="Internal Server Error")
+
+
+@router.get("/index-sync")
+async def get_index_sync_stats():
+    """Get the index version of the worker answering, and how often it reloaded."""
+    try:
+        stats = (await aget_ingest_service()).get_index_sync_stats()
+
+        return BaseResponse.success_response(
+            status_code=200,
+            message="Successfully retrieved index sync stats",
+            data=stats,
+        )
+
+    except Exception as e:
+        custom_logger.exception(e)
+        return BaseResponse.error_response(message="Internal Server Error")
+
+
+async def list_docs(
+    source: Optional[str],
+    cursor: Optional[str],
+    limit: Optional[int],
+    include_text: bool,
+    include_embedding: bool,
+    format: str,
+):
+    if format == "ndjson":
+        return StreamingResponse(
+            IngestService.astream_docs(source, include_text, include_embedding),
+            media_type="application/x-ndjson",
+        )
+
+    page = await IngestService.alist_docs(
+        source, cursor, limit, include_text, include_embedding
+    )
+
+    return BaseResponse.success_response(
+        status_code=200, message="Successfully retrieved documents", data=page
+    )
+
+
+@router.get("/documents")
+async def get_docs(
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1),
+    include_text: bool = False,
+    include_embedding: bool = False,
+    format: Literal["json", "ndjson"] = "json",
+):
+    """
+    Get documents a page at a time: pass the `next_cursor` of a page as `cursor` to
+    get the next one. Texts and embeddings are left out unless asked for. With
+    `format=ndjson`, every document is streamed instead, one JSON object per line.
+    """
+    try:
+        return await list_docs(
+            None, cursor, limit, include_text, include_embedding, format
+        )
+
+    except Exception as e:
+        custom_logger.exception(e)
+        return BaseResponse.error_response(message="Internal Server Error")
+
+
+@router.get("/documents/{source}")
+async def get_docs_by_source(
+    source: str,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1),
+    include_text: bool = False,
+    include_embedding: bool = False,
+    format: Literal["json", "ndjson"] = "json",
+):
+    """Get documents by file name, paginated like `GET /documents`."""
+    try:
+        return await list_docs(
+            source, cursor, limit, include_text, include_embedding, format
+        )
 
     except Exception as e:
         custom_logger.exception(e)
@@ -113,12 +269,13 @@ async def get_docs_by_source(source: str):
 async def delete_docs_by_source(source: str):
     """Delete documents by file name."""
     try:
-        docs_ids_deleted = ingest_service.delete_docs_by_source(source)
+        ingest_service = await aget_ingest_service()
+        result = await run_in_threadpool(ingest_service.delete_docs_by_source, source)
 
         return BaseResponse.success_response(
             status_code=200,
-            message=f"Successfully deleted documents with source: {source}, deleted count: {len(docs_ids_deleted)}",
-            data=docs_ids_deleted,
+            message=f"Successfully deleted documents with source: {source}, deleted count: {result['documents_deleted']}",
+            data=result,
         )
 
     except Exception as e:
@@ -130,12 +287,13 @@ async def delete_docs_by_source(source: str):
 async def delete_all_docs():
     """Delete all documents."""
     try:
-        file_names_deleted = ingest_service.delete_all_docs()
+        ingest_service = await aget_ingest_service()
+        result = await run_in_threadpool(ingest_service.delete_all_docs)
 
         return BaseResponse.success_response(
             status_code=200,
-            message=f"Successfully deleted all documents, deleted count: {len(file_names_deleted)}",
-            data=file_names_deleted,
+            message=f"Successfully deleted all documents, deleted count: {len(result['sources'])}",
+            data=result,
         )
 
     except Exception as e:
@@ -22,13 +22,13 @@ session_service = SessionService()
 async def create_message(message: MessageCreateModel):
     """Create a message"""
     try:
-        session = session_service.get_session_by_id(message.session_id)
+        session = await session_service.aget_session_by_id(message.session_id)
         if not session:
             return BaseResponse.error_response(
                 status_code=404, message="Session not found"
             )
 
-        return message_service.create_message(message)
+        return await message_service.acreate_message(message)
 
     except Exception as e:
         custom_logger.exception(e)
@@ -43,13 +43,13 @@ async def create_message(message: MessageCreateModel):
 async def get_messages_of_session(session_id: str):
     """Get chat session messages"""
     try:
-        session = session_service.get_session_by_id(session_id)
+        session = await session_service.aget_session_by_id(session_id)
         if not session:
             return BaseResponse.error_response(
                 status_code=404, message="Session not found"
             )
 
-        return message_service.get_messages_by_session_id(session_id)
+        return await message_service.aget_messages_by_session_id(session_id)
 
     except Exception as e:
         custom_logger.exception(e)
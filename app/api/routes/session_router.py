@@ -2,7 +2,11 @@
 
 from fastapi import APIRouter
 
-from app.api.database.models.session import SessionModel, SessionCreateModel
+from app.api.database.models.session import (
+    SessionModel,
+    SessionCreateModel,
+    SessionSourcesModel,
+)
 from app.api.services.session_service import SessionService
 from app.api.services.user_service import UserService
 from app.api.services.message_service import MessageService
@@ -21,13 +25,13 @@ message_service = MessageService()
 async def create_session(session: SessionCreateModel):
     """Create chat session"""
     try:
-        user = user_service.get_user_by_id(session.user_id)
+        user = await user_service.aget_user_by_id(session.user_id)
         if not user:
             return BaseResponse.error_response(
                 status_code=404, message="User not found"
             )
 
-        return session_service.create_session(session)
+        return await session_service.acreate_session(session)
 
     except ValueError as e:
         custom_logger.debug(str(e))
@@ -43,7 +47,7 @@ async def create_session(session: SessionCreateModel):
 async def get_session(session_id: str):
     """Get chat session"""
     try:
-        session = session_service.get_session_by_id(session_id)
+        session = await session_service.aget_session_by_id(session_id)
         if not session:
             return BaseResponse.error_response(
                 status_code=404, message="Session not found"
@@ -56,18 +60,46 @@ async def get_session(session_id: str):
         return BaseResponse.error_response(message="Internal Server Error")
 
 
+@router.put(
+    "/{session_id}/sources", response_model=SessionModel, response_model_by_alias=False
+)
+async def update_session_sources(session_id: str, body: SessionSourcesModel):
+    """Pin chat session to sources, or unpin it with null"""
+    try:
+        session = await session_service.aupdate_session_sources(
+            session_id, body.sources
+        )
+        if not session:
+            return BaseResponse.error_response(
+                status_code=404, message="Session not found"
+            )
+
+        return session
+
+    except ValueError as e:
+        custom_logger.debug(str(e))
+        error_message: BaseErrorMessage = e.args[0]
+        return BaseResponse.error_response(
+            status_code=error_message.status_code, message=error_message.message
+        )
+
+    except Exception as e:
+        custom_logger.exception(e)
+        return BaseResponse.error_response(message="Internal Server Error")
+
+
 @router.delete("/{session_id}")
 async def delete_session(session_id: str):
     """Delete chat session"""
     try:
-        session = session_service.get_session_by_id(session_id)
+        session = await session_service.aget_session_by_id(session_id)
         if not session:
             return BaseResponse.error_response(
                 status_code=404, message="Session not found"
             )
 
-        message_service.delete_messages_by_session_id(session_id)
-        session_service.delete_session_by_id(session_id)
+        await message_service.adelete_messages_by_session_id(session_id)
+        await session_service.adelete_session_by_id(session_id)
 
         return BaseResponse.success_response(
             status_code=200,
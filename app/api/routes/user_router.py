@@ -20,7 +20,7 @@ session_service = SessionService()
 async def create_user(user: UserCreateModel):
     """Creates a new user."""
     try:
-        return user_service.create_user(user)
+        return await user_service.acreate_user(user)
 
     except Exception as e:
         custom_logger.exception(e)
@@ -31,7 +31,7 @@ async def create_user(user: UserCreateModel):
 async def get_users():
     """Get all users."""
     try:
-        return user_service.get_users()
+        return await user_service.aget_users()
 
     except Exception as e:
         custom_logger.exception(e)
@@ -42,7 +42,7 @@ async def get_users():
 async def get_user(user_id: str):
     """Get user by ID."""
     try:
-        user = user_service.get_user_by_id(user_id)
+        user = await user_service.aget_user_by_id(user_id)
         if not user:
             return BaseResponse.error_response(
                 status_code=404, message="User not found"
@@ -59,19 +59,19 @@ async def get_user(user_id: str):
 async def delete_user(user_id: str):
     """Delete user by ID."""
     try:
-        user = user_service.get_user_by_id(user_id)
+        user = await user_service.aget_user_by_id(user_id)
         if not user:
             return BaseResponse.error_response(
                 status_code=404, message="User not found"
             )
 
-        sessions_user = session_service.get_sessions_by_user_id(user_id)
+        sessions_user = await session_service.aget_sessions_by_user_id(user_id)
         if sessions_user:
             for session in sessions_user.sessions:
-                message_service.delete_messages_by_session_id(session.id)
-                session_service.delete_session_by_id(session.id)
+                await message_service.adelete_messages_by_session_id(session.id)
+                await session_service.adelete_session_by_id(session.id)
 
-        user_service.delete_user_by_id(user_id)
+        await user_service.adelete_user_by_id(user_id)
 
         return BaseResponse.success_response(
             status_code=200, message="User deleted successfully", data=user_id
@@ -4,6 +4,7 @@ from typing import Optional, Annotated
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
 from fastapi import Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 
 from app.api.database.models.user import UserModel
 from app.api.database.execute.user_execute import UserExecute
@@ -43,6 +44,16 @@ def authenticate_user(username: str, password: str) -> bool | UserModel:
     return user
 
 
+async def aauthenticate_user(username: str, password: str) -> bool | UserModel:
+    """Authenticate user without blocking the event loop."""
+    user = await user_execute.aget_user_by_username(username)
+    if not user:
+        return False
+    if not await run_in_threadpool(verify_password, password, user["password"]):
+        return False
+    return user
+
+
 async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]):
     """Check login token of current user."""
     credentials_exception = HTTPException(
@@ -59,7 +70,7 @@ async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]):
     except JWTError:
         raise credentials_exception
 
-    user = user_execute.get_user_by_username(username=username)
+    user = await user_execute.aget_user_by_username(username=username)
     if user is None:
         raise credentials_exception
 
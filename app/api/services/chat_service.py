@@ -1,15 +1,35 @@
 """Chat service module."""
 
-from llama_index.core.memory import ChatMemoryBuffer
+import asyncio
+import time
+from typing import AsyncGenerator, List, Optional, Set
+
+from llama_index.core import Settings
+from llama_index.core.chat_engine.context import DEFAULT_CONTEXT_TEMPLATE
 from llama_index.core.base.llms.types import ChatMessage, MessageRole
+from llama_index.core.prompts.default_prompt_selectors import DEFAULT_TEXT_QA_PROMPT_SEL
+from llama_index.core.schema import MetadataMode, NodeWithScore
+from llama_index.core.vector_stores.types import VectorStoreQuery
 
-from app.api.database.models.message import MessageCreateModel
+from app.api.database.execute.docs_execute import DocsExecute
+from app.api.database.vector_db import get_source_filters
+from app.api.database.models.message import MessageCollectionModel, MessageCreateModel
+from app.api.helpers.hybrid_retriever import fuse_results, get_missing_node_ids
+from app.api.helpers.tokenizer import CachedChatMemoryBuffer, tokenizer
 from app.api.services.message_service import MessageService
-from app.api.services.ingest_service import ingest_service
+from app.api.services.ingest_service import aget_ingest_service
+from app.core.config import config
 import llama_index.core
 
 llama_index.core.set_global_handler("simple")
 
+docs_execute = DocsExecute()
+
+CONVERSATION_SYSTEM_PROMPT = """\
+            You are a chatbot. You MUST NOT provide any information unless it is in the Context or previous messages or general conversation. If the user ask something you don't know, say that you cannot answer. \
+            you MUST keep the answers short and simple. \
+            """
+
 
 class ChatService:
     """Chat Service class for chat operations."""
@@ -18,66 +38,294 @@ class ChatService:
         self.message_service = MessageService()
 
     @staticmethod
-    def chat(query: str):
-        """Chat with the document."""
-
-        chat_engine = ingest_service.index.as_query_engine(
-            similarity_top_k=5, streaming=True, verbose=False
-        )
-        streaming_response = chat_engine.query(query)
-
-        return streaming_response.response_gen
-
-    def conversation(self, query: str, session_id: str):
-        """Get answer from the chat engine."""
-
-        history = self.message_service.get_messages_by_session_id(session_id)
-        chat_history = []
-        if history.messages:
-            for message in history.messages:
-                chat_history.append(
-                    ChatMessage(
-                        message=message.message,
-                        role=(
-                            MessageRole.USER
-                            if message.sender == "user"
-                            else MessageRole.ASSISTANT
-                        ),
-                    )
-                )
-
-        memory = ChatMemoryBuffer.from_defaults(
-            chat_history=chat_history, token_limit=8000
-        )
-        chat_engine = ingest_service.index.as_chat_engine(
-            chat_mode="context",
-            memory=memory,
-            similarity_top_k=5,
-            verbose=False,
-            system_prompt=(
-                """\
-            You are a chatbot. You MUST NOT provide any information unless it is in the Context or previous messages or general conversation. If the user ask something you don't know, say that you cannot answer. \
-            you MUST keep the answers short and simple. \
-            """
-            ),
+    def to_chat_history(history: MessageCollectionModel) -> List[ChatMessage]:
+        """Convert stored messages, newest first, to a chronological chat history."""
+        return [
+            ChatMessage(
+                content=message.message,
+                role=(
+                    MessageRole.USER if message.sender == "user" else MessageRole.ASSISTANT
+                ),
+            )
+            for message in reversed(history.messages)
+        ]
+
+    @staticmethod
+    def to_memory(
+        history: MessageCollectionModel, token_limit: int = 8000
+    ) -> CachedChatMemoryBuffer:
+        """
+        Get the memory of a conversation from its stored messages, whose stored token
+        counts spare tokenizing them again to fit the history in `token_limit`.
+        """
+        tokenizer.remember(
+            (message.message for message in history.messages),
+            (message.token_count for message in history.messages),
+        )
+
+        return CachedChatMemoryBuffer.from_defaults(
+            chat_history=ChatService.to_chat_history(history),
+            token_limit=token_limit,
+            tokenizer_fn=tokenizer.encode,
+        )
+
+    @staticmethod
+    async def aretrieve(
+        query: str,
+        similarity_top_k: Optional[int] = None,
+        query_embedding: Optional[List[float]] = None,
+        retrieval_mode: Optional[str] = None,
+        sources: Optional[List[str]] = None,
+    ) -> List[NodeWithScore]:
+        """
+        Retrieve the top k nodes for a query, RETRIEVAL_TOP_K by default.
+
+        With a reranker in the retrieval pipeline, more candidates are fetched first
+        and the best k of them are kept after reranking.
+        """
+        similarity_top_k = similarity_top_k or config.RETRIEVAL_TOP_K
+        pipeline = (await aget_ingest_service()).retrieval_pipeline
+        started_at = time.perf_counter()
+        nodes = await ChatService.aretrieve_candidates(
+            query,
+            pipeline.get_candidate_top_k(similarity_top_k),
+            query_embedding,
+            retrieval_mode,
+            sources,
         )
+        if not pipeline.enabled:
+            return nodes
+
+        return await pipeline.arerank(query, nodes, similarity_top_k, started_at)
 
-        response = chat_engine.stream_chat(message=query)
+    @staticmethod
+    async def aretrieve_candidates(
+        query: str,
+        similarity_top_k: int,
+        query_embedding: Optional[List[float]] = None,
+        retrieval_mode: Optional[str] = None,
+        sources: Optional[List[str]] = None,
+    ) -> List[NodeWithScore]:
+        """
+        Retrieve the top k nodes for a query by vector, keyword or both, among the
+        nodes of `sources` when given.
+
+        Hybrid retrieval fuses the candidates of both retrievers by reciprocal rank;
+        nodes found by keywords alone are read from the docstore in one query.
+        """
+        retrieval_mode = retrieval_mode or config.RETRIEVAL_MODE
+        if retrieval_mode == "vector":
+            return await ChatService.avector_retrieve(
+                query, similarity_top_k, query_embedding, sources
+            )
+
+        candidate_top_k = max(config.HYBRID_CANDIDATE_TOP_K, similarity_top_k)
+        vector_nodes = []
+        if retrieval_mode == "hybrid":
+            vector_nodes = await ChatService.avector_retrieve(
+                query, candidate_top_k, query_embedding, sources
+            )
+        ingest_service = await aget_ingest_service()
+        keyword_hits = ingest_service.keyword_index.search(
+            query, candidate_top_k, sources
+        )
+        keyword_nodes = await docs_execute.aget_nodes(
+            get_missing_node_ids(vector_nodes, keyword_hits)
+        )
+
+        return fuse_results(
+            vector_nodes, keyword_hits, keyword_nodes, similarity_top_k, retrieval_mode
+        )
+
+    @staticmethod
+    async def avector_retrieve(
+        query: str,
+        similarity_top_k: int = 5,
+        query_embedding: Optional[List[float]] = None,
+        sources: Optional[List[str]] = None,
+    ) -> List[NodeWithScore]:
+        """
+        Retrieve the nodes most similar to a query without blocking the event loop.
+
+        The restriction to `sources` is a filter of the vector search itself, so
+        the top k are taken among the nodes of those sources.
+
+        Vector stores that keep the text and metadata of every node spare the
+        docstore round trips of the sync retriever; for the others, the nodes are
+        read from the docstore on a worker thread.
+        """
+        ingest_service = await aget_ingest_service()
+        if query_embedding is None:
+            query_embedding = await Settings.embed_model.aget_query_embedding(query)
+        result = await ingest_service.index.vector_store.aquery(
+            VectorStoreQuery(
+                query_embedding=query_embedding,
+                similarity_top_k=similarity_top_k,
+                filters=get_source_filters(sources),
+            )
+        )
 
-        for token in response.response_gen:
+        nodes = result.nodes
+        if nodes is None:
+            nodes = await asyncio.to_thread(
+                ingest_service.index.docstore.get_nodes, result.ids
+            )
+
+        return [
+            NodeWithScore(node=node, score=score)
+            for node, score in zip(nodes, result.similarities)
+        ]
+
+    @staticmethod
+    def get_context_str(nodes: List[NodeWithScore]) -> str:
+        return "\n\n".join(
+            node.node.get_content(metadata_mode=MetadataMode.LLM).strip()
+            for node in nodes
+        )
+
+    @staticmethod
+    def get_sources(nodes: List[NodeWithScore]) -> Set[str]:
+        """Get the sources an answer was built from."""
+        return {
+            node.node.metadata["source"]
+            for node in nodes
+            if node.node.metadata.get("source")
+        }
+
+    @staticmethod
+    async def aget_retrieval_stats() -> dict:
+        """Get retrieval and reranking timings."""
+        return (await aget_ingest_service()).retrieval_pipeline.get_stats()
+
+    @staticmethod
+    async def aget_context_stats() -> dict:
+        """Get tokens retrieved and sent to the LLM as context, and token counts hits."""
+        stats = (await aget_ingest_service()).context_assembler.get_stats()
+        stats["token_counts"] = tokenizer.get_stats()
+
+        return stats
+
+    @staticmethod
+    async def aget_query_embedding_cache_stats() -> dict:
+        """Get query embedding cache hit/miss counters."""
+        # the embedding model is set when the ingest service is built
+        await aget_ingest_service()
+
+        return Settings.embed_model.get_stats()
+
+    async def achat(
+        self,
+        query: str,
+        retrieval_mode: Optional[str] = None,
+        sources: Optional[List[str]] = None,
+    ) -> AsyncGenerator[str, None]:
+        """
+        Chat with the document, or the nodes of `sources`, streaming tokens as the
+        LLM produces them.
+
+        Answers to unscoped queries close enough to an earlier one are replayed
+        from the answer cache instead.
+        """
+
+        started_at = time.perf_counter()
+        retrieval_mode = retrieval_mode or config.RETRIEVAL_MODE
+        ingest_service = await aget_ingest_service()
+        answer_cache = ingest_service.answer_cache
+        use_cache = answer_cache.enabled and not sources
+        version = answer_cache.version
+        query_embedding = await Settings.embed_model.aget_query_embedding(query)
+        if use_cache:
+            cached = answer_cache.lookup(query_embedding, retrieval_mode)
+            if cached is not None:
+                answer_cache.record_saved(cached, time.perf_counter() - started_at)
+                for token in answer_cache.replay(cached.answer):
+                    yield token
+                return
+
+        nodes = await self.aretrieve(
+            query,
+            query_embedding=query_embedding,
+            retrieval_mode=retrieval_mode,
+            sources=sources,
+        )
+        nodes = ingest_service.context_assembler.postprocess_nodes(
+            nodes, query_str=query
+        )
+        # same prompt as the query engine; its async synthesizer cannot stream
+        context_chunks = Settings.prompt_helper.truncate(
+            prompt=DEFAULT_TEXT_QA_PROMPT_SEL,
+            text_chunks=[self.get_context_str(nodes)],
+            llm=Settings.llm,
+        )
+        token_gen = await Settings.llm.astream(
+            DEFAULT_TEXT_QA_PROMPT_SEL,
+            context_str="\n".join(context_chunks),
+            query_str=query,
+        )
+
+        answer = ""
+        async for token in token_gen:
+            answer += token
             yield token
 
-        self.message_service.create_message(
+        if use_cache:
+            answer_cache.add(
+                query=query,
+                query_embedding=query_embedding,
+                answer=answer,
+                sources=self.get_sources(nodes),
+                seconds=time.perf_counter() - started_at,
+                version=version,
+                retrieval_mode=retrieval_mode,
+            )
+
+    async def aconversation(
+        self,
+        query: str,
+        session_id: str,
+        retrieval_mode: Optional[str] = None,
+        sources: Optional[List[str]] = None,
+    ) -> AsyncGenerator[str, None]:
+        """Answer in a conversation, streaming tokens, then save both messages."""
+
+        ingest_service = await aget_ingest_service()
+        history = await self.message_service.aget_messages_by_session_id(session_id)
+        memory = self.to_memory(history)
+        memory.put(ChatMessage(content=query, role=MessageRole.USER))
+
+        # same messages as the "context" chat engine builds
+        nodes = await self.aretrieve(
+            query, retrieval_mode=retrieval_mode, sources=sources
+        )
+        nodes = ingest_service.context_assembler.postprocess_nodes(
+            nodes, query_str=query
+        )
+        system_message = ChatMessage(
+            content=CONVERSATION_SYSTEM_PROMPT.strip()
+            + "\n"
+            + DEFAULT_CONTEXT_TEMPLATE.format(context_str=self.get_context_str(nodes)),
+            role=Settings.llm.metadata.system_role,
+        )
+        initial_token_count = tokenizer.count(system_message.content)
+        messages = [system_message, *memory.get(initial_token_count=initial_token_count)]
+
+        answer = ""
+        response_gen = await Settings.llm.astream_chat(messages)
+        async for response in response_gen:
+            answer += response.delta or ""
+            yield response.delta or ""
+
+        await self.message_service.acreate_message(
             message=MessageCreateModel(
                 session_id=session_id,
                 message=query,
                 sender="user",
             )
         )
-        self.message_service.create_message(
+        await self.message_service.acreate_message(
             message=MessageCreateModel(
                 session_id=session_id,
-                message=str(response),
+                message=answer,
                 sender="assistant",
             )
         )
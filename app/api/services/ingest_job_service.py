@@ -0,0 +1,203 @@
+"""Ingest job service module."""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from pymongo.errors import DuplicateKeyError
+
+from app.api.database.execute.ingest_job_execute import IngestJobExecute
+from app.api.database.models.ingest_job import IngestJobModel
+from app.api.errors.error_message import SourceBusyError
+from app.api.services.ingest_service import get_ingest_service
+from app.core.config import config
+from app.logger.logger import custom_logger
+
+ingest_job_execute = IngestJobExecute()
+
+
+class IngestJobService:
+    """
+    Run ingests in the background.
+
+    Jobs are persisted in the `ingest_jobs` collection and executed by a bounded
+    pool of worker threads, so requests return as soon as the job is queued.
+    """
+
+    def __init__(self, max_workers: int = None) -> None:
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers or config.INGEST_WORKERS,
+            thread_name_prefix="ingest-job",
+        )
+
+    def submit_file(
+        self, file_path: str, content_hash: str = None, upsert: bool = False
+    ) -> IngestJobModel:
+        """
+        Queue the ingest of a file saved in the local data folder, deleting the file
+        when the job is refused.
+        """
+        job = IngestJobModel(
+            kind="file",
+            source=os.path.basename(file_path),
+            file_path=file_path,
+            content_hash=content_hash,
+            upsert=upsert,
+        )
+
+        try:
+            return self.submit(job)
+        except ValueError:
+            ingest_helper = get_ingest_service().ingest_helper
+            if ingest_helper.is_staged(file_path):
+                ingest_helper.discard_staged_file(file_path)
+            else:
+                ingest_helper.delete_file(job.source)
+            raise
+
+    def submit_url(self, url: str, upsert: bool = False) -> IngestJobModel:
+        """Queue the ingest of a URL."""
+        job = IngestJobModel(kind="url", source=url, upsert=upsert)
+
+        return self.submit(job)
+
+    def submit(self, job: IngestJobModel) -> IngestJobModel:
+        """
+        Persist a job and hand it to the worker pool.
+
+        The job claims its source until it finishes, a unique index refuses the jobs
+        submitted for it meanwhile. A source already ingested is only ingested again
+        by an upsert.
+        """
+        job.claim = job.source
+        try:
+            created_job = IngestJobModel(**ingest_job_execute.create_job(job))
+        except DuplicateKeyError:
+            raise ValueError(SourceBusyError(job.source))
+
+        if not job.upsert:
+            try:
+                # checked once claimed: a job catalogs its source before releasing it
+                get_ingest_service().check_source_new(job.source)
+            except ValueError:
+                ingest_job_execute.delete_job(created_job.id)
+                raise
+
+        self.executor.submit(self.run_job, created_job.id)
+        custom_logger.info(f"Queued ingest job {created_job.id} for {job.source}")
+
+        return created_job
+
+    @staticmethod
+    def get_job_by_id(job_id: str):
+        """Get an ingest job by id."""
+        job = ingest_job_execute.get_job_by_id(job_id)
+        if job:
+            return IngestJobModel(**job)
+
+    def resume_jobs(self, requeue_running: bool = None) -> int:
+        """
+        Queue again the jobs that were not finished when the app stopped.
+
+        Jobs left running are requeued first when `requeue_running`, by default
+        REQUEUE_RUNNING_JOBS. Under gunicorn the master process does it once, as a
+        worker restarting later would take over the jobs of its siblings.
+        """
+        if requeue_running is None:
+            requeue_running = config.REQUEUE_RUNNING_JOBS
+        if requeue_running:
+            ingest_job_execute.requeue_running_jobs()
+
+        jobs = [IngestJobModel(**job) for job in ingest_job_execute.get_queued_jobs()]
+        for job in jobs:
+            # another worker may take it first, `start_job` runs it once
+            self.executor.submit(self.run_job, job.id)
+
+        if jobs:
+            custom_logger.info(f"Resumed {len(jobs)} ingest jobs")
+
+        return len(jobs)
+
+    @staticmethod
+    def run_job(job_id: str):
+        """Parse, chunk, embed and insert the source of a job."""
+        job = ingest_job_execute.start_job(job_id)
+        if job is None:
+            # already taken by another worker
+            return
+        job = IngestJobModel(**job)
+        ingest_service = get_ingest_service()
+        if job.attempts and not job.upsert:
+            # an interrupted run: drop what it already inserted, then start over.
+            # Upserts are safe to run again as they are.
+            ingest_service.delete_inserted_nodes(job.source, job.node_ids)
+        inserted_node_ids: List[str] = []
+
+        def progress_callback(stage: str, progress: float):
+            ingest_job_execute.update_job(job_id, stage=stage, progress=round(progress, 3))
+
+        def insert_callback(node_ids: List[str]):
+            # saved before the insert, for the next attempt if this one is interrupted
+            inserted_node_ids.extend(node_ids)
+            ingest_job_execute.update_job(job_id, node_ids=node_ids)
+
+        try:
+            if job.kind == "file":
+                documents = ingest_service.ingest_saved_file(
+                    job.file_path,
+                    progress_callback=progress_callback,
+                    upsert=job.upsert,
+                    content_hash=job.content_hash,
+                    insert_callback=insert_callback,
+                )
+                if ingest_service.ingest_helper.is_staged(job.file_path):
+                    # the upsert is indexed, its upload replaces the previous file
+                    ingest_service.ingest_helper.publish_staged_file(job.file_path)
+            else:
+                documents = ingest_service.ingest_url(
+                    job.source,
+                    progress_callback=progress_callback,
+                    upsert=job.upsert,
+                    insert_callback=insert_callback,
+                )
+
+            ingest_job_execute.update_job(
+                job_id,
+                status="completed",
+                stage="completed",
+                progress=1.0,
+                documents_count=len(documents),
+                claim=None,
+            )
+            custom_logger.info(f"Ingest job {job_id} completed")
+
+        except Exception as e:
+            custom_logger.exception(e)
+            try:
+                if job.upsert:
+                    # keep the version already indexed, and its file; the upsert can
+                    # be submitted again
+                    if job.kind == "file" and ingest_service.ingest_helper.is_staged(
+                        job.file_path
+                    ):
+                        ingest_service.ingest_helper.discard_staged_file(job.file_path)
+                else:
+                    # leave nothing half ingested, so the source can be submitted again
+                    ingest_service.delete_inserted_nodes(job.source, inserted_node_ids)
+                    if job.kind == "file":
+                        ingest_service.ingest_helper.delete_file(job.source)
+            finally:
+                # released once cleaned up, the source is this job's until then
+                ingest_job_execute.update_job(
+                    job_id,
+                    status="failed",
+                    error=str(e) or e.__class__.__name__,
+                    claim=None,
+                )
+
+    def shutdown(self):
+        """Stop accepting jobs; running jobs are resumed on next startup."""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+ingest_job_service = IngestJobService()
@@ -1,31 +1,84 @@
 """Ingest Service Module"""
 
+import importlib
+import json
 import os
-from io import BytesIO
-from typing import List, Dict, Type
+import time
+from typing import (
+    AsyncGenerator,
+    BinaryIO,
+    Callable,
+    List,
+    Dict,
+    Optional,
+    Tuple,
+    Type,
+)
 from pathlib import Path
 from llama_index.core import VectorStoreIndex
-from llama_index.core.schema import Document, TextNode, BaseNode
+from llama_index.core.schema import Document, BaseNode, NodeRelationship
 from llama_index.core.indices import VectorStoreIndex, load_index_from_storage
 from llama_index.core.storage import StorageContext
 from llama_index.core.readers import StringIterableReader
 from llama_index.core.readers.base import BaseReader
-from llama_index.embeddings.openai import OpenAIEmbedding
-from llama_index.core.node_parser import SentenceSplitter
 
-from app.api.database.mongo_db import vector_store, index_store, doc_store
+from app.api.database.mongo_db import get_doc_store, get_index_store
+from app.api.database.vector_db import get_vector_store
 from app.api.database.execute.docs_execute import DocsExecute
+from app.api.database.execute.source_execute import SourceExecute
+from app.api.database.models.source import SourceModel
 from app.api.helpers.ingest_helper import IngestHelper
-from app.api.helpers.readers.remote_reader import RemoteReader
+from app.api.helpers.embedding_pipeline import EmbeddingPipeline
+from app.api.helpers.answer_cache import AnswerCache
+from app.api.helpers.embedding_cache import EmbeddingCache
+from app.api.helpers.context_assembler import ContextAssembler
+from app.api.helpers.index_sync import IndexSync
+from app.api.helpers.keyword_index import KeywordIndex
+from app.api.helpers.reranker import RetrievalPipeline, get_reranker
+from app.api.helpers.tokenizer import (
+    TOKEN_COUNT_KEY,
+    CachedSentenceSplitter,
+    tokenizer,
+)
+from app.api.helpers.parse_executor import ParseExecutor
 from app.api.errors.error_message import (
     UnsupportedFileTypeError,
-    FileTooLargeError,
     FileExistsError,
+    SourceExistsError,
 )
 from app.core.config import config
+from app.core.container import container
 from app.logger.logger import custom_logger
 
 docs_execute = DocsExecute()
+source_execute = SourceExecute()
+
+INDEX_ID = "mongo-index"
+
+# called with (stage, progress between 0 and 1) while a source is ingested
+ProgressCallback = Callable[[str, float], None]
+# called with the ids of the nodes an ingest is about to insert
+InsertCallback = Callable[[List[str]], None]
+
+# module and class of the reader of every file type, imported on first use
+FILE_READERS: Dict[str, Tuple[str, str]] = {
+    ".hwp": ("llama_index.readers.file.docs", "HWPReader"),
+    ".pdf": ("llama_index.readers.file.docs", "PDFReader"),
+    ".docx": ("llama_index.readers.file.docs", "DocxReader"),
+    ".pptx": ("llama_index.readers.file.slides", "PptxReader"),
+    ".ppt": ("llama_index.readers.file.slides", "PptxReader"),
+    ".pptm": ("llama_index.readers.file.slides", "PptxReader"),
+    ".jpg": ("llama_index.readers.file.image", "ImageReader"),
+    ".png": ("llama_index.readers.file.image", "ImageReader"),
+    ".jpeg": ("llama_index.readers.file.image", "ImageReader"),
+    ".mp3": ("llama_index.readers.file.video_audio", "VideoAudioReader"),
+    ".mp4": ("llama_index.readers.file.video_audio", "VideoAudioReader"),
+    ".csv": ("llama_index.readers.file.tabular", "PandasCSVReader"),
+    ".epub": ("llama_index.readers.file.epub", "EpubReader"),
+    ".md": ("llama_index.readers.file.markdown", "MarkdownReader"),
+    ".mbox": ("llama_index.readers.file.mbox", "MboxReader"),
+    ".ipynb": ("llama_index.readers.file.ipynb", "IPYNBReader"),
+}
 
 
 class IngestService:
@@ -33,90 +86,220 @@ class IngestService:
 
     def __init__(self) -> None:
         self.ingest_helper = IngestHelper()
-        self.default_file_reader_cls = self.get_file_reader_cls()
-        self.index = self.get_or_create_index()
+        self.embedding_cache = EmbeddingCache()
+        self.embedding_pipeline = EmbeddingPipeline(cache=self.embedding_cache)
+        self.parse_executor = ParseExecutor()
+        # shared by every ingest job, token counts of its splits are memoized
+        self.node_parser = CachedSentenceSplitter(
+            chunk_size=1024, chunk_overlap=200, tokenizer=tokenizer.encode
+        )
+        # ingest jobs run on worker threads, and in the other worker processes;
+        # index writes must not interleave
+        self.index_sync = IndexSync(INDEX_ID, reload=self.reload_index)
+        self.index_lock = self.index_sync
+        self.index_sync.load(self.load_index)
+        self.retrieval_pipeline = RetrievalPipeline(get_reranker())
+        self.context_assembler = ContextAssembler()
+        self.answer_cache = AnswerCache()
+        self.index_sync.start()
 
     @staticmethod
-    def get_file_reader_cls() -> Dict[str, Type[BaseReader]]:
+    def get_file_reader_cls(extension: str) -> Optional[Type[BaseReader]]:
         """
-        Get reader classes for different file types.
+        Get the reader class of a file type, None to read it as plain text.
 
+        Only the module of that reader is imported, on the first file of the type.
         supported file types:
         .hwp, .pdf, .docx, .pptx, .ppt, .pptm, .jpg, .png, .jpeg, .mp3, .mp4, .csv, .epub, .md, .mbox, .ipynb
         """
+        if extension not in FILE_READERS:
+            return None
+
+        module_name, class_name = FILE_READERS[extension]
         try:
-            from llama_index.readers.file import (
-                DocxReader,
-                EpubReader,
-                HWPReader,
-                ImageReader,
-                IPYNBReader,
-                MarkdownReader,
-                MboxReader,
-                PandasCSVReader,
-                PDFReader,
-                PptxReader,
-                VideoAudioReader,
-            )
+            module = importlib.import_module(module_name)
         except ImportError:
             raise ImportError("`llama-index-readers-file` package not found")
 
-        default_file_reader_cls: Dict[str, Type[BaseReader]] = {
-            ".hwp": HWPReader,
-            ".pdf": PDFReader,
-            ".docx": DocxReader,
-            ".pptx": PptxReader,
-            ".ppt": PptxReader,
-            ".pptm": PptxReader,
-            ".jpg": ImageReader,
-            ".png": ImageReader,
-            ".jpeg": ImageReader,
-            ".mp3": VideoAudioReader,
-            ".mp4": VideoAudioReader,
-            ".csv": PandasCSVReader,
-            ".epub": EpubReader,
-            ".md": MarkdownReader,
-            ".mbox": MboxReader,
-            ".ipynb": IPYNBReader,
-        }
-        return default_file_reader_cls
+        return getattr(module, class_name)
+
+    def save_upload(
+        self, file_obj: BinaryIO, file_name: str, upsert: bool = False
+    ) -> Tuple[str, str]:
+        """
+        Validate an uploaded file and stream it to the local data folder.
 
-    def ingest_file(self, file_content: BytesIO, file_name: str) -> List[Document]:
-        """Ingest a file into the index."""
+        With `upsert`, the file is saved to a staging path of its own instead, and
+        replaces the file of the same name only once it is ingested, so a failed
+        upsert leaves the indexed version and its file as they were. Returns the
+        saved file path and the sha256 of its content.
+        """
 
         if not self.ingest_helper.allowed_file(file_name):
             raise ValueError(UnsupportedFileTypeError)
 
-        if self.ingest_helper.check_file_size(file_content):
-            raise ValueError(FileTooLargeError)
-
         file_path = os.path.join(config.LOCAL_DATA_FOLDER, file_name)
-        if self.ingest_helper.check_file_exists(file_path):
+        if upsert:
+            file_path = self.ingest_helper.make_staging_path(file_name)
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        elif self.ingest_helper.check_file_exists(file_path):
             raise ValueError(FileExistsError)
+        else:
+            self.check_source_new(file_name)
 
-        self.ingest_helper.save_to_folder(file_content, file_path)
+        try:
+            _, content_hash = self.ingest_helper.stream_to_folder(
+                file_obj, file_path, overwrite=False
+            )
+        except Exception:
+            if upsert:
+                self.ingest_helper.discard_staged_file(file_path)
+            raise
+
+        return file_path, content_hash
+
+    def ingest_saved_file(
+        self,
+        file_path: str,
+        progress_callback: Optional[ProgressCallback] = None,
+        upsert: bool = False,
+        content_hash: Optional[str] = None,
+        insert_callback: Optional[InsertCallback] = None,
+    ) -> List[Document]:
+        """
+        Ingest a file already saved in the local data folder into the index.
+
+        With `upsert`, the file replaces what is indexed under its name.
+        `content_hash` is the sha256 of the file, computed again when not given.
+        """
 
+        self.report_progress(progress_callback, "parsing", 0.0)
         documents = self.convert_file_to_docs(file_path=file_path)
 
-        self.add_nodes(documents=documents)
+        if upsert:
+            self.upsert_nodes(
+                documents=documents,
+                source=Path(file_path).name,
+                progress_callback=progress_callback,
+            )
+        else:
+            self.add_nodes(
+                documents=documents,
+                progress_callback=progress_callback,
+                insert_callback=insert_callback,
+            )
+        self.catalog_sources(
+            documents,
+            Path(file_path).name,
+            content_hash or self.ingest_helper.hash_file(file_path),
+        )
+        self.invalidate_answers(documents, Path(file_path).name)
 
         return documents
 
-    def ingest_url(self, url: str) -> List[Document]:
-        """Ingest content from a URL into the index."""
+    def ingest_url(
+        self,
+        url: str,
+        progress_callback: Optional[ProgressCallback] = None,
+        upsert: bool = False,
+        insert_callback: Optional[InsertCallback] = None,
+    ) -> List[Document]:
+        """Ingest content from a URL into the index, replacing it with `upsert`."""
 
+        self.report_progress(progress_callback, "parsing", 0.0)
         documents = self.convert_url_to_docs(url)
-        self.add_nodes(documents=documents)
+
+        if upsert:
+            self.upsert_nodes(
+                documents=documents, source=url, progress_callback=progress_callback
+            )
+        else:
+            self.add_nodes(
+                documents=documents,
+                progress_callback=progress_callback,
+                insert_callback=insert_callback,
+            )
+        self.catalog_sources(documents, url)
+        self.invalidate_answers(documents, url)
 
         return documents
 
+    def invalidate_answers(self, documents: List[Document], source: str) -> int:
+        """Drop the cached answers built from the sources of ingested documents."""
+        sources = {document.metadata.get("source", source) for document in documents}
+        sources.add(source)
+
+        return self.answer_cache.invalidate_sources(sources)
+
+    @staticmethod
+    def check_source_new(source: str) -> None:
+        """Refuse to ingest a source again, only an upsert replaces what it holds."""
+        if source_execute.get_source(source):
+            raise ValueError(SourceExistsError(source))
+
+    def catalog_sources(
+        self,
+        documents: List[Document],
+        source: str,
+        content_hash: Optional[str] = None,
+    ) -> List[SourceModel]:
+        """
+        Write the catalog entries of the sources of ingested documents.
+
+        Documents, nodes and text bytes are counted over what the sources hold
+        once ingested, in one aggregation. `content_hash` is that of `source`; other
+        sources, and `source` without one, are hashed from their documents' text.
+        """
+        documents_by_source: Dict[str, List[Document]] = {source: []}
+        for document in documents:
+            documents_by_source.setdefault(
+                document.metadata.get("source", source), []
+            ).append(document)
+
+        entries = []
+        with self.index_lock:
+            stats = docs_execute.get_source_stats(list(documents_by_source))
+            for group in stats:
+                name = group["_id"]
+                entry = SourceModel(
+                    source=name,
+                    doc_ids=sorted(group["doc_ids"]),
+                    node_count=group["node_count"],
+                    size=group["size"],
+                    content_hash=(
+                        content_hash
+                        if name == source and content_hash
+                        else self.ingest_helper.hash_texts(
+                            document.text for document in documents_by_source[name]
+                        )
+                    ),
+                    embedding_model=config.EMBEDDING_MODEL_NAME,
+                )
+                source_execute.upsert_source(entry)
+                entries.append(entry)
+
+            # sources left without nodes, like a URL whose documents name others
+            empty = set(documents_by_source) - {group["_id"] for group in stats}
+            if empty:
+                source_execute.delete_sources(list(empty))
+
+        return entries
+
+    @staticmethod
+    def report_progress(
+        progress_callback: Optional[ProgressCallback], stage: str, progress: float
+    ):
+        """Report the stage of an ingest, if someone is listening."""
+        if progress_callback is not None:
+            progress_callback(stage, progress)
+
     def convert_file_to_docs(self, file_path: str) -> list[Document]:
         """Convert a file to documents."""
         file_path = Path(file_path)
         file_name = file_path.name
         custom_logger.debug(f"Converting {file_name} into documents")
         extension = file_path.suffix
-        reader = self.default_file_reader_cls.get(extension)
+        reader = self.get_file_reader_cls(extension)
 
         if reader is None:
             custom_logger.debug(
@@ -128,9 +311,12 @@ class IngestService:
 
         else:
             custom_logger.debug(f"Specific reader found for {extension}")
-            documents = reader().load_data(file_path)
+            documents = self.parse_executor.parse(str(file_path), reader)
 
-        for document in documents:
+        for position, document in enumerate(documents):
+            # stable ids keep the embedded text, and so the embedding cache key,
+            # identical when the same file is ingested again
+            document.doc_id = self.ingest_helper.make_doc_id(file_name, position)
             document.metadata["doc_id"] = document.doc_id
             document.metadata["source"] = file_name
             document.text = self.ingest_helper.strip_consecutive_newlines(
@@ -142,9 +328,15 @@ class IngestService:
     def convert_url_to_docs(self, url: str) -> List[Document]:
         """Convert a url to documents."""
 
+        # imported here, its web and youtube readers are only needed for URLs
+        from app.api.helpers.readers.remote_reader import RemoteReader
+
         loader = RemoteReader()
         documents = loader.load_data(url)
-        for document in documents:
+        for position, document in enumerate(documents):
+            document.doc_id = self.ingest_helper.make_doc_id(
+                document.metadata.get("source", url), position
+            )
             document.metadata["doc_id"] = document.doc_id
             document.text = self.ingest_helper.strip_consecutive_newlines(
                 document.text
@@ -157,17 +349,15 @@ class IngestService:
         """Get or create an index."""
 
         storage_context = StorageContext.from_defaults(
-            docstore=doc_store,
-            index_store=index_store,
-            vector_store=vector_store,
+            docstore=get_doc_store(),
+            index_store=get_index_store(),
+            vector_store=get_vector_store(),
         )
 
         existing_indexes = docs_execute.get_existing_indexes()
         if len(existing_indexes) > 0:
             index = load_index_from_storage(
-                storage_context=storage_context,
-                store_nodes_override=True,
-                show_progress=True,
+                storage_context=storage_context, store_nodes_override=True
             )
             custom_logger.info(f"Loaded vector store index from storage")
             return index
@@ -177,18 +367,104 @@ class IngestService:
             storage_context=storage_context,
             store_nodes_override=True,
             show_progress=True,
-            index_id="mongo-index",
+            index_id=INDEX_ID,
         )
-        index.set_index_id("mongo-index")
+        index.set_index_id(INDEX_ID)
         custom_logger.info(f"Created a new vector store index")
 
         return index
 
+    def load_index(self) -> None:
+        """Load the index, the keyword index and the source catalog."""
+        self.index = self.get_or_create_index()
+        self.keyword_index = self.get_or_build_keyword_index()
+        self.build_source_catalog()
+
+    def reload_index(self) -> None:
+        """
+        Load the changes another worker made to the index, with the index lock held.
+
+        The keyword index and the local vector store are reloaded in place, as
+        requests being served hold them. Every cached answer is dropped, since the changed
+        sources are not known.
+        """
+        vector_store = self.index.vector_store
+        if hasattr(vector_store, "reload"):
+            # the local store keeps its rows in memory; the others are remote
+            vector_store.reload()
+        self.index = load_index_from_storage(
+            storage_context=self.index.storage_context, store_nodes_override=True
+        )
+        self.keyword_index.reload()
+        self.answer_cache.invalidate_all()
+
+    @staticmethod
+    def get_or_build_keyword_index(batch_size: int = 10000) -> KeywordIndex:
+        """
+        Load the keyword index, rebuilding it from the docstore when it does not
+        hold as many nodes as the docstore.
+        """
+        keyword_index = KeywordIndex(config.KEYWORD_INDEX_PATH)
+        node_count = docs_execute.count_nodes()
+        if len(keyword_index) == node_count:
+            return keyword_index
+
+        custom_logger.info(f"Rebuilding the keyword index over {node_count} nodes")
+        keyword_index.clear()
+        batch = []
+        for node in docs_execute.iter_node_texts():
+            batch.append(node)
+            if len(batch) == batch_size:
+                keyword_index.add(batch)
+                batch = []
+        keyword_index.add(batch)
+
+        return keyword_index
+
+    @staticmethod
+    def build_source_catalog() -> int:
+        """
+        Fill an empty source catalog from the docstore, for nodes ingested before
+        the catalog existed. Their content hash and embedding model are unknown.
+        """
+        if source_execute.count_sources() > 0 or docs_execute.count_nodes() == 0:
+            return 0
+
+        stats = docs_execute.get_source_stats()
+        for group in stats:
+            source_execute.upsert_source(
+                SourceModel(
+                    source=group["_id"],
+                    doc_ids=sorted(group["doc_ids"]),
+                    node_count=group["node_count"],
+                    size=group["size"],
+                )
+            )
+        custom_logger.info(f"Built the source catalog of {len(stats)} sources")
+
+        return len(stats)
+
+    def index_keywords(self, nodes: List[BaseNode]) -> int:
+        """Add the text of nodes to the keyword index."""
+        return self.keyword_index.add(
+            (node.node_id, node.get_content(), node.metadata.get("source"))
+            for node in nodes
+        )
+
     def add_docs(self, documents: List[Document]) -> List[Document]:
         """Add documents to the index."""
         custom_logger.debug(f"Adding {len(documents)} documents into the index")
-        for document in documents:
-            self.index.insert(document, show_progress=True)
+        with self.index_lock:
+            for document in documents:
+                self.index.insert(document, show_progress=True)
+            self.index_sync.mark_changed()
+
+            node_ids = []
+            for document in documents:
+                ref_doc_info = self.index.docstore.get_ref_doc_info(document.doc_id)
+                if ref_doc_info is not None:
+                    node_ids.extend(ref_doc_info.node_ids)
+            self.index_keywords(docs_execute.get_nodes(node_ids))
 
         custom_logger.debug(
             f"Succesfully added {len(documents)} documents into the index"
@@ -196,50 +472,236 @@ class IngestService:
 
         return documents
 
-    def add_nodes(self, documents: List[Document]) -> List[BaseNode]:
-        """Add nodes to the index."""
-        parser = SentenceSplitter(chunk_size=1024, chunk_overlap=200)
-        nodes = parser.get_nodes_from_documents(documents, show_progress=True)
-
-        # use multiple api keys to avoid rate limits and increase speed
-        list_api_keys = config.OPENAI_API_KEY_EMBEDDINGS
-        usage_counts = {key: 0 for key in list_api_keys}
-        api_key_index = 0
-        embed_model = OpenAIEmbedding(
-            api_key=list_api_keys[api_key_index], model="text-embedding-3-small"
+    def add_nodes(
+        self,
+        documents: List[Document],
+        progress_callback: Optional[ProgressCallback] = None,
+        insert_callback: Optional[InsertCallback] = None,
+    ) -> List[BaseNode]:
+        """
+        Add nodes to the index.
+
+        `insert_callback` gets the ids of the nodes before they are inserted, so a
+        failed ingest can delete what it inserted and nothing else.
+        """
+        self.report_progress(progress_callback, "chunking", 0.2)
+        nodes = self.split_documents(documents)
+
+        self.embed_nodes(nodes, progress_callback)
+
+        self.report_progress(progress_callback, "inserting", 0.9)
+        if insert_callback is not None:
+            insert_callback([node.node_id for node in nodes])
+        with self.index_lock:
+            self.index.insert_nodes(nodes, show_progress=True)
+            self.index_keywords(nodes)
+            self.index_sync.mark_changed()
+
+        return nodes
+
+    def upsert_nodes(
+        self,
+        documents: List[Document],
+        source: str,
+        progress_callback: Optional[ProgressCallback] = None,
+    ) -> List[BaseNode]:
+        """
+        Replace the nodes of a source, touching only the chunks that changed.
+
+        Chunks are compared by content hash with the nodes stored under the source:
+        unchanged chunks are kept as they are, new or changed chunks are embedded and
+        inserted, and stored chunks that no longer exist are deleted.
+        """
+        self.report_progress(progress_callback, "chunking", 0.2)
+        nodes = self.split_documents(documents)
+
+        stored_hashes = docs_execute.get_node_hashes_by_source(source)
+        new_nodes, stale_node_ids = self.diff_nodes(nodes, stored_hashes)
+        custom_logger.debug(
+            f"Upserting {source}: {len(nodes) - len(new_nodes)} chunks unchanged, "
+            f"{len(new_nodes)} to insert, {len(stale_node_ids)} to delete"
         )
 
-        for node in nodes:
-            # if usage count is greater than 3, switch to the next api key
-            if usage_counts[list_api_keys[api_key_index]] >= 3:
-                api_key_index = (api_key_index + 1) % len(list_api_keys)
-                usage_counts[list_api_keys[api_key_index]] = 0
-                embed_model = OpenAIEmbedding(
-                    api_key=list_api_keys[api_key_index], model="text-embedding-3-small"
-                )
+        self.embed_nodes(new_nodes, progress_callback)
 
-            node_embedding = embed_model.get_text_embedding(
-                node.get_content(metadata_mode="all")
-            )
-            node.embedding = node_embedding
-            usage_counts[list_api_keys[api_key_index]] += 1
+        # insert before deleting, so the source is never missing from the index
+        self.report_progress(progress_callback, "inserting", 0.9)
+        with self.index_lock:
+            if new_nodes:
+                self.index.insert_nodes(new_nodes, show_progress=True)
+                self.index_keywords(new_nodes)
+                self.index_sync.mark_changed()
+            self.delete_nodes(stale_node_ids)
+
+        return new_nodes
+
+    def split_documents(self, documents: List[Document]) -> List[BaseNode]:
+        """
+        Split documents into chunks, storing the token count of every chunk in its
+        metadata, hidden from the embedding and the LLM.
+        """
+        nodes = self.node_parser.get_nodes_from_documents(
+            documents, show_progress=True
+        )
 
-        self.index.insert_nodes(nodes, show_progress=True)
+        counts = tokenizer.count_batch([node.get_content() for node in nodes])
+        for node, count in zip(nodes, counts):
+            node.metadata = {**node.metadata, TOKEN_COUNT_KEY: count}
+            node.excluded_embed_metadata_keys = [
+                *node.excluded_embed_metadata_keys,
+                TOKEN_COUNT_KEY,
+            ]
+            node.excluded_llm_metadata_keys = [
+                *node.excluded_llm_metadata_keys,
+                TOKEN_COUNT_KEY,
+            ]
 
         return nodes
 
-    def get_docs(self) -> List[TextNode]:
-        """Get all documents."""
-        documents = self.index.docstore.docs.values()
+    @staticmethod
+    def diff_nodes(
+        nodes: List[BaseNode], stored_hashes: Dict[str, str]
+    ) -> Tuple[List[BaseNode], List[str]]:
+        """
+        Match chunks against stored node hashes.
+
+        Returns the chunks that are not stored yet and the ids of the stored nodes
+        that matched no chunk. Chunks matching a stored node take over its id, so the
+        prev/next links of the new chunks point to nodes that exist.
+        """
+        stored_ids_by_hash: Dict[str, List[str]] = {}
+        for node_id, node_hash in stored_hashes.items():
+            stored_ids_by_hash.setdefault(node_hash, []).append(node_id)
+
+        new_nodes = []
+        kept_ids: Dict[str, str] = {}
+        for node in nodes:
+            stored_ids = stored_ids_by_hash.get(node.hash)
+            if stored_ids:
+                kept_ids[node.node_id] = stored_ids.pop()
+            else:
+                new_nodes.append(node)
+
+        for node in new_nodes:
+            for relation in (NodeRelationship.PREVIOUS, NodeRelationship.NEXT):
+                related = node.relationships.get(relation)
+                if related is not None and related.node_id in kept_ids:
+                    related.node_id = kept_ids[related.node_id]
+
+        stale_node_ids = [
+            node_id for node_ids in stored_ids_by_hash.values() for node_id in node_ids
+        ]
+
+        return new_nodes, stale_node_ids
+
+    def embed_nodes(
+        self,
+        nodes: List[BaseNode],
+        progress_callback: Optional[ProgressCallback] = None,
+    ) -> List[BaseNode]:
+        """Embed nodes in batches, spread concurrently over the embedding api keys."""
+        self.report_progress(progress_callback, "embedding", 0.3)
+
+        return self.embedding_pipeline.embed_nodes(
+            nodes,
+            progress_callback=lambda done: self.report_progress(
+                progress_callback, "embedding", 0.3 + 0.6 * done
+            ),
+        )
 
-        return list(documents)
+    def delete_nodes(self, node_ids: List[str]) -> int:
+        """Delete nodes from the stores and the index struct."""
+        if not node_ids:
+            return 0
+
+        with self.index_lock:
+            deleted_count = docs_execute.delete_nodes(node_ids)
+            self.index.vector_store.delete_nodes(node_ids)
+            self.keyword_index.delete(node_ids)
+            docs_execute.remove_nodes_from_ref_docs(node_ids)
+            self.remove_from_index_struct(node_ids)
+
+        return deleted_count
+
+    def delete_inserted_nodes(self, source: str, node_ids: List[str]) -> int:
+        """
+        Delete the nodes an ingest of `source` inserted, and the catalog entry of the
+        source when no node is left under it.
+        """
+        with self.index_lock:
+            deleted_count = self.delete_nodes(node_ids)
+            if not docs_execute.get_source_stats([source]):
+                source_execute.delete_sources([source])
+        self.answer_cache.invalidate_sources([source])
+
+        return deleted_count
+
+    def remove_from_index_struct(self, node_ids: List[str]):
+        """Drop nodes from the index struct and save it once."""
+        with self.index_lock:
+            for node_id in node_ids:
+                self.index.index_struct.nodes_dict.pop(node_id, None)
+            self.index.storage_context.index_store.add_index_struct(
+                self.index.index_struct
+            )
+            self.index_sync.mark_changed()
+
+    @staticmethod
+    def to_document(doc: dict) -> dict:
+        """Flatten a stored node into the fields listed by the documents endpoints."""
+        data = doc.get("__data__", {})
+        metadata = data.get("metadata", {})
+        document = {
+            "id": doc["_id"],
+            "source": metadata.get("source"),
+            "doc_id": metadata.get("doc_id"),
+            "metadata": metadata,
+            "start_char_idx": data.get("start_char_idx"),
+            "end_char_idx": data.get("end_char_idx"),
+        }
+        for field in ("text", "embedding"):
+            if field in data:
+                document[field] = data[field]
+
+        return document
 
     @staticmethod
-    def get_docs_by_source(source: str) -> List[TextNode]:
-        """Get documents by source."""
-        documents = docs_execute.get_docs_by_source(source=source)
+    async def alist_docs(
+        source: Optional[str] = None,
+        cursor: Optional[str] = None,
+        limit: Optional[int] = None,
+        include_text: bool = False,
+        include_embedding: bool = False,
+    ) -> dict:
+        """
+        Get a page of nodes, of a source or of all of them, in id order.
+
+        `next_cursor` is the id of the last node of the page, passed as `cursor` to
+        get the next one; it is None on the last page. Texts and embeddings are
+        only read when asked for.
+        """
+        limit = min(limit or config.DOCUMENTS_PAGE_SIZE, config.DOCUMENTS_MAX_PAGE_SIZE)
+        # one more node tells whether there is a next page
+        docs = await docs_execute.aget_docs_page(
+            source, cursor, limit + 1, include_text, include_embedding
+        )
 
-        return list(documents)
+        return {
+            "documents": [IngestService.to_document(doc) for doc in docs[:limit]],
+            "next_cursor": docs[limit - 1]["_id"] if len(docs) > limit else None,
+        }
+
+    @staticmethod
+    async def astream_docs(
+        source: Optional[str] = None,
+        include_text: bool = False,
+        include_embedding: bool = False,
+    ) -> AsyncGenerator[str, None]:
+        """Stream every node, of a source or of all of them, as NDJSON lines."""
+        async for doc in docs_execute.aiter_docs(
+            source, include_text, include_embedding
+        ):
+            yield json.dumps(IngestService.to_document(doc)) + "\n"
 
     # def get_files(self) -> List[str]:
     #     """Get all files."""
@@ -249,27 +711,130 @@ class IngestService:
 
     def get_sources(self) -> List[str]:
         """Get all sources."""
-        sources = docs_execute.get_existing_sources()
+        sources = source_execute.get_source_names()
+
+        return sources
+
+    @staticmethod
+    async def aget_sources(sources: Optional[List[str]] = None) -> List[str]:
+        """Get all sources, or those of `sources` that exist, without blocking."""
+        sources = await source_execute.aget_source_names(sources)
 
         return sources
 
-    def delete_docs_by_source(self, source: str):
+    @staticmethod
+    async def aget_catalog() -> dict:
+        """Get the catalog entry of every source, and their totals."""
+        sources = await source_execute.aget_sources()
+
+        return {
+            "sources": [
+                SourceModel(**source).model_dump(mode="json") for source in sources
+            ],
+            "totals": await source_execute.aget_totals(),
+        }
+
+    def get_embedding_cache_stats(self) -> dict:
+        """Get embedding cache hit/miss counters."""
+        return self.embedding_cache.get_stats()
+
+    def get_answer_cache_stats(self) -> dict:
+        """Get answer cache hit/miss counters."""
+        return self.answer_cache.get_stats()
+
+    def get_keyword_index_stats(self) -> dict:
+        """Get the size of the keyword index."""
+        return self.keyword_index.get_stats()
+
+    def get_index_sync_stats(self) -> dict:
+        """Get the index version of this worker and how often it was reloaded."""
+        return self.index_sync.get_stats()
+
+    def delete_sources(self, sources: Optional[List[str]] = None) -> dict:
+        """
+        Delete every node of some sources (all of them when None) in bulk.
+
+        Node ids are resolved with one aggregation, removed from the stores with
+        batched deletes and dropped from the index struct, which is saved once.
+        Returns counts and the time spent in each step, in seconds.
+        """
+        started_at = time.perf_counter()
+        groups = docs_execute.get_nodes_by_sources(sources)
+        node_ids = [node_id for group in groups for node_id in group["node_ids"]]
+        doc_ids = [doc_id for group in groups for doc_id in group["doc_ids"]]
+        resolved_at = time.perf_counter()
+
+        with self.index_lock:
+            nodes_deleted = docs_execute.delete_nodes(node_ids)
+            self.index.vector_store.delete_nodes(node_ids)
+            self.keyword_index.delete(node_ids)
+            docs_execute.delete_ref_docs(doc_ids)
+            source_execute.delete_sources(sources)
+            deleted_at = time.perf_counter()
+            if node_ids:
+                self.remove_from_index_struct(node_ids)
+        finished_at = time.perf_counter()
+
+        self.answer_cache.invalidate_sources(group["_id"] for group in groups)
+
+        result = {
+            "sources": [group["_id"] for group in groups],
+            "doc_ids": doc_ids,
+            "documents_deleted": len(doc_ids),
+            "nodes_deleted": nodes_deleted,
+            "timings": {
+                "resolve": resolved_at - started_at,
+                "delete": deleted_at - resolved_at,
+                "index_struct": finished_at - deleted_at,
+                "total": finished_at - started_at,
+            },
+        }
+        custom_logger.info(
+            f"Deleted {nodes_deleted} nodes of {len(groups)} sources "
+            f"in {result['timings']['total']:.2f}s"
+        )
+
+        return result
+
+    def delete_docs_by_source(self, source: str) -> dict:
         """Delete documents by source."""
-        docs_ids = docs_execute.get_docs_ids_by_source(source)
-        for doc_id in docs_ids:
-            self.index.delete_ref_doc(doc_id, delete_from_docstore=True)
-        return docs_ids
+        return self.delete_sources([source])
 
-    def delete_all_docs(self):
+    def delete_all_docs(self) -> dict:
         """Delete all documents."""
-        sources = self.get_sources()
+        result = self.delete_sources()
 
-        for source in sources:
-            self.delete_docs_by_source(source)
-            if source in self.ingest_helper.get_all_files():
+        files = self.ingest_helper.get_all_files()
+        for source in result["sources"]:
+            if source in files:
                 self.ingest_helper.delete_file(source)
 
-        return sources
+        return result
+
+
+def create_ingest_service() -> IngestService:
+    """Set the RAG models, then load the index and build the ingest service."""
+    # imported here, loading the LLM and embedding clients is part of the startup
+    from app.core.setting_rag import settings
+
+    settings()
+
+    return IngestService()
+
+
+def close_ingest_service(service: IngestService) -> None:
+    service.index_sync.stop()
+    service.parse_executor.shutdown()
+
+
+container.provide("ingest_service", create_ingest_service, close=close_ingest_service)
+
+
+def get_ingest_service() -> IngestService:
+    """Get the ingest service, loading the index on first use."""
+    return container.get("ingest_service")
 
 
-ingest_service = IngestService()
+async def aget_ingest_service() -> IngestService:
+    """Get the ingest service, loading the index on a worker thread on first use."""
+    return await container.aget("ingest_service")
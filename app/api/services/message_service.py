@@ -1,6 +1,7 @@
 """Message service module."""
 
 from app.api.database.execute.message_execute import MessageExecute
+from app.api.helpers.tokenizer import tokenizer
 from app.api.database.models.message import (
     MessageModel,
     MessageCreateModel,
@@ -21,6 +22,7 @@ class MessageService:
             session_id=message.session_id,
             message=message.message,
             sender=message.sender,
+            token_count=tokenizer.count(message.message),
         )
         created_message = message_execute.create_message(new_message)
 
@@ -39,3 +41,31 @@ class MessageService:
         """Delete chat session messages"""
 
         return message_execute.delete_messages_by_session_id(session_id)
+
+    @staticmethod
+    async def acreate_message(message: MessageCreateModel):
+        """Create a new message without blocking the event loop."""
+
+        new_message = MessageModel(
+            session_id=message.session_id,
+            message=message.message,
+            sender=message.sender,
+            token_count=tokenizer.count(message.message),
+        )
+        created_message = await message_execute.acreate_message(new_message)
+
+        return MessageModel(**created_message)
+
+    @staticmethod
+    async def aget_messages_by_session_id(session_id: str):
+        """Get chat session messages without blocking the event loop."""
+
+        messages = await message_execute.aget_messages_by_session_id(session_id)
+
+        return MessageCollectionModel(messages=messages)
+
+    @staticmethod
+    async def adelete_messages_by_session_id(session_id: str):
+        """Delete chat session messages without blocking the event loop."""
+
+        return await message_execute.adelete_messages_by_session_id(session_id)
@@ -1,7 +1,6 @@
 """Session service module."""
 
-from llama_index.core.base.llms.types import ChatMessage, MessageRole
-from llama_index.core.memory import ChatMemoryBuffer
+from typing import List, Optional
 
 from app.api.database.execute.session_execute import SessionExecute
 from app.api.database.models.session import (
@@ -9,60 +8,20 @@ from app.api.database.models.session import (
     SessionCreateModel,
     SessionCollectionModel,
 )
-from app.api.services.message_service import MessageService
-from app.api.services.ingest_service import ingest_service
-from app.api.errors.error_message import SessionNotFoundError
+from app.api.services.ingest_service import IngestService
+from app.api.errors.error_message import SessionNotFoundError, SourceNotFoundError
 
 session_execute = SessionExecute()
-message_service = MessageService()
 
 
 class SessionService:
     """Session Service class for session operations."""
 
-    def query(self, query: str, chat_session_id: str):
-        history = self.get_chat_session_messages(chat_session_id)
-        chat_history = []
-        for message in history:
-            print(message)
-            chat_history.append(
-                ChatMessage(
-                    role=(
-                        MessageRole.USER
-                        if message.sender == "user"
-                        else MessageRole.ASSISTANT
-                    ),
-                    content=message.message,
-                )
-            )
-        memory = ChatMemoryBuffer.from_defaults(chat_history=chat_history)
-        chat_engine = ingest_service.index.as_chat_engine(
-            chat_mode="context",
-            memory=memory,
-            verbose=True,
-        )
-
-        response = chat_engine.chat(message=query)
-
-        session_execute.create_message(
-            chat_session_id=chat_session_id, message=query, sender="user"
-        )
-        session_execute.create_message(
-            chat_session_id=chat_session_id,
-            message=str(response),
-            sender="assistant",
-        )
-
-        return response
-
-        # for token in response.response_gen:
-        #     yield token
-
     @staticmethod
     def create_session(session: SessionCreateModel):
         """Create a new chat session."""
 
-        new_session = SessionModel(user_id=session.user_id)
+        new_session = SessionModel(user_id=session.user_id, sources=session.sources)
         created_session = session_execute.create_session(new_session)
 
         return SessionModel(**created_session)
@@ -88,3 +47,56 @@ class SessionService:
         """Delete chat session by id."""
 
         return session_execute.delete_session_by_id(session_id)
+
+    @staticmethod
+    async def acreate_session(session: SessionCreateModel):
+        """Create a new chat session without blocking the event loop."""
+
+        await SessionService.avalidate_sources(session.sources)
+        new_session = SessionModel(user_id=session.user_id, sources=session.sources)
+        created_session = await session_execute.acreate_session(new_session)
+
+        return SessionModel(**created_session)
+
+    @staticmethod
+    async def aget_session_by_id(session_id: str):
+        """Get chat session by id without blocking the event loop."""
+
+        session = await session_execute.aget_session_by_id(session_id)
+        if session:
+            return SessionModel(**session)
+
+    @staticmethod
+    async def aget_sessions_by_user_id(user_id: str):
+        """Get chat sessions by user id without blocking the event loop."""
+
+        sessions = await session_execute.aget_sessions_by_user_id(user_id)
+        if sessions:
+            return SessionCollectionModel(sessions=sessions)
+
+    @staticmethod
+    async def avalidate_sources(sources: Optional[List[str]]):
+        """Check that every source a session is pinned to is ingested."""
+        if not sources:
+            return
+
+        missing = set(sources) - set(await IngestService.aget_sources(sources))
+        if missing:
+            raise ValueError(SourceNotFoundError(", ".join(sorted(missing))))
+
+    @staticmethod
+    async def aupdate_session_sources(
+        session_id: str, sources: Optional[List[str]]
+    ) -> Optional[SessionModel]:
+        """Pin a chat session to some sources, or unpin it with None."""
+
+        await SessionService.avalidate_sources(sources)
+        session = await session_execute.aupdate_session_sources(session_id, sources)
+        if session:
+            return SessionModel(**session)
+
+    @staticmethod
+    async def adelete_session_by_id(session_id: str):
+        """Delete chat session by id without blocking the event loop."""
+
+        return await session_execute.adelete_session_by_id(session_id)
@@ -1,5 +1,7 @@
 """User service module."""
 
+from fastapi.concurrency import run_in_threadpool
+
 from app.api.database.models.user import UserModel, UserCreateModel, UserCollectionModel
 from app.api.database.execute.user_execute import UserExecute
 from app.api.database.execute.session_execute import SessionExecute
@@ -54,3 +56,47 @@ class UserService:
         """Delete user by ID."""
 
         return user_execute.delete_user_by_id(user_id)
+
+    @staticmethod
+    async def acreate_user(user: UserCreateModel):
+        """Create a new user without blocking the event loop."""
+
+        user_data = UserModel(username=user.username, password=user.password)
+        # bcrypt is slow on purpose, keep it off the event loop
+        user_data.password = await run_in_threadpool(
+            auth_service.get_hashed_password, user_data.password
+        )
+        new_user = await user_execute.acreate_user(user_data)
+        created_user = await user_execute.aget_user_by_id(new_user.inserted_id)
+
+        return UserModel(**created_user)
+
+    @staticmethod
+    async def aget_users():
+        """Get all users without blocking the event loop."""
+
+        users = await user_execute.aget_users()
+
+        return UserCollectionModel(users=users)
+
+    @staticmethod
+    async def aget_user_by_id(user_id: str):
+        """Get user by ID without blocking the event loop."""
+
+        user = await user_execute.aget_user_by_id(user_id)
+        if user:
+            return UserModel(**user)
+
+    @staticmethod
+    async def aget_user_by_username(username: str):
+        """Get user by username without blocking the event loop."""
+
+        user = await user_execute.aget_user_by_username(username)
+        if user:
+            return UserModel(**user)
+
+    @staticmethod
+    async def adelete_user_by_id(user_id: str):
+        """Delete user by ID without blocking the event loop."""
+
+        return await user_execute.adelete_user_by_id(user_id)
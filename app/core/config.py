@@ -17,6 +17,8 @@ class Config:
     # local data
     LOCAL_DATA_FOLDER = os.getenv("LOCAL_DATA_FOLDER")
     MAX_FILE_SIZE = int(os.getenv("MAX_FILE_SIZE"))
+    # uploads are copied to LOCAL_DATA_FOLDER in chunks of this size (1MB)
+    UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 1024 * 1024))
     ALLOWED_EXTENSIONS = [
         "csv",
         "docx",
@@ -36,14 +38,98 @@ class Config:
         "pptx",
     ]
 
-    # qdrant
+    # server port, and worker processes of the production server (gunicorn.conf.py)
+    PORT = int(os.getenv("PORT", 9000))
+    WORKERS = int(os.getenv("WORKERS", 1))
+    # seconds between checks of the index version, to load the changes made by other
+    # workers; 0 never checks. Index writes of the workers of a host are serialized
+    # with a lock on INDEX_LOCK_PATH
+    INDEX_SYNC_INTERVAL = float(os.getenv("INDEX_SYNC_INTERVAL", 2))
+    INDEX_LOCK_PATH = os.getenv(
+        "INDEX_LOCK_PATH", os.path.join("vector_store", "index.lock")
+    )
+
+    # background ingest jobs
+    INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", 2))
+    # requeue the jobs left running by the last run on startup; gunicorn does it
+    # once in its master process instead, as a restarted worker has live siblings
+    REQUEUE_RUNNING_JOBS = os.getenv("REQUEUE_RUNNING_JOBS", "true").lower() == "true"
+    # ids per delete_many when sources are deleted in bulk
+    DELETE_BATCH_SIZE = int(os.getenv("DELETE_BATCH_SIZE", 1000))
+
+    # nodes per page of the documents endpoints, by default and at most
+    DOCUMENTS_PAGE_SIZE = int(os.getenv("DOCUMENTS_PAGE_SIZE", 100))
+    DOCUMENTS_MAX_PAGE_SIZE = int(os.getenv("DOCUMENTS_MAX_PAGE_SIZE", 1000))
+
+    # document parsing processes of each worker process, multi-page files are split
+    # in ranges of pages; the cores are shared by the WORKERS processes by default
+    PARSE_WORKERS = int(
+        os.getenv("PARSE_WORKERS") or max(1, (os.cpu_count() or 1) // WORKERS)
+    )
+    PARSE_PAGES_PER_TASK = int(os.getenv("PARSE_PAGES_PER_TASK", 20))
+
+    # vector store backend: mongo (Atlas vector search), qdrant or local
+    VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "mongo")
+    # the local backend maps the vector files of this folder in memory, stores
+    # vectors as float32, float16 or int8 and searches an IVF index from
+    # LOCAL_VECTOR_IVF_MIN_ROWS vectors, scanning LOCAL_VECTOR_IVF_NPROBE lists
+    LOCAL_VECTOR_STORE_PATH = os.getenv(
+        "LOCAL_VECTOR_STORE_PATH", os.path.join("vector_store", "local")
+    )
+    LOCAL_VECTOR_DTYPE = os.getenv("LOCAL_VECTOR_DTYPE", "float32")
+    LOCAL_VECTOR_IVF_MIN_ROWS = int(os.getenv("LOCAL_VECTOR_IVF_MIN_ROWS", 20000))
+    LOCAL_VECTOR_IVF_NPROBE = int(os.getenv("LOCAL_VECTOR_IVF_NPROBE", 16))
+
+    # BM25 keyword index over the nodes, saved in KEYWORD_INDEX_PATH
+    KEYWORD_INDEX_PATH = os.getenv(
+        "KEYWORD_INDEX_PATH", os.path.join("vector_store", "keyword")
+    )
+    # default retrieval of chat requests: vector, keyword or hybrid; hybrid fuses
+    # HYBRID_CANDIDATE_TOP_K results of each retriever by reciprocal rank
+    RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "vector")
+    HYBRID_CANDIDATE_TOP_K = int(os.getenv("HYBRID_CANDIDATE_TOP_K", 20))
+    HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", 60))
+
+    # nodes given to the LLM; RERANK_CANDIDATES are fetched first and reranked by
+    # RERANKER (none, lexical or cross-encoder with RERANK_MODEL, lexical until the
+    # model is loaded), unless retrieval plus reranking would exceed RERANK_BUDGET_MS
+    RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", 5))
+    RERANKER = os.getenv("RERANKER", "lexical").lower()
+    RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+    RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", 20))
+    RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", 500))
+
+    # retrieved nodes are merged and packed into CONTEXT_TOKEN_BUDGET tokens of
+    # context; with CONTEXT_COMPRESSION, sentences unrelated to the query are dropped
+    CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 3000))
+    CONTEXT_COMPRESSION = os.getenv("CONTEXT_COMPRESSION", "false").lower() == "true"
+
+    # tiktoken model of the shared tokenizer, and token counts it keeps in memory
+    TOKENIZER_MODEL = os.getenv("TOKENIZER_MODEL", "gpt-3.5-turbo")
+    TOKEN_COUNT_CACHE_SIZE = int(os.getenv("TOKEN_COUNT_CACHE_SIZE", 100000))
+
+    # qdrant, in local mode at QDRANT_PATH when QDRANT_URL is empty
     QDRANT_URL = os.getenv("QDRANT_URL")
     QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
-    COLLECTION_NAME = os.getenv("COLLECTION_NAME")
+    QDRANT_PATH = os.getenv("QDRANT_PATH", ":memory:")
+    COLLECTION_NAME = os.getenv("COLLECTION_NAME") or "insight-chat"
+    # points per upsert request, HNSW graph settings, vectors on disk and
+    # quantization: none, scalar (int8) or binary
+    QDRANT_BATCH_SIZE = int(os.getenv("QDRANT_BATCH_SIZE", 256))
+    QDRANT_HNSW_M = int(os.getenv("QDRANT_HNSW_M", 16))
+    QDRANT_HNSW_EF_CONSTRUCT = int(os.getenv("QDRANT_HNSW_EF_CONSTRUCT", 100))
+    QDRANT_ON_DISK = os.getenv("QDRANT_ON_DISK", "false").lower() == "true"
+    QDRANT_QUANTIZATION = os.getenv("QDRANT_QUANTIZATION", "none").lower()
 
     # docstore and indexstore
     MONGO_URI = os.getenv("MONGO_URI")
     MONGO_DB_NAME = os.getenv("MONGO_DB_NAME")
+    # connection pool of each mongo client; requests wait at most
+    # MONGO_WAIT_QUEUE_TIMEOUT_MS for a free connection
+    MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", 100))
+    MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", 10))
+    MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", 60000))
+    MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", 10000))
 
     # openai api key for chat
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
@@ -52,12 +138,58 @@ class Config:
     OPENAI_API_KEY_EMBEDDINGS = (
         os.getenv("OPENAI_API_KEY_EMBEDDINGS", "").split(",")
     )
+    # embed with the chat key as well, sharing its quota with ingests
+    EMBEDDING_USE_CHAT_KEY = (
+        os.getenv("EMBEDDING_USE_CHAT_KEY", "false").lower() == "true"
+    )
 
     # llm model
     LLM_MODEL_NAME = os.getenv("LLM_MODEL_NAME")
 
     # embedding model
-    EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME")
+    EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME") or "text-embedding-3-small"
+
+    # embedding pipeline
+    EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", 100))
+    EMBEDDING_BATCH_MAX_TOKENS = int(os.getenv("EMBEDDING_BATCH_MAX_TOKENS", 100000))
+    EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", 4))
+    EMBEDDING_MAX_ATTEMPTS = int(os.getenv("EMBEDDING_MAX_ATTEMPTS", 5))
+    # seconds before retrying a batch after a timeout, connection or 5xx error,
+    # doubled on every attempt
+    EMBEDDING_RETRY_BACKOFF = float(os.getenv("EMBEDDING_RETRY_BACKOFF", 0.5))
+
+    # per api key rate limits (requests / tokens per minute, cooldown in seconds),
+    # the chat key and the embedding keys are pooled apart
+    OPENAI_KEY_RPM = int(os.getenv("OPENAI_KEY_RPM", 3000))
+    OPENAI_KEY_TPM = int(os.getenv("OPENAI_KEY_TPM", 1000000))
+    OPENAI_KEY_COOLDOWN = float(os.getenv("OPENAI_KEY_COOLDOWN", 20))
+    # connections of the shared OpenAI http clients, one per streamed answer
+    OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", 200))
+
+    # embedding cache
+    EMBEDDING_CACHE_MAX_SIZE = int(os.getenv("EMBEDDING_CACHE_MAX_SIZE", 10000))
+    EMBEDDING_CACHE_TTL = int(os.getenv("EMBEDDING_CACHE_TTL", 30 * 24 * 60 * 60))
+    EMBEDDING_CACHE_PERSISTENT = (
+        os.getenv("EMBEDDING_CACHE_PERSISTENT", "true").lower() == "true"
+    )
+
+    # query embedding cache; when persistent, it also reads and writes the embedding
+    # cache collection shared by every worker
+    QUERY_EMBEDDING_CACHE_MAX_SIZE = int(
+        os.getenv("QUERY_EMBEDDING_CACHE_MAX_SIZE", 10000)
+    )
+    QUERY_EMBEDDING_CACHE_TTL = int(os.getenv("QUERY_EMBEDDING_CACHE_TTL", 24 * 60 * 60))
+    QUERY_EMBEDDING_CACHE_PERSISTENT = (
+        os.getenv("QUERY_EMBEDDING_CACHE_PERSISTENT", "false").lower() == "true"
+    )
+
+    # semantic answer cache of /chat
+    ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+    ANSWER_CACHE_MAX_SIZE = int(os.getenv("ANSWER_CACHE_MAX_SIZE", 1000))
+    ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", 24 * 60 * 60))
+    ANSWER_CACHE_SIMILARITY_THRESHOLD = float(
+        os.getenv("ANSWER_CACHE_SIMILARITY_THRESHOLD", 0.95)
+    )
 
 
 def print_config(config: Config):
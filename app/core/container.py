@@ -0,0 +1,84 @@
+"""Service container module."""
+
+import asyncio
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from app.logger.logger import custom_logger
+
+
+class Container:
+    """
+    Clients and services shared by the app, each built on first use.
+
+    Modules register a factory for what they provide; nothing is connected or
+    loaded when they are imported. `get` builds an object once, even when several
+    threads ask for it at the same time, and a factory may get the objects it
+    depends on. `close` closes what was built, the last built first.
+    """
+
+    def __init__(self) -> None:
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._closers: Dict[str, Callable[[Any], None]] = {}
+        self._instances: Dict[str, Any] = {}
+        self._built: List[str] = []
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def provide(
+        self,
+        name: str,
+        factory: Callable[[], Any],
+        close: Optional[Callable[[Any], None]] = None,
+    ) -> None:
+        """Register how to build `name` and, optionally, how to close it."""
+        with self._lock:
+            self._factories[name] = factory
+            self._locks[name] = threading.Lock()
+            if close is not None:
+                self._closers[name] = close
+
+    def is_built(self, name: str) -> bool:
+        return name in self._instances
+
+    def get(self, name: str) -> Any:
+        """Get `name`, building it first if needed."""
+        if name in self._instances:
+            return self._instances[name]
+
+        # one lock per object, so a slow build does not hold back the others
+        with self._locks[name]:
+            if name not in self._instances:
+                custom_logger.info(f"Building {name}")
+                instance = self._factories[name]()
+                with self._lock:
+                    self._instances[name] = instance
+                    self._built.append(name)
+
+        return self._instances[name]
+
+    async def aget(self, name: str) -> Any:
+        """Get `name`, building it on a worker thread so the event loop never waits."""
+        if name in self._instances:
+            return self._instances[name]
+
+        return await asyncio.to_thread(self.get, name)
+
+    def close(self) -> None:
+        """Close what was built, the last built first, and forget it."""
+        with self._lock:
+            built = list(reversed(self._built))
+            self._built.clear()
+
+        for name in built:
+            instance = self._instances.pop(name)
+            close = self._closers.get(name)
+            if close is None:
+                continue
+            try:
+                close(instance)
+            except Exception as e:
+                custom_logger.warning(f"Could not close {name}: {e}")
+
+
+container = Container()
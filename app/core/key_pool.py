@@ -0,0 +1,289 @@
+"""Rate-limit-aware pool of OpenAI api keys."""
+
+import asyncio
+import threading
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+from app.core.config import config
+from app.logger.logger import custom_logger
+
+
+class TokenBucket:
+    """Token bucket refilled continuously up to a per-minute capacity."""
+
+    def __init__(self, capacity_per_minute: float) -> None:
+        self.capacity = float(capacity_per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def fill_ratio(self) -> float:
+        return self.tokens / self.capacity
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` tokens are available (after a refill)."""
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float) -> None:
+        self.tokens -= min(amount, self.capacity)
+
+    def clamp(self, remaining: float) -> None:
+        """Adopt the server's view of what is left, if it is lower than ours."""
+        self.tokens = min(self.tokens, remaining)
+
+
+class KeyState:
+    """Usage and throttling state of a single api key."""
+
+    def __init__(
+        self, key: str, requests_per_minute: int, tokens_per_minute: int
+    ) -> None:
+        self.key = key
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.in_flight = 0
+        self.cooldown_until = 0.0
+        self.request_count = 0
+        self.throttled_count = 0
+
+    def refill(self, now: float) -> None:
+        self.requests.refill(now)
+        self.tokens.refill(now)
+
+    def load(self) -> float:
+        """Lower is better: in-flight calls first, then how drained the buckets are."""
+        return self.in_flight + 1.0 - min(
+            self.requests.fill_ratio(), self.tokens.fill_ratio()
+        )
+
+    def wait_time(self, tokens: int, now: float) -> float:
+        return max(
+            self.cooldown_until - now,
+            self.requests.wait_time(1),
+            self.tokens.wait_time(tokens),
+        )
+
+
+class KeyPool:
+    """
+    Hand out the least-loaded api key that has capacity left.
+
+    Requests and tokens per minute are tracked per key with token buckets. Keys
+    answering 429 are put in cooldown for their Retry-After. Throttling and the
+    x-ratelimit-remaining-* headers are read from every response through httpx
+    event hooks, so clients built with `http_client` / `async_http_client` keep
+    the pool up to date whatever makes the call.
+    """
+
+    def __init__(
+        self,
+        keys: List[str],
+        requests_per_minute: int = None,
+        tokens_per_minute: int = None,
+        default_cooldown: float = None,
+    ) -> None:
+        keys = list(dict.fromkeys(key for key in keys if key))
+        if not keys:
+            custom_logger.warning("No OpenAI api keys configured")
+
+        self.default_cooldown = default_cooldown or config.OPENAI_KEY_COOLDOWN
+        self.states: Dict[str, KeyState] = {
+            key: KeyState(
+                key,
+                requests_per_minute or config.OPENAI_KEY_RPM,
+                tokens_per_minute or config.OPENAI_KEY_TPM,
+            )
+            for key in keys
+        }
+        self._lock = threading.Lock()
+        self._http_client: Optional[httpx.Client] = None
+        self._async_http_client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def keys(self) -> List[str]:
+        return list(self.states)
+
+    def try_acquire(self, tokens: int = 0) -> tuple[Optional[str], float]:
+        """Reserve capacity on the least-loaded key, or say how long to wait."""
+        if not self.states:
+            raise ValueError("No OpenAI api keys configured")
+
+        now = time.monotonic()
+        with self._lock:
+            wait = float("inf")
+            candidates = []
+            for state in self.states.values():
+                state.refill(now)
+                state_wait = state.wait_time(tokens, now)
+                if state_wait <= 0:
+                    candidates.append(state)
+                wait = min(wait, state_wait)
+
+            if not candidates:
+                return None, wait
+
+            state = min(candidates, key=KeyState.load)
+            state.requests.consume(1)
+            state.tokens.consume(tokens)
+            state.in_flight += 1
+            state.request_count += 1
+            return state.key, 0.0
+
+    def acquire(self, tokens: int = 0) -> str:
+        """Block until a key has capacity for one request of `tokens` tokens."""
+        while True:
+            key, wait = self.try_acquire(tokens)
+            if key is not None:
+                return key
+            time.sleep(min(wait, self.default_cooldown))
+
+    async def aacquire(self, tokens: int = 0) -> str:
+        """Asynchronously wait until a key has capacity."""
+        while True:
+            key, wait = self.try_acquire(tokens)
+            if key is not None:
+                return key
+            await asyncio.sleep(min(wait, self.default_cooldown))
+
+    def release(self, key: str) -> None:
+        """Mark a request made with `key` as finished."""
+        with self._lock:
+            state = self.states.get(key)
+            if state is not None and state.in_flight > 0:
+                state.in_flight -= 1
+
+    def select_key(self) -> str:
+        """
+        Pick a key for a call whose end the caller cannot observe (e.g. streams).
+
+        Never blocks: when every key is throttled, the one that recovers first wins.
+        """
+        key, _ = self.try_acquire()
+        if key is not None:
+            self.release(key)
+            return key
+
+        with self._lock:
+            return min(self.states.values(), key=lambda state: state.cooldown_until).key
+
+    def report_throttled(self, key: str, retry_after: Optional[float] = None) -> None:
+        """Put a key in cooldown after a 429."""
+        with self._lock:
+            state = self.states.get(key)
+            if state is None:
+                return
+            cooldown = retry_after if retry_after is not None else self.default_cooldown
+            state.cooldown_until = max(state.cooldown_until, time.monotonic() + cooldown)
+            state.throttled_count += 1
+
+        custom_logger.warning(f"Api key ...{key[-4:]} throttled, cooling down {cooldown:.1f}s")
+
+    def observe_response(self, key: str, status_code: int, headers: httpx.Headers) -> None:
+        """Update a key from the rate limit headers of one of its responses."""
+        if status_code == 429:
+            self.report_throttled(key, self.parse_retry_after(headers))
+            return
+
+        with self._lock:
+            state = self.states.get(key)
+            if state is None:
+                return
+            remaining_requests = headers.get("x-ratelimit-remaining-requests")
+            if remaining_requests is not None and remaining_requests.isdigit():
+                state.requests.clamp(float(remaining_requests))
+            remaining_tokens = headers.get("x-ratelimit-remaining-tokens")
+            if remaining_tokens is not None and remaining_tokens.isdigit():
+                state.tokens.clamp(float(remaining_tokens))
+
+    @staticmethod
+    def parse_retry_after(headers: httpx.Headers) -> Optional[float]:
+        """Read Retry-After (or OpenAI's retry-after-ms) in seconds."""
+        try:
+            if "retry-after-ms" in headers:
+                return float(headers["retry-after-ms"]) / 1000
+            if "retry-after" in headers:
+                return float(headers["retry-after"])
+        except ValueError:
+            pass
+        return None
+
+    @staticmethod
+    def key_from_request(request: httpx.Request) -> str:
+        scheme, _, key = request.headers.get("authorization", "").partition(" ")
+        return key if scheme.lower() == "bearer" else ""
+
+    def _on_response(self, response: httpx.Response) -> None:
+        self.observe_response(
+            self.key_from_request(response.request),
+            response.status_code,
+            response.headers,
+        )
+
+    async def _aon_response(self, response: httpx.Response) -> None:
+        self._on_response(response)
+
+    @property
+    def limits(self) -> httpx.Limits:
+        # every open chat stream holds a connection until its last token
+        return httpx.Limits(
+            max_connections=config.OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=config.OPENAI_MAX_CONNECTIONS // 4,
+        )
+
+    @property
+    def http_client(self) -> httpx.Client:
+        """Shared sync http client reporting every response to the pool."""
+        if self._http_client is None:
+            self._http_client = httpx.Client(
+                timeout=60.0,
+                limits=self.limits,
+                event_hooks={"response": [self._on_response]},
+            )
+        return self._http_client
+
+    @property
+    def async_http_client(self) -> httpx.AsyncClient:
+        """Shared async http client reporting every response to the pool."""
+        if self._async_http_client is None:
+            self._async_http_client = httpx.AsyncClient(
+                timeout=60.0,
+                limits=self.limits,
+                event_hooks={"response": [self._aon_response]},
+            )
+        return self._async_http_client
+
+    def get_stats(self) -> List[dict]:
+        """Per-key usage, with keys masked."""
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "key": f"...{state.key[-4:]}",
+                    "requests": state.request_count,
+                    "throttled": state.throttled_count,
+                    "in_flight": state.in_flight,
+                    "cooldown_seconds": max(0.0, state.cooldown_until - now),
+                }
+                for state in self.states.values()
+            ]
+
+
+# the chat key, and the embedding keys, which take the chat key too only when
+# EMBEDDING_USE_CHAT_KEY so ingest bursts do not spend the quota of chats
+chat_key_pool = KeyPool([config.OPENAI_API_KEY])
+key_pool = KeyPool(
+    [
+        *config.OPENAI_API_KEY_EMBEDDINGS,
+        *([config.OPENAI_API_KEY] if config.EMBEDDING_USE_CHAT_KEY else []),
+    ]
+)
@@ -1,18 +1,92 @@
 """Common settings for RAG model"""
 
+from typing import Any, Dict
+
 from llama_index.core import Settings
+from llama_index.core.bridge.pydantic import PrivateAttr
 from llama_index.llms.openai import OpenAI
 from llama_index.embeddings.openai import OpenAIEmbedding
+from openai import AsyncOpenAI, OpenAI as SyncOpenAI
 
+from app.core.config import config
+from app.core.key_pool import KeyPool, chat_key_pool, key_pool
 from app.logger.logger import custom_logger
 
+
+def get_initial_key(pool: KeyPool, setting: str) -> str:
+    """Get a key for the clients that check one is set when they are built."""
+    if not pool.keys:
+        raise ValueError(f"No OpenAI api keys configured, set {setting}")
+
+    return pool.keys[0]
+
+
+class PooledOpenAI(OpenAI):
+    """OpenAI LLM that takes the least-loaded key of the key pool on every call."""
+
+    _key_pool: KeyPool = PrivateAttr()
+
+    def __init__(self, pool: KeyPool, **kwargs) -> None:
+        super().__init__(
+            api_key=get_initial_key(pool, "OPENAI_API_KEY"),
+            reuse_client=False,
+            **kwargs,
+        )
+        self._key_pool = pool
+
+    def _get_client(self) -> SyncOpenAI:
+        credential_kwargs = self._get_credential_kwargs()
+        credential_kwargs["api_key"] = self._key_pool.select_key()
+        credential_kwargs["http_client"] = self._key_pool.http_client
+        return SyncOpenAI(**credential_kwargs)
+
+    def _get_aclient(self) -> AsyncOpenAI:
+        credential_kwargs = self._get_credential_kwargs()
+        credential_kwargs["api_key"] = self._key_pool.select_key()
+        credential_kwargs["http_client"] = self._key_pool.async_http_client
+        return AsyncOpenAI(**credential_kwargs)
+
+
+class PooledOpenAIEmbedding(OpenAIEmbedding):
+    """OpenAI embedding that takes the least-loaded key of the key pool on every call."""
+
+    _key_pool: KeyPool = PrivateAttr()
+
+    def __init__(self, pool: KeyPool, **kwargs) -> None:
+        super().__init__(
+            api_key=get_initial_key(pool, "OPENAI_API_KEY_EMBEDDINGS"),
+            reuse_client=False,
+            http_client=pool.http_client,
+            async_http_client=pool.async_http_client,
+            **kwargs,
+        )
+        self._key_pool = pool
+
+    def _get_credential_kwargs(self, is_async: bool = False) -> Dict[str, Any]:
+        credential_kwargs = super()._get_credential_kwargs(is_async=is_async)
+        credential_kwargs["api_key"] = self._key_pool.select_key()
+        return credential_kwargs
+
+
 def settings():
     """Set the settings for RAG."""
 
-    Settings.llm = OpenAI(model="gpt-3.5-turbo-1106", temperature=0.0)
-    Settings.embed_model = OpenAIEmbedding(
-        model="text-embedding-3-small", embed_batch_size=100
+    Settings.llm = PooledOpenAI(
+        pool=chat_key_pool, model="gpt-3.5-turbo-1106", temperature=0.0
+    )
+    # imported here, the cache depends on the database but PooledOpenAI does not
+    from app.api.helpers.embedding_cache import CachedQueryEmbedding
+    from app.api.helpers.tokenizer import tokenizer
+
+    Settings.embed_model = CachedQueryEmbedding(
+        PooledOpenAIEmbedding(
+            pool=key_pool,
+            model=config.EMBEDDING_MODEL_NAME,
+            embed_batch_size=100,
+        )
     )
+    # llama-index components without a tokenizer of their own share its encoder
+    Settings.tokenizer = tokenizer.encode
     Settings.context_window = 16000
     Settings.num_output = 2048
 
@@ -1,14 +1,24 @@
 """Initialize insight-chat application."""
 
+import asyncio
+from contextlib import asynccontextmanager
+
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
 from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
+from app.api.database.indexes import ensure_indexes
+from app.api.errors.error_message import FileTooLargeError
+from app.api.responses.base import BaseResponse
 from app.api.routes.api_router import api_router
-from app.core.setting_rag import settings
+from app.api.services.ingest_job_service import ingest_job_service
+from app.api.services.ingest_service import get_ingest_service
 from app.core.config import config
+from app.core.container import container
 from app.logger.logger import custom_logger
 
 
@@ -24,12 +34,75 @@ class LoggingMiddleware(BaseHTTPMiddleware):
         return response
 
 
-def create_app() -> FastAPI:
-    # Load common settings for RAG
-    settings()
+class UploadSizeLimitMiddleware:
+    """
+    Reject oversized uploads while they arrive.
+
+    Requests announcing a larger Content-Length are answered with 413 before the body
+    is read; other requests are cut off as soon as the received body crosses the limit.
+    """
+
+    def __init__(self, app: ASGIApp, max_body_size: int, paths: tuple[str, ...]):
+        self.app = app
+        self.max_body_size = max_body_size
+        self.paths = paths
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length and int(content_length) > self.max_body_size:
+            response = BaseResponse.error_response(
+                status_code=413, message=FileTooLargeError.message
+            )
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_size:
+                    raise HTTPException(status_code=413, detail=FileTooLargeError.message)
+            return message
+
+        await self.app(scope, limited_receive, send)
 
+
+def start_services():
+    """Create missing indexes, load the index and resume unfinished ingest jobs."""
+    try:
+        ensure_indexes()
+        get_ingest_service()
+        ingest_job_service.resume_jobs()
+        custom_logger.info("Services are ready")
+    except Exception as e:
+        # requests build what is missing again on first use
+        custom_logger.exception(e)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Start the services in the background, so health checks are answered while the
+    index loads; stop workers and close clients on shutdown.
+    """
+    startup = asyncio.create_task(run_in_threadpool(start_services))
+    yield
+    if not startup.done():
+        custom_logger.warning("Stopping before the services were ready")
+    ingest_job_service.shutdown()
+    container.close()
+
+
+def create_app() -> FastAPI:
     # Start the API
-    app = FastAPI(title="Insight Chat", version="0.1.0")
+    app = FastAPI(title="Insight Chat", version="0.1.0", lifespan=lifespan)
 
     custom_logger.debug("Setting up CORS middleware")
     app.add_middleware(
@@ -40,6 +113,14 @@ def create_app() -> FastAPI:
         allow_headers=["*"],
     )
 
+    custom_logger.debug("Setting up upload size limit middleware")
+    app.add_middleware(
+        UploadSizeLimitMiddleware,
+        # leave room for the multipart boundaries and headers
+        max_body_size=config.MAX_FILE_SIZE + 64 * 1024,
+        paths=("/ingest/file",),
+    )
+
     custom_logger.debug("Setting up logging middleware")
     app.add_middleware(LoggingMiddleware)
 
@@ -0,0 +1,101 @@
+"""
+Measure the per-request setup of chat retrieval, engines rebuilt vs none built.
+
+An in-memory index of `--nodes` nodes stands in for the Mongo index, with mock
+embeddings and a mock LLM. "engines" is what `ChatService` did on every request
+before `/chat` and `/chat/conversation` were served by `achat` and
+`aconversation`: `as_query_engine` or `as_chat_engine(chat_mode="context")`, which
+copy the node ids of the index struct into a new retriever, then a retrieval
+through that retriever. "async" is `ChatService.avector_retrieve`, what `achat`
+and `aconversation` run: one vector store query, no engine or retriever built.
+Setup alone and setup plus retrieval are timed per request.
+
+Usage:
+    python -m benchmarks.chat_setup_benchmark --nodes 20000 --requests 200
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from types import SimpleNamespace
+
+os.environ.setdefault("MAX_FILE_SIZE", str(20 * 1024 * 1024))
+
+import llama_index.core
+from llama_index.core import MockEmbedding, Settings, VectorStoreIndex
+from llama_index.core.callbacks import CallbackManager
+from llama_index.core.llms import MockLLM
+from llama_index.core.memory import ChatMemoryBuffer
+from llama_index.core.schema import TextNode
+
+from app.core.container import container
+from app.api.services.chat_service import CONVERSATION_SYSTEM_PROMPT, ChatService
+
+QUERY = "What is scrum?"
+TOP_K = 5
+
+
+def build_index(nodes: int) -> VectorStoreIndex:
+    return VectorStoreIndex(
+        [TextNode(text=f"chunk {i}") for i in range(nodes)],
+        embed_model=Settings.embed_model,
+    )
+
+
+def engine_setup(index: VectorStoreIndex, conversation: bool):
+    if conversation:
+        return index.as_chat_engine(
+            chat_mode="context",
+            memory=ChatMemoryBuffer.from_defaults(token_limit=8000),
+            similarity_top_k=TOP_K,
+            system_prompt=CONVERSATION_SYSTEM_PROMPT,
+        )._retriever
+
+    return index.as_query_engine(similarity_top_k=TOP_K, streaming=True).retriever
+
+
+def time_engines(index: VectorStoreIndex, requests: int, retrieve: bool) -> float:
+    started_at = time.perf_counter()
+    for request in range(requests):
+        retriever = engine_setup(index, conversation=request % 2 == 1)
+        if retrieve:
+            retriever.retrieve(QUERY)
+    return (time.perf_counter() - started_at) / requests
+
+
+async def time_async(requests: int, query_embedding) -> float:
+    started_at = time.perf_counter()
+    for _ in range(requests):
+        await ChatService.avector_retrieve(QUERY, TOP_K, query_embedding)
+    return (time.perf_counter() - started_at) / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--nodes", type=int, default=20000)
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    # chat_service sets a handler printing every retrieval, which would be timed too
+    llama_index.core.global_handler = None
+    Settings.callback_manager = CallbackManager()
+    Settings.llm = MockLLM()
+    Settings.embed_model = MockEmbedding(embed_dim=8)
+    index = build_index(args.nodes)
+    # the async path reads the index of the ingest service
+    container.provide("ingest_service", lambda: SimpleNamespace(index=index))
+    query_embedding = Settings.embed_model.get_query_embedding(QUERY)
+
+    setup = time_engines(index, args.requests, retrieve=False)
+    engines = time_engines(index, args.requests, retrieve=True)
+    async_path = asyncio.run(time_async(args.requests, query_embedding))
+
+    print(f"{args.nodes} nodes, {args.requests} requests, per request")
+    print(f"engines setup          : {setup * 1000:8.3f} ms")
+    print(f"engines setup+retrieve : {engines * 1000:8.3f} ms")
+    print(f"async retrieve         : {async_path * 1000:8.3f} ms  (no engine built)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Measure time to first token of streamed chat answers, sync vs async.
+
+A FastAPI app served by uvicorn streams answers from the app's `PooledOpenAI`
+LLM, pointed at the local fake OpenAI server; both run in their own processes so
+the client does not compete with them for the GIL. `/sync` streams a sync generator
+over `stream_chat`, which Starlette iterates on its threadpool (40 threads), the
+way `ChatService.conversation` did. `/async` streams `astream_chat` on the event
+loop, the way `ChatService.aconversation` does. `--streams` clients stream at
+once; median and p95 time to first token and the wall time are reported.
+
+Usage:
+    python -m benchmarks.chat_stream_benchmark --streams 200 --latency 1.0
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import socket
+import statistics
+import time
+
+import httpx
+import uvicorn
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from llama_index.core.base.llms.types import ChatMessage, MessageRole
+
+from app.core.key_pool import KeyPool
+from app.core.setting_rag import PooledOpenAI
+from benchmarks.fake_openai_server import FakeOpenAIServer
+
+MESSAGES = [ChatMessage(role=MessageRole.USER, content="What is scrum?")]
+
+
+def make_app(llm: PooledOpenAI) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/sync")
+    def sync_stream():
+        def token_gen():
+            for response in llm.stream_chat(MESSAGES):
+                yield response.delta or ""
+
+        return StreamingResponse(token_gen(), media_type="text/event-stream")
+
+    @app.post("/async")
+    async def async_stream():
+        async def token_gen():
+            async for response in await llm.astream_chat(MESSAGES):
+                yield response.delta or ""
+
+        return StreamingResponse(token_gen(), media_type="text/event-stream")
+
+    return app
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port: int):
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+
+
+def run_fake_server(port: int, latency: float, tokens: int, token_delay: float):
+    FakeOpenAIServer(
+        latency=latency, port=port, tokens=tokens, token_delay=token_delay
+    ).serve_forever()
+
+
+def run_app(port: int, api_base: str):
+    pool = KeyPool(["sk-bench"], requests_per_minute=10**6, tokens_per_minute=10**9)
+    llm = PooledOpenAI(pool=pool, model="gpt-3.5-turbo-1106", api_base=api_base)
+    uvicorn.run(make_app(llm), host="127.0.0.1", port=port, log_level="warning")
+
+
+async def stream_once(client: httpx.AsyncClient, url: str) -> float:
+    started_at = time.perf_counter()
+    first_token_at = None
+    async with client.stream("POST", url) as response:
+        async for text in response.aiter_text():
+            if text and first_token_at is None:
+                first_token_at = time.perf_counter()
+    return first_token_at - started_at
+
+
+async def run_streams(url: str, streams: int) -> dict:
+    limits = httpx.Limits(max_connections=streams)
+    async with httpx.AsyncClient(limits=limits, timeout=None) as client:
+        started_at = time.perf_counter()
+        ttfts = await asyncio.gather(*(stream_once(client, url) for _ in range(streams)))
+        elapsed = time.perf_counter() - started_at
+
+    ttfts = sorted(ttfts)
+    return {
+        "p50": statistics.median(ttfts),
+        "p95": ttfts[int(len(ttfts) * 0.95) - 1],
+        "seconds": elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--streams", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=1.0, help="time to first token")
+    parser.add_argument("--tokens", type=int, default=30)
+    parser.add_argument("--token-delay", type=float, default=0.05)
+    args = parser.parse_args()
+
+    fake_port, app_port = free_port(), free_port()
+    processes = [
+        multiprocessing.Process(
+            target=run_fake_server,
+            args=(fake_port, args.latency, args.tokens, args.token_delay),
+            daemon=True,
+        ),
+        multiprocessing.Process(
+            target=run_app,
+            args=(app_port, f"http://127.0.0.1:{fake_port}/v1"),
+            daemon=True,
+        ),
+    ]
+    for process in processes:
+        process.start()
+    wait_for_port(fake_port)
+    wait_for_port(app_port)
+
+    print(
+        f"{args.streams} concurrent streams, {args.latency}s to first token, "
+        f"{args.tokens} tokens every {args.token_delay}s"
+    )
+    try:
+        for path in ("/sync", "/async"):
+            result = asyncio.run(
+                run_streams(f"http://127.0.0.1:{app_port}{path}", args.streams)
+            )
+            print(
+                f"{path:>7}: ttft p50 {result['p50']:.3f}s  p95 {result['p95']:.3f}s  "
+                f"all streams done in {result['seconds']:.2f}s"
+            )
+    finally:
+        for process in processes:
+            process.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Measure the tokens sent as context and the time to first token, naive vs packed.
+
+`--docs` documents of `--sentences` sentences drawn from the sample PDF are split
+the way ingestion splits them (1024-token chunks with a 200-token overlap). For
+every question, one of those sentences, the `--top-k`
+chunks are retrieved by BM25 as the keyword retriever would, then joined as they
+are, the way the chat engines did, or packed by the `ContextAssembler` into
+`--budget` tokens, with and without sentence compression. Time to first token
+is modelled as the packing time plus the LLM's prefill of the prompt,
+`--prefill-ms` per thousand input tokens on top of `--latency`.
+
+Usage:
+    python -m benchmarks.context_packing_benchmark --top-k 5 --budget 3000
+"""
+
+import argparse
+import os
+import random
+import statistics
+import time
+
+os.environ.setdefault("MAX_FILE_SIZE", str(20 * 1024 * 1024))
+
+import pypdf
+from llama_index.core.node_parser import SentenceSplitter
+from llama_index.core.schema import Document, MetadataMode, NodeWithScore
+from llama_index.core.utils import get_tokenizer
+
+from app.api.helpers.context_assembler import SENTENCE_PATTERN, ContextAssembler
+from app.api.helpers.reranker import LexicalReranker
+
+SAMPLE_PDF = os.path.join(
+    os.path.dirname(__file__), "..", "app", "api", "docs", "Scrum-Guide-1.pdf"
+)
+
+
+def make_documents(docs: int, sentences: int, rng: random.Random):
+    reader = pypdf.PdfReader(SAMPLE_PDF)
+    text = " ".join(page.extract_text() for page in reader.pages)
+    pool = [s for s in SENTENCE_PATTERN.split(" ".join(text.split())) if s]
+
+    return [
+        Document(
+            text=" ".join(rng.choices(pool, k=sentences)),
+            metadata={"source": f"guide-{i}.pdf"},
+        )
+        for i in range(docs)
+    ]
+
+
+def get_context_str(nodes) -> str:
+    # same as `ChatService.get_context_str`, without connecting to the databases
+    return "\n\n".join(
+        node.node.get_content(metadata_mode=MetadataMode.LLM).strip() for node in nodes
+    )
+
+
+def retrieve(reranker: LexicalReranker, chunks, query: str, top_k: int):
+    scores = reranker.score(query, [chunk.text for chunk in chunks])
+    order = sorted(range(len(chunks)), key=lambda i: -scores[i])[:top_k]
+
+    return [NodeWithScore(node=chunks[i], score=scores[i]) for i in order]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs", type=int, default=4)
+    parser.add_argument("--sentences", type=int, default=400)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--budget", type=int, default=3000)
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--prefill-ms", type=float, default=150.0)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    documents = make_documents(args.docs, args.sentences, rng)
+    chunks = SentenceSplitter(
+        chunk_size=1024, chunk_overlap=200
+    ).get_nodes_from_documents(documents)
+    questions = [
+        rng.choice(SENTENCE_PATTERN.split(rng.choice(documents).text))
+        for _ in range(args.questions)
+    ]
+    tokenizer = get_tokenizer()
+    reranker = LexicalReranker()
+    retrieved = [retrieve(reranker, chunks, q, args.top_k) for q in questions]
+
+    def prefill(tokens: int) -> float:
+        return args.latency + tokens / 1000 * args.prefill_ms / 1000
+
+    naive_tokens = [len(tokenizer(get_context_str(n))) for n in retrieved]
+    print(
+        f"{len(chunks)} chunks, {args.questions} questions, top {args.top_k}, "
+        f"budget {args.budget} tokens"
+    )
+    print(
+        f"naive   : {statistics.mean(naive_tokens):7.0f} tokens  "
+        f"ttft {statistics.median(map(prefill, naive_tokens)) * 1000:6.0f}ms"
+    )
+
+    for compress in (False, True):
+        assembler = ContextAssembler(token_budget=args.budget, compress=compress)
+        tokens = []
+        ttft = []
+        pack_seconds = []
+        for question, nodes in zip(questions, retrieved):
+            started_at = time.perf_counter()
+            packed = assembler.postprocess_nodes(nodes, query_str=question)
+            context = get_context_str(packed)
+            pack_seconds.append(time.perf_counter() - started_at)
+            tokens.append(len(tokenizer(context)))
+            ttft.append(pack_seconds[-1] + prefill(tokens[-1]))
+
+        saved = 1 - sum(tokens) / sum(naive_tokens)
+        print(
+            f"{'compress' if compress else 'packed':8}: "
+            f"{statistics.mean(tokens):7.0f} tokens  "
+            f"ttft {statistics.median(ttft) * 1000:6.0f}ms  "
+            f"pack {statistics.median(pack_seconds) * 1000:.1f}ms  "
+            f"saved {saved:.0%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
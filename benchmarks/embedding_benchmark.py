@@ -0,0 +1,99 @@
+"""
+Benchmark the batched embedding pipeline against the per-node loop.
+
+Usage:
+    python -m benchmarks.embedding_benchmark --nodes 500 --latency 0.05
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+os.environ.setdefault("MAX_FILE_SIZE", str(20 * 1024 * 1024))
+os.environ.setdefault("OPENAI_API_KEY_EMBEDDINGS", "sk-a,sk-b,sk-c")
+
+from llama_index.core.schema import TextNode
+from llama_index.embeddings.openai import OpenAIEmbedding
+
+from app.api.helpers.embedding_pipeline import EmbeddingPipeline
+from app.core.config import config
+from app.core.key_pool import KeyPool
+from benchmarks.fake_openai_server import FakeOpenAIServer
+
+
+def make_nodes(count: int) -> list[TextNode]:
+    """Build nodes of roughly one chunk (1024 tokens) each."""
+    return [
+        TextNode(
+            text=f"chunk {i} " + "lorem ipsum dolor sit amet " * 150,
+            metadata={"source": "benchmark.pdf"},
+        )
+        for i in range(count)
+    ]
+
+
+def legacy_loop(nodes: list[TextNode], api_base: str):
+    """The previous implementation: one request per node, new client every 3 nodes."""
+    list_api_keys = config.OPENAI_API_KEY_EMBEDDINGS
+    usage_counts = {key: 0 for key in list_api_keys}
+    api_key_index = 0
+    embed_model = OpenAIEmbedding(
+        api_key=list_api_keys[api_key_index], api_base=api_base
+    )
+    for node in nodes:
+        if usage_counts[list_api_keys[api_key_index]] >= 3:
+            api_key_index = (api_key_index + 1) % len(list_api_keys)
+            usage_counts[list_api_keys[api_key_index]] = 0
+            embed_model = OpenAIEmbedding(
+                api_key=list_api_keys[api_key_index], api_base=api_base
+            )
+        node.embedding = embed_model.get_text_embedding(
+            node.get_content(metadata_mode="all")
+        )
+        usage_counts[list_api_keys[api_key_index]] += 1
+
+
+def report(name: str, count: int, elapsed: float, requests: int):
+    print(
+        f"{name:<22} {count / elapsed:>10.1f} nodes/s "
+        f"{elapsed:>8.2f}s {requests:>6} requests"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--nodes", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--batch-size", type=int, default=config.EMBEDDING_BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=config.EMBEDDING_CONCURRENCY)
+    args = parser.parse_args()
+
+    with FakeOpenAIServer(latency=args.latency) as server:
+        nodes = make_nodes(args.nodes)
+        start = time.perf_counter()
+        legacy_loop(nodes, server.api_base)
+        report("per-node loop", len(nodes), time.perf_counter() - start, server.request_count)
+
+        server.request_count = 0
+        pipeline = EmbeddingPipeline(
+            key_pool=KeyPool(config.OPENAI_API_KEY_EMBEDDINGS),
+            api_base=server.api_base,
+            batch_size=args.batch_size,
+            max_concurrency=args.concurrency,
+        )
+        nodes = make_nodes(args.nodes)
+        start = time.perf_counter()
+        pipeline.embed_nodes(nodes)
+        report("batched pipeline", len(nodes), time.perf_counter() - start, server.request_count)
+        assert all(node.embedding for node in nodes)
+
+        server.request_count = 0
+        nodes = make_nodes(args.nodes)
+        start = time.perf_counter()
+        asyncio.run(pipeline.aembed_nodes(nodes))
+        report("batched pipeline async", len(nodes), time.perf_counter() - start, server.request_count)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+Local fake of the OpenAI HTTP API used by the benchmarks.
+
+Every request sleeps for a fixed latency before answering, so the numbers
+reflect round trips rather than model speed. Keys listed in `throttled_keys`
+are always answered with 429 and a Retry-After header.
+
+Chat completions answer with `tokens` tokens; streamed ones are sent as
+server-sent events, one token every `token_delay` seconds.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+EMBEDDING_DIMENSIONS = 1536
+
+
+def fake_embedding(text: str, dimensions: int = EMBEDDING_DIMENSIONS) -> list[float]:
+    """Deterministic pseudo embedding for a text."""
+    seed = hashlib.sha256(text.encode("utf-8")).digest()
+    return [seed[i % len(seed)] / 255.0 for i in range(dimensions)]
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    """Handle the OpenAI endpoints the app uses."""
+
+    server: "FakeOpenAIServer"
+
+    def log_message(self, format, *args):
+        """Silence request logging."""
+
+    def _send_json(self, status: int, payload: dict, headers: dict = None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        api_key = self.headers.get("Authorization", "").removeprefix("Bearer ")
+        self.server.record_request(api_key)
+
+        if api_key in self.server.throttled_keys:
+            self._send_json(
+                429,
+                {"error": {"message": "Rate limit reached", "type": "requests"}},
+                headers={"Retry-After": str(self.server.retry_after)},
+            )
+            return
+
+        time.sleep(self.server.latency)
+
+        if self.path.endswith("/embeddings"):
+            texts = payload["input"]
+            if isinstance(texts, str):
+                texts = [texts]
+            data = [
+                {"object": "embedding", "index": i, "embedding": fake_embedding(text)}
+                for i, text in enumerate(texts)
+            ]
+            self._send_json(
+                200,
+                {
+                    "object": "list",
+                    "data": data,
+                    "model": payload.get("model"),
+                    "usage": {"prompt_tokens": 0, "total_tokens": 0},
+                },
+            )
+            return
+
+        if self.path.endswith("/chat/completions"):
+            if payload.get("stream"):
+                self._stream_chat(payload)
+            else:
+                self._send_json(200, self._chat_completion(payload))
+            return
+
+        self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def _chat_completion(self, payload: dict) -> dict:
+        return {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model"),
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {
+                        "role": "assistant",
+                        "content": "".join(self.server.make_tokens()),
+                    },
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }
+
+    def _send_event(self, payload) -> None:
+        data = payload if isinstance(payload, str) else json.dumps(payload)
+        self.wfile.write(f"data: {data}\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+    def _stream_chat(self, payload: dict) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        def chunk(delta: dict, finish_reason: str = None) -> dict:
+            return {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": payload.get("model"),
+                "choices": [
+                    {"index": 0, "delta": delta, "finish_reason": finish_reason}
+                ],
+            }
+
+        for position, token in enumerate(self.server.make_tokens()):
+            if position:
+                time.sleep(self.server.token_delay)
+            delta = {"content": token}
+            if position == 0:
+                delta["role"] = "assistant"
+            self._send_event(chunk(delta))
+
+        self._send_event(chunk({}, finish_reason="stop"))
+        self._send_event("[DONE]")
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    """Threaded fake OpenAI server with request accounting."""
+
+    daemon_threads = True
+    # many streams connect at once
+    request_queue_size = 1024
+
+    def __init__(
+        self,
+        latency: float = 0.05,
+        port: int = 0,
+        throttled_keys: set = None,
+        retry_after: int = 1,
+        tokens: int = 20,
+        token_delay: float = 0.01,
+    ):
+        super().__init__(("127.0.0.1", port), FakeOpenAIHandler)
+        self.latency = latency
+        self.throttled_keys = throttled_keys or set()
+        self.retry_after = retry_after
+        self.tokens = tokens
+        self.token_delay = token_delay
+        self.request_count = 0
+        self.requests_by_key = Counter()
+        self._lock = threading.Lock()
+
+    @property
+    def api_base(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+    def make_tokens(self) -> list[str]:
+        return [f"token{i} " for i in range(self.tokens)]
+
+    def record_request(self, api_key: str):
+        with self._lock:
+            self.request_count += 1
+            self.requests_by_key[api_key] += 1
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,128 @@
+"""
+Measure the latency of reading a session's history, with and without its index.
+
+`--messages` messages spread over `--sessions` sessions are written to the
+`messages` collection of a scratch database, `<MONGO_DB_NAME>_history_benchmark`,
+dropped after. The history query of `MessageExecute.get_messages_by_session_id`,
+the 4 newest messages of a session, is then timed `--reads` times for random
+sessions: first without indexes, then after `ensure_indexes` created the ones of
+the registry. The p50/p95 latencies and the documents each read examined, from
+`explain`, are reported for both.
+
+Needs a mongod (uses MONGO_URI / MONGO_DB_NAME):
+    python -m benchmarks.history_read_benchmark --messages 1000000 --sessions 10000
+"""
+
+import argparse
+import os
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault("MAX_FILE_SIZE", str(20 * 1024 * 1024))
+
+import pymongo
+from bson import ObjectId
+
+from app.api.database.indexes import ensure_indexes, get_plan_stages
+from app.core.config import config
+
+
+def seed(collection, messages: int, sessions: list, batch_size: int = 10000):
+    started_at = datetime(2024, 1, 1)
+    batch = []
+    for i in range(messages):
+        batch.append(
+            {
+                "session_id": random.choice(sessions),
+                "role": "user" if i % 2 == 0 else "assistant",
+                "content": f"message {i}",
+                "token_count": 2,
+                "created_at": started_at + timedelta(seconds=i),
+            }
+        )
+        if len(batch) == batch_size:
+            collection.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        collection.insert_many(batch, ordered=False)
+
+
+def read_history(collection, session_id: str):
+    # same query as `MessageExecute.get_messages_by_session_id`
+    return list(
+        collection.find({"session_id": session_id})
+        .sort([("created_at", -1), ("_id", -1)])
+        .limit(4)
+    )
+
+
+def examined(database, session_id: str) -> int:
+    explanation = database.command(
+        "explain",
+        {
+            "find": "messages",
+            "filter": {"session_id": session_id},
+            "sort": {"created_at": -1, "_id": -1},
+            "limit": 4,
+        },
+        verbosity="executionStats",
+    )
+    stages = get_plan_stages(explanation["queryPlanner"]["winningPlan"])
+    print(f"  plan: {' <- '.join(s['stage'] for s in stages if 'stage' in s)}")
+
+    return explanation["executionStats"]["totalDocsExamined"]
+
+
+def measure(database, sessions: list, reads: int, label: str):
+    collection = database["messages"]
+    latencies = []
+    for _ in range(reads):
+        started_at = time.perf_counter()
+        read_history(collection, random.choice(sessions))
+        latencies.append(time.perf_counter() - started_at)
+
+    latencies.sort()
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(
+        f"{label:10}: p50 {statistics.median(latencies) * 1000:8.2f}ms  "
+        f"p95 {p95 * 1000:8.2f}ms"
+    )
+    print(f"  documents examined per read: {examined(database, sessions[0])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--sessions", type=int, default=10_000)
+    parser.add_argument("--reads", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    client = pymongo.MongoClient(config.MONGO_URI)
+    database = client[f"{config.MONGO_DB_NAME}_history_benchmark"]
+    client.drop_database(database.name)
+    sessions = [str(ObjectId()) for _ in range(args.sessions)]
+
+    try:
+        started_at = time.perf_counter()
+        seed(database["messages"], args.messages, sessions)
+        print(
+            f"seeded {args.messages} messages in {args.sessions} sessions "
+            f"in {time.perf_counter() - started_at:.1f}s"
+        )
+
+        measure(database, sessions, args.reads, "no index")
+        started_at = time.perf_counter()
+        ensure_indexes(database)
+        print(f"indexes created in {time.perf_counter() - started_at:.1f}s")
+        measure(database, sessions, args.reads, "indexed")
+    finally:
+        client.drop_database(database.name)
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Measure what importing the app costs, with `python -X importtime`.
+
+`--module` (the app by default) is imported `--runs` times in fresh interpreters.
+The wall time of every run is reported, then, from the import time log of the
+last run, the packages that took longest, self time summed over their modules,
+and the modules with the longest cumulative times. Packages the app defers to
+first use (vector store backends, async client, file readers) are flagged when
+the import pulled them in anyway.
+
+Importing the app connects to nothing, so no database is needed:
+    python -m benchmarks.import_time_benchmark --runs 5 --top 15
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import List, Tuple
+
+# imported when a feature first needs them, never by importing the app
+DEFERRED = (
+    "qdrant_client",
+    "motor",
+    "llama_index.vector_stores.mongodb",
+    "llama_index.vector_stores.qdrant",
+    "llama_index.readers.file",
+)
+
+
+def import_once(module: str) -> Tuple[float, str]:
+    env = dict(os.environ)
+    env.setdefault("MAX_FILE_SIZE", str(20 * 1024 * 1024))
+    started_at = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    seconds = time.perf_counter() - started_at
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    return seconds, result.stderr
+
+
+def parse_log(log: str) -> List[Tuple[str, int, int]]:
+    """Get the name, self and cumulative microseconds of every imported module."""
+    modules = []
+    for line in log.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        modules.append((name.strip(), int(self_us), int(cumulative_us)))
+
+    return modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    runs = [import_once(args.module) for _ in range(args.runs)]
+    seconds = [run[0] for run in runs]
+    print(
+        f"import {args.module}: median {statistics.median(seconds):.2f}s  "
+        f"min {min(seconds):.2f}s  max {max(seconds):.2f}s  "
+        f"(interpreter start included)"
+    )
+
+    modules = parse_log(runs[-1][1])
+    by_package = defaultdict(int)
+    for name, self_us, _ in modules:
+        by_package[name.split(".")[0]] += self_us
+    print(f"\n{len(modules)} modules, by package (self time):")
+    for package, self_us in sorted(by_package.items(), key=lambda p: -p[1])[: args.top]:
+        print(f"  {self_us / 1000:8.1f}ms  {package}")
+
+    print("\nlongest cumulative:")
+    for name, _, cumulative_us in sorted(modules, key=lambda m: -m[2])[: args.top]:
+        print(f"  {cumulative_us / 1000:8.1f}ms  {name}")
+
+    imported = {name for name, _, _ in modules}
+    pulled_in = [
+        package
+        for package in DEFERRED
+        if any(name == package or name.startswith(package + ".") for name in imported)
+    ]
+    print(f"\ndeferred packages imported: {', '.join(pulled_in) or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
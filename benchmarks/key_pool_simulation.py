@@ -0,0 +1,60 @@
+"""
+Simulate embedding an ingest while some api keys are throttled.
+
+A local stub answers 429 + Retry-After for the throttled keys. The key pool must
+move their batches to the healthy keys instead of stalling the ingest.
+
+Usage:
+    python -m benchmarks.key_pool_simulation --nodes 400 --throttled 2
+"""
+
+import argparse
+import os
+import time
+
+os.environ.setdefault("MAX_FILE_SIZE", str(20 * 1024 * 1024))
+
+from app.api.helpers.embedding_pipeline import EmbeddingPipeline
+from app.core.key_pool import KeyPool
+from benchmarks.embedding_benchmark import make_nodes
+from benchmarks.fake_openai_server import FakeOpenAIServer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--nodes", type=int, default=400)
+    parser.add_argument("--keys", type=int, default=4)
+    parser.add_argument("--throttled", type=int, default=2)
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    keys = [f"sk-key-{i}" for i in range(args.keys)]
+    throttled_keys = set(keys[: args.throttled])
+
+    with FakeOpenAIServer(
+        latency=args.latency, throttled_keys=throttled_keys, retry_after=30
+    ) as server:
+        pool = KeyPool(keys)
+        pipeline = EmbeddingPipeline(
+            key_pool=pool, api_base=server.api_base, batch_size=10, max_concurrency=4
+        )
+        nodes = make_nodes(args.nodes)
+
+        start = time.perf_counter()
+        pipeline.embed_nodes(nodes)
+        elapsed = time.perf_counter() - start
+
+    print(f"embedded {len(nodes)} nodes in {elapsed:.2f}s")
+    for key in keys:
+        status = "throttled" if key in throttled_keys else "healthy"
+        print(f"  {key:<10} {status:<9} {server.requests_by_key[key]:>5} requests")
+
+    assert all(node.embedding for node in nodes), "some nodes were not embedded"
+    for key in throttled_keys:
+        # a throttled key is tried once, then stays in cooldown for Retry-After
+        assert server.requests_by_key[key] <= 4, f"{key} was not put in cooldown"
+    print("ok: throttled keys were put in cooldown, batches moved to healthy keys")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Measure the keyword index: build, save and load times, and BM25 query latency.
+
+`--docs` chunks of `--words` words drawn from a Zipf-distributed vocabulary are
+indexed in batches of 2048, as `IngestService.add_nodes` does after an insert.
+Every chunk also holds one identifier such as ERR-01234. Queries mix common
+words, rare words and an identifier. Latency is reported per query and per
+thousand indexed chunks, with how often the identifier's chunk comes first.
+
+Usage:
+    python -m benchmarks.keyword_index_benchmark --docs 20000 --words 300
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault("MAX_FILE_SIZE", str(20 * 1024 * 1024))
+
+import numpy as np
+
+from app.api.helpers.keyword_index import KeywordIndex
+
+
+def make_corpus(docs: int, words: int, vocabulary: int, seed: int):
+    rng = np.random.default_rng(seed)
+    terms = np.array([f"w{i}" for i in range(vocabulary)])
+    ranks = np.minimum(rng.zipf(1.2, size=(docs, words)), vocabulary) - 1
+
+    return [
+        (f"node-{i}", " ".join(terms[ranks[i]]) + f" ERR-{i:05d}", f"source-{i % 100}")
+        for i in range(docs)
+    ], rng
+
+
+def time_queries(index: KeywordIndex, queries, top_k: int):
+    latencies = []
+    hits = 0
+    for query, expected in queries:
+        started_at = time.perf_counter()
+        result = index.search(query, top_k)
+        latencies.append(time.perf_counter() - started_at)
+        hits += bool(result) and result[0][0] == expected
+
+    latencies.sort()
+    return latencies, hits
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs", type=int, default=20000)
+    parser.add_argument("--words", type=int, default=300)
+    parser.add_argument("--vocabulary", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--top-k", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    corpus, rng = make_corpus(args.docs, args.words, args.vocabulary, args.seed)
+    queries = []
+    for doc in rng.integers(args.docs, size=args.queries):
+        common = " ".join(f"w{i}" for i in rng.integers(20, size=2))
+        rare = f"w{rng.integers(1000, args.vocabulary)}"
+        queries.append((f"what does ERR-{doc:05d} mean {common} {rare}", f"node-{doc}"))
+
+    with tempfile.TemporaryDirectory() as workdir:
+        index = KeywordIndex(workdir)
+        started_at = time.perf_counter()
+        for start in range(0, len(corpus), 2048):
+            index.add(corpus[start : start + 2048])
+        build_seconds = time.perf_counter() - started_at
+
+        started_at = time.perf_counter()
+        index.add(
+            [(f"extra-{i}", text, None) for i, (_, text, _) in enumerate(corpus[:100])]
+        )
+        add_seconds = time.perf_counter() - started_at
+
+        started_at = time.perf_counter()
+        loaded = KeywordIndex(workdir)
+        load_seconds = time.perf_counter() - started_at
+        size = sum(
+            os.path.getsize(os.path.join(workdir, name)) for name in os.listdir(workdir)
+        )
+
+        latencies, hits = time_queries(loaded, queries, args.top_k)
+
+    p50 = statistics.median(latencies)
+    per_thousand = p50 / (args.docs / 1000)
+    print(f"{args.docs} chunks of {args.words} words, {index.get_stats()}")
+    print(f"build (batches of 2048): {build_seconds:7.2f}s")
+    print(f"add 100 chunks         : {add_seconds * 1000:7.1f}ms")
+    print(
+        f"load                   : {load_seconds * 1000:7.1f}ms  ({size / 2**20:.1f}MB)"
+    )
+    print(
+        f"query p50 {p50 * 1000:.3f}ms  p95 "
+        f"{latencies[int(len(latencies) * 0.95) - 1] * 1000:.3f}ms  "
+        f"per 1000 chunks {per_thousand * 1000:.4f}ms  "
+        f"identifier first {hits}/{len(queries)}"
+    )
+
+
+if __name__ == "__main__":
+    main()
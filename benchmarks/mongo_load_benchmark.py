@@ -0,0 +1,138 @@
+"""
+Compare request concurrency of the blocking and the async Mongo paths.
+
+`--requests` async handlers run at once, each looking up a chat session the way
+the routers do. The blocking path calls `SessionExecute.get_session_by_id` from the
+handler, as the routers did before; the async path awaits `aget_session_by_id` on
+the shared Motor client. Wall time, requests/s and the peak number of lookups in
+flight at the same time are reported for each.
+
+Against a local mongod (uses MONGO_URI / MONGO_DB_NAME, the session is removed after):
+    python -m benchmarks.mongo_load_benchmark --requests 200
+
+Without one, on mongomock-motor with a simulated round trip per call:
+    python -m benchmarks.mongo_load_benchmark --mock --latency 0.005
+"""
+
+import argparse
+import asyncio
+import time
+
+from app.api.database.execute import session_execute as session_execute_module
+from app.api.database.execute.session_execute import SessionExecute
+from app.api.database.models.session import SessionModel
+
+SIMULATED_CALLS = ("find_one", "insert_one", "delete_one")
+
+
+class SlowCollection:
+    """Collection proxy that waits `latency` seconds before each simulated call."""
+
+    def __init__(self, collection, latency: float, is_async: bool) -> None:
+        self.collection = collection
+        self.latency = latency
+        self.is_async = is_async
+
+    def __getattr__(self, name):
+        attr = getattr(self.collection, name)
+        if name not in SIMULATED_CALLS:
+            return attr
+
+        if self.is_async:
+
+            async def acall(*args, **kwargs):
+                await asyncio.sleep(self.latency)
+                return await attr(*args, **kwargs)
+
+            return acall
+
+        def call(*args, **kwargs):
+            time.sleep(self.latency)
+            return attr(*args, **kwargs)
+
+        return call
+
+
+class SlowDatabase:
+    def __init__(self, database, latency: float, is_async: bool) -> None:
+        self.database = database
+        self.latency = latency
+        self.is_async = is_async
+
+    def __getitem__(self, name: str) -> SlowCollection:
+        return SlowCollection(self.database[name], self.latency, self.is_async)
+
+
+def use_mock_databases(latency: float):
+    """Point the session execute at in-memory databases sharing the same data."""
+    import mongomock
+    from mongomock_motor import AsyncMongoMockClient
+
+    client = mongomock.MongoClient()
+    async_client = AsyncMongoMockClient(mock_mongo_client=client)
+    session_execute_module.mongodb = SlowDatabase(client["bench"], latency, False)
+    session_execute_module.async_mongodb = SlowDatabase(
+        async_client["bench"], latency, True
+    )
+
+
+async def run_load(lookup, requests: int) -> dict:
+    in_flight = 0
+    peak = 0
+
+    async def handler():
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        try:
+            await lookup()
+        finally:
+            in_flight -= 1
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*(handler() for _ in range(requests)))
+    elapsed = time.perf_counter() - started_at
+
+    return {"seconds": elapsed, "rps": requests / elapsed, "peak": peak}
+
+
+async def run(requests: int):
+    session = await SessionExecute.acreate_session(SessionModel(user_id="benchmark"))
+    session_id = str(session["_id"])
+
+    async def blocking_lookup():
+        assert SessionExecute.get_session_by_id(session_id) is not None
+
+    async def async_lookup():
+        assert await SessionExecute.aget_session_by_id(session_id) is not None
+
+    try:
+        for name, lookup in (("blocking", blocking_lookup), ("async", async_lookup)):
+            result = await run_load(lookup, requests)
+            print(
+                f"{name:>8}: {result['seconds']:.3f}s  {result['rps']:8.1f} req/s  "
+                f"peak concurrency {result['peak']}"
+            )
+    finally:
+        await SessionExecute.adelete_session_by_id(session_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument(
+        "--mock", action="store_true", help="use mongomock-motor instead of mongod"
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.005, help="simulated round trip (--mock)"
+    )
+    args = parser.parse_args()
+
+    if args.mock:
+        use_mock_databases(args.latency)
+
+    asyncio.run(run(args.requests))
+
+
+if __name__ == "__main__":
+    main()
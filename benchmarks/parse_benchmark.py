@@ -0,0 +1,67 @@
+"""
+Compare inline PDF parsing with the process-pool parse executor.
+
+The bundled Scrum guide is repeated `--copies` times to build a large PDF.
+
+Usage:
+    python -m benchmarks.parse_benchmark --copies 200 --workers 4
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+os.environ.setdefault("MAX_FILE_SIZE", str(20 * 1024 * 1024))
+
+import pypdf
+from llama_index.readers.file import PDFReader
+
+from app.api.helpers.parse_executor import ParseExecutor
+
+SAMPLE_PDF = os.path.join(os.path.dirname(__file__), "..", "app", "api", "docs", "Scrum-Guide-1.pdf")
+
+
+def build_pdf(path: str, copies: int):
+    reader = pypdf.PdfReader(SAMPLE_PDF)
+    writer = pypdf.PdfWriter()
+    for _ in range(copies):
+        for page in reader.pages:
+            writer.add_page(page)
+    writer.write(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--copies", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--pages-per-task", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "large.pdf")
+        build_pdf(path, args.copies)
+
+        start = time.perf_counter()
+        inline_documents = PDFReader().load_data(path)
+        print(f"inline        {time.perf_counter() - start:>7.2f}s {len(inline_documents)} pages")
+
+        parse_executor = ParseExecutor(
+            max_workers=args.workers, pages_per_task=args.pages_per_task
+        )
+        # start the worker processes before timing
+        parse_executor.parse(SAMPLE_PDF, PDFReader)
+
+        start = time.perf_counter()
+        pool_documents = parse_executor.parse(path, PDFReader)
+        print(
+            f"process pool  {time.perf_counter() - start:>7.2f}s {len(pool_documents)} pages "
+            f"({args.workers} workers)"
+        )
+        parse_executor.shutdown()
+
+        assert [d.text for d in inline_documents] == [d.text for d in pool_documents]
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Profile tokenization in chunking and in conversation memory, before and after the
+shared tokenizer.
+
+A document of `--sentences` sentences drawn from the sample PDF is split into
+1024-token chunks with a 200-token overlap: by a `SentenceSplitter` built for the
+call, as every ingest did, then by the shared `CachedSentenceSplitter`, first
+cold and then again as an upsert of the unchanged document does. The chunk
+token counts stored with the nodes are computed with the batched API.
+
+Then the history of a conversation, `--messages` messages, is trimmed to 8000
+tokens `--turns` times, by `ChatMemoryBuffer`, which tokenizes the joined history
+for every message it drops, and by `CachedChatMemoryBuffer` with the counts
+stored with the messages. `--profile` prints where the cold chunking spends time.
+
+Usage:
+    python -m benchmarks.tokenizer_benchmark --sentences 20000 --messages 200
+"""
+
+import argparse
+import cProfile
+import os
+import pstats
+import random
+import time
+
+os.environ.setdefault("MAX_FILE_SIZE", str(20 * 1024 * 1024))
+
+import pypdf
+from llama_index.core.base.llms.types import ChatMessage, MessageRole
+from llama_index.core.memory import ChatMemoryBuffer
+from llama_index.core.node_parser import SentenceSplitter
+
+from app.api.helpers.context_assembler import SENTENCE_PATTERN
+from app.api.helpers.tokenizer import (
+    CachedChatMemoryBuffer,
+    CachedSentenceSplitter,
+    tokenizer,
+)
+
+SAMPLE_PDF = os.path.join(
+    os.path.dirname(__file__), "..", "app", "api", "docs", "Scrum-Guide-1.pdf"
+)
+
+
+def make_text(sentences: int, rng: random.Random) -> str:
+    reader = pypdf.PdfReader(SAMPLE_PDF)
+    text = " ".join(page.extract_text() for page in reader.pages)
+    pool = [s for s in SENTENCE_PATTERN.split(" ".join(text.split())) if s]
+
+    # numbered so that sentences are not repeated, in paragraphs of 5 to 15
+    paragraphs = []
+    number = 0
+    while number < sentences:
+        size = min(rng.randint(5, 15), sentences - number)
+        paragraphs.append(
+            " ".join(
+                f"{number + i}. {sentence}"
+                for i, sentence in enumerate(rng.choices(pool, k=size))
+            )
+        )
+        number += size
+
+    return "\n\n".join(paragraphs)
+
+
+def timed(function, *args):
+    started_at = time.perf_counter()
+    result = function(*args)
+
+    return result, time.perf_counter() - started_at
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sentences", type=int, default=20000)
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--profile", action="store_true")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    text = make_text(args.sentences, rng)
+    tokens = len(tokenizer.encode(text))
+    print(f"document: {len(text) / 2**20:.1f}MB, {tokens} tokens")
+
+    _, build_seconds = timed(SentenceSplitter, 1024, 200)
+    shared = CachedSentenceSplitter(
+        chunk_size=1024, chunk_overlap=200, tokenizer=tokenizer.encode
+    )
+
+    def split_per_call(text: str):
+        return SentenceSplitter(chunk_size=1024, chunk_overlap=200).split_text(text)
+
+    chunks, naive_seconds = timed(split_per_call, text)
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler:
+        profiler.enable()
+    cached_chunks, cold_seconds = timed(shared.split_text, text)
+    if profiler:
+        profiler.disable()
+    _, warm_seconds = timed(shared.split_text, text)
+    _, count_seconds = timed(tokenizer.count_batch, cached_chunks)
+    assert chunks == cached_chunks
+
+    print(f"build splitter       : {build_seconds * 1000:8.1f}ms")
+    print(f"chunk, new splitter  : {naive_seconds * 1000:8.1f}ms  {len(chunks)} chunks")
+    print(f"chunk, shared (cold) : {cold_seconds * 1000:8.1f}ms")
+    print(f"chunk, shared (warm) : {warm_seconds * 1000:8.1f}ms  (upsert, unchanged)")
+    print(f"count chunks (batch) : {count_seconds * 1000:8.1f}ms")
+
+    messages = [
+        ChatMessage(
+            role=MessageRole.USER if i % 2 == 0 else MessageRole.ASSISTANT,
+            content=" ".join(rng.choices(text.split(), k=rng.randint(10, 400))),
+        )
+        for i in range(args.messages)
+    ]
+    stored_counts = tokenizer.count_batch([m.content for m in messages])
+
+    def trim(memory_cls):
+        kept = 0
+        for _ in range(args.turns):
+            if memory_cls is CachedChatMemoryBuffer:
+                # as `ChatService.to_memory` does with the stored message counts
+                tokenizer.remember((m.content for m in messages), stored_counts)
+            memory = memory_cls.from_defaults(
+                chat_history=messages,
+                token_limit=8000,
+                tokenizer_fn=tokenizer.encode,
+            )
+            kept = len(memory.get(initial_token_count=1000))
+
+        return kept
+
+    kept, buffer_seconds = timed(trim, ChatMemoryBuffer)
+    cached_kept, cached_seconds = timed(trim, CachedChatMemoryBuffer)
+    print(
+        f"trim history, buffer : {buffer_seconds / args.turns * 1000:8.1f}ms per turn  "
+        f"{kept}/{args.messages} messages kept"
+    )
+    print(
+        f"trim history, cached : {cached_seconds / args.turns * 1000:8.1f}ms per turn  "
+        f"{cached_kept}/{args.messages} messages kept"
+    )
+    print(f"token counts: {tokenizer.get_stats()}")
+
+    if profiler:
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(12)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Compare memory of the buffered upload path with the streaming one.
+
+Each upload is a file of `--size-mb` MB behind a FastAPI `UploadFile`, the way the
+multipart parser hands it over after spooling to disk. The buffered path is the
+previous `await file.read()` + `len()` + write; the streaming path is
+`IngestHelper.stream_to_folder`. Peak Python allocations are measured with
+tracemalloc while `--uploads` uploads run concurrently.
+
+Usage:
+    python -m benchmarks.upload_memory_benchmark --uploads 4 --size-mb 200
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import tracemalloc
+
+from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
+
+
+def make_upload_source(folder: str, size: int) -> str:
+    path = os.path.join(folder, "upload.bin")
+    with open(path, "wb") as f:
+        chunk = os.urandom(1024 * 1024)
+        for _ in range(size // len(chunk)):
+            f.write(chunk)
+    return path
+
+
+async def buffered_upload(source_path: str, target_path: str):
+    upload = UploadFile(file=open(source_path, "rb"), filename="upload.bin")
+    file_content = await upload.read()
+    assert len(file_content) > 0
+    with open(target_path, "wb") as f:
+        f.write(file_content)
+    await upload.close()
+
+
+async def streamed_upload(source_path: str, target_path: str):
+    from app.api.helpers.ingest_helper import IngestHelper
+
+    upload = UploadFile(file=open(source_path, "rb"), filename="upload.bin")
+    await run_in_threadpool(IngestHelper.stream_to_folder, upload.file, target_path)
+    await upload.close()
+
+
+async def run(upload_fn, source_path: str, folder: str, uploads: int):
+    await asyncio.gather(
+        *(
+            upload_fn(source_path, os.path.join(folder, f"target-{i}.bin"))
+            for i in range(uploads)
+        )
+    )
+
+
+def measure(name: str, upload_fn, source_path: str, folder: str, uploads: int):
+    tracemalloc.start()
+    start = time.perf_counter()
+    asyncio.run(run(upload_fn, source_path, folder, uploads))
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<10} peak {peak / 1024 / 1024:>9.1f} MB  {elapsed:>6.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--uploads", type=int, default=4)
+    parser.add_argument("--size-mb", type=int, default=200)
+    args = parser.parse_args()
+
+    size = args.size_mb * 1024 * 1024
+    os.environ["MAX_FILE_SIZE"] = str(size * 2)
+    os.environ.setdefault("UPLOAD_CHUNK_SIZE", str(1024 * 1024))
+
+    with tempfile.TemporaryDirectory() as folder:
+        source_path = make_upload_source(folder, size)
+        print(f"{args.uploads} concurrent uploads of {args.size_mb} MB")
+        measure("buffered", buffered_upload, source_path, folder, args.uploads)
+        measure("streamed", streamed_upload, source_path, folder, args.uploads)
+
+
+if __name__ == "__main__":
+    main()
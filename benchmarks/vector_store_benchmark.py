@@ -0,0 +1,159 @@
+"""
+Compare recall and latency of the vector store backends on the same dataset.
+
+`--vectors` random unit vectors grouped around `--clusters` centers are added to
+each backend the way the index adds nodes, then `--queries` perturbed copies of
+stored vectors are searched. Recall@k is measured against an exact numpy search;
+insert time and median / p95 query latency are reported.
+
+`local` is the memory-mapped store searched exactly, `local-ivf` the same store
+with its IVF index built from the first batch, `--local-dtype` sets their vector type.
+Qdrant runs in local mode (in memory, exact search) unless `--qdrant-url` points
+to a server, where its HNSW and quantization settings apply. Mongo needs an Atlas
+cluster with the vector search index of the README, set in MONGO_URI /
+MONGO_DB_NAME; its index is updated asynchronously, see `--mongo-wait`. Points added
+to a server are deleted after the run.
+
+Usage:
+    python -m benchmarks.vector_store_benchmark --vectors 20000 --dim 384
+    python -m benchmarks.vector_store_benchmark --backends local-ivf --nprobe 32 --local-dtype int8
+    python -m benchmarks.vector_store_benchmark --backends qdrant --qdrant-url http://localhost:6333
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault("MAX_FILE_SIZE", str(20 * 1024 * 1024))
+
+import numpy as np
+from llama_index.core.schema import TextNode
+from llama_index.core.vector_stores.types import VectorStoreQuery
+from qdrant_client import QdrantClient
+
+from app.api.database.local_vector_store import LocalVectorStore
+from app.api.database.vector_db import create_qdrant_vector_store, get_vector_store
+
+
+def make_dataset(vectors: int, dim: int, clusters: int, queries: int, seed: int):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    data = centers[rng.integers(clusters, size=vectors)] + rng.normal(
+        scale=0.5, size=(vectors, dim)
+    )
+    data /= np.linalg.norm(data, axis=1, keepdims=True)
+
+    query_vectors = data[rng.integers(vectors, size=queries)] + rng.normal(
+        scale=0.1, size=(queries, dim)
+    )
+    query_vectors /= np.linalg.norm(query_vectors, axis=1, keepdims=True)
+
+    return data.astype(np.float32), query_vectors.astype(np.float32)
+
+
+def make_vector_store(backend: str, args: argparse.Namespace, workdir: str):
+    if backend in ("local", "local-ivf"):
+        return LocalVectorStore(
+            os.path.join(workdir, backend),
+            dtype=args.local_dtype,
+            ivf_min_rows=1 if backend == "local-ivf" else args.vectors + 1,
+            nprobe=args.nprobe,
+        )
+    if backend == "qdrant":
+        client = (
+            QdrantClient(url=args.qdrant_url)
+            if args.qdrant_url
+            else QdrantClient(":memory:")
+        )
+        return create_qdrant_vector_store(client=client)
+
+    return get_vector_store(backend)
+
+
+def run_backend(vector_store, data, query_vectors, top_k: int, index_wait: float):
+    nodes = [
+        TextNode(
+            text=f"chunk {i}",
+            metadata={"source": f"source-{i % 10}"},
+            embedding=vector.tolist(),
+        )
+        for i, vector in enumerate(data)
+    ]
+    position_by_id = {node.node_id: i for i, node in enumerate(nodes)}
+
+    started_at = time.perf_counter()
+    # same batches as VectorStoreIndex.insert_nodes
+    for start in range(0, len(nodes), 2048):
+        vector_store.add(nodes[start : start + 2048])
+    insert_seconds = time.perf_counter() - started_at
+    time.sleep(index_wait)
+
+    exact = np.argsort(-(query_vectors @ data.T), axis=1)[:, :top_k]
+    latencies = []
+    recalls = []
+    try:
+        for query_vector, expected in zip(query_vectors, exact):
+            started_at = time.perf_counter()
+            result = vector_store.query(
+                VectorStoreQuery(
+                    query_embedding=query_vector.tolist(), similarity_top_k=top_k
+                )
+            )
+            latencies.append(time.perf_counter() - started_at)
+            found = {position_by_id[node_id] for node_id in result.ids}
+            recalls.append(len(found & set(expected)) / top_k)
+    finally:
+        vector_store.delete_nodes([node.node_id for node in nodes])
+
+    latencies.sort()
+    return {
+        "insert": insert_seconds,
+        "recall": statistics.mean(recalls),
+        "p50": statistics.median(latencies),
+        "p95": latencies[int(len(latencies) * 0.95) - 1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--backends", default="local,local-ivf,qdrant")
+    parser.add_argument("--vectors", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=50)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--local-dtype", default="float32")
+    parser.add_argument("--nprobe", type=int, default=16)
+    parser.add_argument("--qdrant-url", default=None)
+    parser.add_argument(
+        "--mongo-wait", type=float, default=10.0, help="seconds for Atlas to index"
+    )
+    args = parser.parse_args()
+
+    data, query_vectors = make_dataset(
+        args.vectors, args.dim, args.clusters, args.queries, args.seed
+    )
+    print(
+        f"{args.vectors} vectors of {args.dim} dims, {args.queries} queries, "
+        f"recall@{args.top_k}"
+    )
+    with tempfile.TemporaryDirectory() as workdir:
+        for backend in args.backends.split(","):
+            vector_store = make_vector_store(backend, args, workdir)
+            index_wait = args.mongo_wait if backend == "mongo" else 0
+            result = run_backend(
+                vector_store, data, query_vectors, args.top_k, index_wait
+            )
+            print(
+                f"{backend:>9}: insert {result['insert']:7.2f}s  "
+                f"recall {result['recall']:.3f}  "
+                f"query p50 {result['p50'] * 1000:7.2f}ms  "
+                f"p95 {result['p95'] * 1000:7.2f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""
+Gunicorn settings of the production server:
+
+    gunicorn app.main:app -c gunicorn.conf.py
+
+Runs WORKERS uvicorn worker processes, which share the index through the version
+stamp in MongoDB (see app/api/helpers/index_sync.py). The app is imported by
+every worker after it is forked, so no client, thread or pool crosses a fork.
+"""
+
+import os
+
+# the master requeues the jobs left running by the last run, once, before the
+# workers start; a worker restarting later must not take over those of its siblings
+os.environ["REQUEUE_RUNNING_JOBS"] = "false"
+
+from app.core.config import config  # noqa: E402
+
+bind = f"0.0.0.0:{config.PORT}"
+workers = config.WORKERS
+worker_class = "uvicorn.workers.UvicornWorker"
+# clients and services are built in each worker, never in the master
+preload_app = False
+
+
+def when_ready(server):
+    """Requeue the jobs left running, before any worker is forked."""
+    from app.api.database.execute.ingest_job_execute import IngestJobExecute
+    from app.core.container import container
+
+    try:
+        count = IngestJobExecute.requeue_running_jobs()
+        server.log.info(f"Requeued {count} ingest jobs left running")
+    except Exception as e:
+        server.log.warning(f"Could not requeue ingest jobs: {e}")
+    finally:
+        # the workers connect on their own, after the fork
+        container.close()